@@ -7,8 +7,15 @@ if "bpy" in locals():
     if "ui" in locals(): importlib.reload(ui)
     if "preferences" in locals(): importlib.reload(preferences)
 else:
-    import bpy
-    from . import properties, operators, ui, preferences, assets, devices
+    try:
+        import bpy
+    except ImportError:
+        # Outside of Blender only the modules which do not need bpy (numeric, sweep, manifest,
+        # profiles) can be imported, e.g. by the tests
+        bpy = None
+
+    if bpy is not None:
+        from . import properties, operators, ui, preferences, assets, devices
 
 def register():
     properties.register()
@@ -0,0 +1,342 @@
+import sys
+import json
+import tomllib
+import argparse
+
+from pathlib import Path
+
+import bpy
+
+if __name__ == "__main__" and not __package__:
+    # Run as a script through "blender -b -P blender_sfdi/batch.py", so make the package importable
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    import blender_sfdi
+    __package__ = "blender_sfdi"
+
+from . import devices, exposure, planner, render, sweep, synthesis
+from .cache import RenderCache
+from .monitor import MonitorAbort
+
+# Headless batch rendering driven by a job spec (.json or .toml)
+#
+#   python -m blender_sfdi.batch job.json --blend rig.blend
+#   blender -b rig.blend -P blender_sfdi/batch.py -- job.json
+#
+# Job spec layout (every section is optional):
+#
+#   blend       : .blend file containing the rig
+#   rig         : {camera, projector, char_board, cameras} object names, cameras lists additional views
+#   camera      : PG_CameraSettings values, e.g. {render_samples, render_profile, resolution}
+#   projector   : PG_ProjectorSettings values, e.g. {throw_ratio, light_falloff, measured, shadow_linking},
+#                 measured is the name of the collection the projector is light linked to
+#   fringes     : {stripe_counts, phases, rotations, multiplexing, multiplex_mode, crosstalk}
+#   poses       : list of board poses, same layout as a saved board poses file
+#   poses_file  : board poses .json saved with "Save Poses"
+#   output      : {dir, name, metadata}
+#   crop        : {enabled, target, padding, fill}, render border around the target (board by default)
+#   levels      : {intensities, energies, exposures, ambients}, every frame is written once per combination
+#   render      : {threads, frames, mode, culling, preflight, order}, frames is an inclusive "start:end"
+#                 range, mode one of PG_StereoFP.render_mode (FULL, BASIS, LINEAR, GEOMETRY, PROJECTORS),
+#                 culling one of PG_StereoFP.culling (NONE, POSE, FRAME), preflight one of
+#                 PG_StereoFP.preflight (CHECK, FIX, OFF) and order PLANNED (see planner.py) or SWEEP
+#   exposure    : PG_AutoExposureSettings values, e.g. {mode, target, percentile, probe_scale, probe_samples},
+#                 the energy or exposure is tuned before the animation is created unless mode is OFF
+#                 or it is already tuned (in the .blend, or by the coordinator through --exposure)
+#   monitor     : PG_MonitorSettings values, e.g. {enabled, action, patience, max_saturated, min_modulation}
+#   cache       : {dir, max_gb} render cache shared between datasets
+
+def LoadJob(filepath):
+    filepath = Path(filepath)
+
+    if filepath.suffix == ".toml":
+        with open(filepath, "rb") as toml_file:
+            job = tomllib.load(toml_file)
+    else:
+        with open(filepath, "r") as json_file:
+            job = json.load(json_file)
+
+    # Keep relative paths in the spec relative to the spec itself
+    job["_root"] = str(filepath.resolve().parent)
+
+    return job
+
+def _job_path(job, path):
+    path = Path(path)
+    if path.is_absolute(): return path
+
+    return Path(job.get("_root", ".")) / path
+
+def _set_values(collection, values):
+    collection.clear()
+
+    for value in values:
+        collection.add().value = value
+
+def _set_poses(char_board, poses):
+    settings = char_board.settings
+    settings.poses.clear()
+
+    for pose in poses:
+        new_item = settings.poses.add()
+
+        translation = pose["translation"]
+        rotation = pose["rotation"]
+
+        new_item.translation = [translation["x"], translation["y"], translation["z"]]
+        new_item.rotation = [rotation["w"], rotation["x"], rotation["y"], rotation["z"]]
+
+def ApplyJob(scene, job):
+    settings = scene.fp_stereo
+
+    # Rig
+    for key, name in job.get("rig", {}).items():
+        names = name if key == "cameras" else [name]
+
+        for name in names:
+            if name not in bpy.data.objects:
+                raise ValueError(f"Rig object '{name}' for '{key}' does not exist")
+
+        if key != "cameras":
+            setattr(settings, key, bpy.data.objects[name])
+            continue
+
+        settings.cameras.clear()
+        for name in names:
+            settings.cameras.add().camera = bpy.data.objects[name]
+
+    if not devices.BL_Camera.is_camera(settings.camera):
+        raise ValueError("Job does not have a valid camera")
+
+    if not devices.BL_Projector.is_projector(settings.projector):
+        raise ValueError("Job does not have a valid projector")
+
+    camera = devices.BL_Camera.from_bl_obj(settings.camera)
+    for key, value in job.get("camera", {}).items():
+        setattr(camera.settings, key, value)
+
+    projector = devices.BL_Projector.from_bl_obj(settings.projector)
+    for key, value in job.get("projector", {}).items():
+        if key == "measured":
+            if value is not None and value not in bpy.data.collections:
+                raise ValueError(f"Measured collection '{value}' does not exist")
+
+            value = bpy.data.collections[value] if value is not None else None
+
+        setattr(projector.settings, key, value)
+
+    # Update callbacks only run for the active object
+    if {"measured", "shadow_linking"} & job.get("projector", {}).keys():
+        devices.BL_Projector.set_light_linking(projector.bl_obj)
+
+    # Fringe sweep
+    fringes = job.get("fringes", {})
+    fringes_manager = settings.fringes_manager
+
+    if "stripe_counts" in fringes: _set_values(fringes_manager.stripe_counts, fringes["stripe_counts"])
+    if "phases" in fringes: _set_values(fringes_manager.phases, fringes["phases"])
+    if "rotations" in fringes: _set_values(fringes_manager.rotations, fringes["rotations"])
+    if "multiplexing" in fringes: fringes_manager.multiplexing = fringes["multiplexing"]
+    if "multiplex_mode" in fringes: fringes_manager.multiplex_mode = fringes["multiplex_mode"]
+    if "crosstalk" in fringes: fringes_manager.crosstalk = fringes["crosstalk"]
+
+    # Board poses
+    poses = job.get("poses")
+
+    if "poses_file" in job:
+        with open(_job_path(job, job["poses_file"]), "r") as json_file:
+            poses = json.load(json_file)["char_board"]["poses"]
+
+    if poses is not None:
+        if not devices.BL_CharBoard.is_char_board(settings.char_board):
+            raise ValueError("Job has board poses but no characterisation board")
+
+        _set_poses(devices.BL_CharBoard.from_bl_obj(settings.char_board), poses)
+
+    # Render border around the target
+    crop = job.get("crop", {})
+    if "enabled" in crop: settings.crop = crop["enabled"]
+    if "padding" in crop: settings.crop_padding = crop["padding"]
+    if "fill" in crop: settings.crop_fill = crop["fill"]
+
+    if "target" in crop:
+        if crop["target"] not in bpy.data.objects:
+            raise ValueError(f"Crop target '{crop['target']}' does not exist")
+
+        settings.crop_target = bpy.data.objects[crop["target"]]
+
+    # Visibility pre-pass, applied when the animation is created
+    if "culling" in job.get("render", {}): settings.culling = job["render"]["culling"]
+
+    # Scene checks before animating and rendering
+    if "preflight" in job.get("render", {}): settings.preflight = job["render"]["preflight"]
+
+    # Probe renders which tune the energy or exposure
+    for key, value in job.get("exposure", {}).items():
+        setattr(settings.auto_exposure, key, value)
+
+    # Image sanity monitor
+    for key, value in job.get("monitor", {}).items():
+        setattr(settings.monitor, key, value)
+
+    # Output layout
+    output = job.get("output", {})
+    if "dir" in output: settings.output_dir = str(_job_path(job, output["dir"]))
+    if "name" in output: settings.output_name = output["name"]
+    if "metadata" in output: settings.metadata = output["metadata"]
+
+    # Camera drives the scene render settings
+    camera.set_scene(scene)
+
+def EnsureRegistered():
+    # Running outside of an installed extension (e.g. bpy as a Python module)
+    if not hasattr(bpy.types.Scene, "fp_stereo"):
+        blender_sfdi = sys.modules[__package__]
+        blender_sfdi.register()
+
+def OpenBlend(filepath):
+    if filepath is None: return
+
+    if Path(bpy.data.filepath or "").resolve() == Path(filepath).resolve(): return
+
+    bpy.ops.wm.open_mainfile(filepath=str(filepath))
+
+def TunedExposure(scene):
+    # (value, limiting pose) of a tuned auto exposure, None when off or not tuned
+    settings = scene.fp_stereo.auto_exposure
+    if settings.mode == "OFF" or not settings.tuned: return None
+
+    return settings.value, settings.limiting_pose
+
+def PrepareScene(job, blend=None, tuned_exposure=None):
+    # tuned_exposure is the (value, limiting pose) chosen by the coordinator of a split job
+    EnsureRegistered()
+
+    if blend is None and "blend" in job: blend = _job_path(job, job["blend"])
+    OpenBlend(blend)
+
+    scene = bpy.context.scene
+    ApplyJob(scene, job)
+
+    if tuned_exposure is not None: exposure.ApplyExposure(scene, *tuned_exposure)
+    elif TunedExposure(scene) is None:
+        # Before the animation, the probes set the board poses directly
+        result = exposure.AutoExposure(scene)
+        if result is not None: print(f"Auto exposure: {result['mode'].lower()} {result['value']:.4g}, limited by pose {result['limiting_pose']}", flush=True)
+
+    bpy.ops.op.fp_createanimation()
+
+    return scene
+
+def JobFrames(scene, job, frame_range=None):
+    # Output frames of the job in render order, frame_range selects timeline frames
+    frames = sweep.SelectFrames(sweep.SceneSweep(scene), frame_range or job.get("render", {}).get("frames"))
+    frames = sweep.ExpandLevels(frames, sweep.SweepLevels(job.get("levels")))
+
+    order = job.get("render", {}).get("order", "PLANNED").upper()
+    if order not in ("PLANNED", "SWEEP"):
+        raise ValueError(f"Unknown render order '{order}', expected PLANNED or SWEEP")
+
+    return planner.PlanFrames(scene, frames) if order == "PLANNED" else frames
+
+def WritePlan(scene, frames, output_dir):
+    # Written once for the whole job by whoever splits it, workers only render their share
+    report = planner.PlanReport(scene, sorted(frames, key=sweep.SweepKey), frames)
+    planner.WritePlan(output_dir, frames, report)
+
+    print(f"{report['renders']} renders, {report['bvh_rebuilds']} BVH builds expected "
+          f"({report['bvh_rebuilds_sweep_order']} in sweep order)", flush=True)
+
+    return report
+
+DRIVERS = {
+    "FULL" : render.RenderDriver,
+    "BASIS" : synthesis.BasisRenderDriver,
+    "LINEAR" : synthesis.LinearRenderDriver,
+    "GEOMETRY" : synthesis.GeometryRenderDriver,
+    "PROJECTORS" : synthesis.ProjectorsRenderDriver,
+}
+
+def CreateDriver(scene, job, args=None, **kwargs):
+    mode = getattr(args, "mode", None) or job.get("render", {}).get("mode") or scene.fp_stereo.render_mode
+    mode = mode.upper()
+
+    if mode not in DRIVERS:
+        raise ValueError(f"Unknown render mode '{mode}', expected one of {list(DRIVERS)}")
+
+    return DRIVERS[mode](scene, cache=JobCache(job, args), **kwargs)
+
+def JobCache(job, args=None):
+    cache_settings = job.get("cache", {})
+
+    cache_dir = getattr(args, "cache", None) or cache_settings.get("dir")
+    if cache_dir is None: return None
+
+    max_gb = getattr(args, "cache_size", None) or cache_settings.get("max_gb")
+    max_bytes = int(max_gb * 1024 ** 3) if max_gb else None
+
+    return RenderCache(_job_path(job, cache_dir), max_bytes=max_bytes)
+
+def ParseArgs(argv=None):
+    if argv is None:
+        # Blender passes script arguments after "--"
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(prog="blender_sfdi.batch", description="Render a fringe projection dataset from a job spec")
+    parser.add_argument("job", help="Job spec (.json or .toml)")
+    parser.add_argument("--blend", default=None, help="Rig .blend file, overrides the job spec")
+    parser.add_argument("--frames", default=None, help="Inclusive frame range to render, e.g. 0:99")
+    parser.add_argument("--threads", type=int, default=None, help="Render threads, 0 for automatic")
+    parser.add_argument("--output", default=None, help="Output directory, overrides the job spec")
+    parser.add_argument("--mode", default=None, help=f"Render mode, one of {list(DRIVERS)}")
+    parser.add_argument("--no-resume", action="store_true", help="Re-render frames already recorded in the manifest")
+    parser.add_argument("--verify", choices=["full", "quick"], default="full", help="Check completed frames by checksum (full) or size only (quick)")
+    parser.add_argument("--cache", default=None, help="Render cache directory, overrides the job spec")
+    parser.add_argument("--cache-size", type=float, default=None, help="Render cache budget in GB")
+    parser.add_argument("--metadata", action="store_true", help="Always write metadata, even if disabled in the job")
+    parser.add_argument("--metadata-name", default="metadata.json", help="Metadata filename")
+    parser.add_argument("--no-plan", action="store_true", help="Do not write plan.json, e.g. for workers of a pool")
+    parser.add_argument("--exposure", type=float, default=None, help="Tuned auto exposure value from the coordinator, skips the probe renders")
+    parser.add_argument("--exposure-pose", type=int, default=-1, help="Board pose which limited the tuned auto exposure")
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = ParseArgs(argv)
+
+    job = LoadJob(args.job)
+    tuned_exposure = (args.exposure, args.exposure_pose) if args.exposure is not None else None
+    scene = PrepareScene(job, blend=args.blend, tuned_exposure=tuned_exposure)
+
+    render_settings = job.get("render", {})
+
+    threads = args.threads if args.threads is not None else render_settings.get("threads")
+    render.SetThreads(scene, threads)
+
+    frames = JobFrames(scene, job, args.frames)
+
+    driver = CreateDriver(scene, job, args, output_dir=args.output, resume=not args.no_resume, verify=args.verify)
+
+    if not args.no_plan: WritePlan(scene, frames, driver.output_dir)
+
+    def progress(entry):
+        name = sweep.FrameName(entry)
+        print(f"{'Resumed' if name in driver.resumed else 'Rendered'} frame {name} -> {entry['file']}", flush=True)
+
+    try:
+        rendered = driver.render(frames, callback=progress)
+    except MonitorAbort as e:
+        print(e, flush=True)
+        return 1
+
+    for warning in driver.warnings: print(warning, flush=True)
+
+    if driver.monitor is not None:
+        for report in driver.monitor.reports: print(f"Monitor: {report}", flush=True)
+
+    if args.metadata or scene.fp_stereo.metadata:
+        driver.write_metadata(rendered, filename=args.metadata_name)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
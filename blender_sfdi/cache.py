@@ -0,0 +1,209 @@
+import os
+import json
+import shutil
+import hashlib
+
+import bpy
+import numpy as np
+
+from pathlib import Path
+
+from . import devices
+
+# Content-addressed render cache
+# Rendered frames are stored under a hash of everything that affects the image: the evaluated
+# transforms and visibility of every object, the camera / projector settings (with animated values
+# for the current frame), the render settings and a hash of the scene geometry and materials.
+# Identical frames in later datasets are hard-linked (or copied) from the cache instead of rendered.
+#
+# Geometry and materials are hashed once when the cache is bound to a scene, so they are assumed
+# not to be animated during a render. Object transforms, visibility and light levels are hashed per frame.
+
+def _to_json(value):
+    if hasattr(value, "__iter__"): return list(value)
+
+    return str(value)
+
+def _rna_values(data, depth=2):
+    values = {}
+
+    for prop in data.bl_rna.properties:
+        if prop.identifier == "rna_type": continue
+
+        value = getattr(data, prop.identifier, None)
+
+        if prop.type == 'POINTER':
+            if isinstance(value, bpy.types.ID): value = value.name
+            elif value is not None and 0 < depth: value = _rna_values(value, depth - 1)
+            else: value = None
+
+        elif prop.type == 'COLLECTION':
+            value = [_rna_values(v, depth - 1) for v in value] if 0 < depth else len(value)
+
+        values[prop.identifier] = value
+
+    return values
+
+def _digest(values):
+    return hashlib.sha256(json.dumps(values, sort_keys=True, default=_to_json).encode()).hexdigest()
+
+def GeometryHash(scene):
+    h = hashlib.sha256()
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+
+    for bl_obj in sorted(scene.objects, key=lambda o: o.name):
+        if bl_obj.type != 'MESH': continue
+
+        # Evaluated mesh so modifiers are taken into account
+        bl_eval = bl_obj.evaluated_get(depsgraph)
+        mesh = bl_eval.to_mesh()
+
+        coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+        mesh.vertices.foreach_get("co", coords)
+
+        h.update(bl_obj.name.encode())
+        h.update(coords.tobytes())
+        h.update(str(len(mesh.polygons)).encode())
+
+        bl_eval.to_mesh_clear()
+
+        # Materials and their node inputs
+        for slot in bl_obj.material_slots:
+            material = slot.material
+            if material is None: continue
+
+            h.update(material.name.encode())
+            if material.node_tree is None: continue
+
+            for node in material.node_tree.nodes:
+                h.update(node.name.encode())
+
+                if getattr(node, "image", None) is not None:
+                    h.update(node.image.filepath.encode())
+
+                for socket in node.inputs:
+                    if hasattr(socket, "default_value"):
+                        h.update(json.dumps(socket.default_value, default=_to_json).encode())
+
+    # World lighting
+    if scene.world is not None and scene.world.node_tree is not None:
+        for node in scene.world.node_tree.nodes:
+            for socket in node.inputs:
+                if hasattr(socket, "default_value"):
+                    h.update(json.dumps(socket.default_value, default=_to_json).encode())
+
+    return h.hexdigest()
+
+class RenderCache:
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._size = sum(p.stat().st_size for p in self._files())
+        self._geometry = {}
+
+    def _files(self):
+        return [p for p in self.cache_dir.glob("*/*") if p.is_file()]
+
+    def _path(self, key, suffix):
+        return self.cache_dir / key[:2] / f"{key}{suffix}"
+
+    def key(self, scene):
+        # Scene must already be at the frame being keyed
+        settings = scene.fp_stereo
+
+        if scene.name not in self._geometry:
+            self._geometry[scene.name] = GeometryHash(scene)
+
+        values = {
+            "geometry" : self._geometry[scene.name],
+            "objects" : [
+                (bl_obj.name, [list(row) for row in bl_obj.matrix_world], bl_obj.hide_render)
+                for bl_obj in sorted(scene.objects, key=lambda o: o.name)
+            ],
+            "render" : _rna_values(scene.render.image_settings),
+            "resolution" : [scene.render.resolution_x, scene.render.resolution_y, scene.render.resolution_percentage],
+            "cycles" : _rna_values(scene.cycles, depth=0),
+            "view" : _rna_values(scene.view_settings, depth=0),
+            "display" : scene.display_settings.display_device,
+            # Light levels may change per frame (see render.Level)
+            "lights" : [
+                (bl_obj.name, _rna_values(bl_obj.data, depth=0))
+                for bl_obj in sorted(scene.objects, key=lambda o: o.name) if bl_obj.type == 'LIGHT'
+            ],
+        }
+
+        if scene.world is not None and scene.world.node_tree is not None:
+            values["world"] = [
+                (node.name, [getattr(socket, "default_value", None) for socket in node.inputs])
+                for node in scene.world.node_tree.nodes
+            ]
+
+        if devices.BL_Camera.is_camera(settings.camera):
+            values["camera"] = _rna_values(settings.camera.data.sfdi)
+            values["camera_data"] = _rna_values(settings.camera.data, depth=0)
+
+        if devices.BL_Projector.is_projector(settings.projector):
+            values["projector"] = _rna_values(settings.projector.data.sfdi)
+            values["projector_data"] = _rna_values(settings.projector.data, depth=0)
+
+        # Border renders depend on the crop settings
+        if settings.crop:
+            target = settings.crop_target or settings.char_board
+            values["crop"] = [settings.crop_padding, settings.crop_fill, target.name if target else None]
+
+        # The seed changes every frame when animated
+        if scene.cycles.use_animated_seed: values["frame"] = scene.frame_current
+
+        return _digest(values)
+
+    def fetch(self, key, filepath):
+        filepath = Path(filepath)
+
+        cached = self._path(key, filepath.suffix)
+        if not cached.exists(): return False
+
+        filepath.unlink(missing_ok=True)
+
+        try:
+            os.link(cached, filepath)
+        except OSError:
+            # Different filesystem, or no hard link support
+            shutil.copy2(cached, filepath)
+
+        # Most recently used
+        os.utime(cached)
+
+        return True
+
+    def store(self, key, filepath):
+        filepath = Path(filepath)
+
+        cached = self._path(key, filepath.suffix)
+        if cached.exists(): return
+
+        cached.parent.mkdir(exist_ok=True)
+
+        tmp = cached.with_name(f".{cached.name}.tmp")
+        shutil.copy2(filepath, tmp)
+        os.replace(tmp, cached)
+        os.utime(cached)
+
+        self._size += cached.stat().st_size
+        self.evict()
+
+    def evict(self):
+        if self.max_bytes is None or self._size <= self.max_bytes: return
+
+        # Least recently used first
+        files = sorted(self._files(), key=lambda p: p.stat().st_mtime)
+
+        self._size = sum(p.stat().st_size for p in files)
+
+        for filepath in files:
+            if self._size <= self.max_bytes: break
+
+            self._size -= filepath.stat().st_size
+            filepath.unlink(missing_ok=True)
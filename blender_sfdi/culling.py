@@ -0,0 +1,224 @@
+import numpy as np
+import mathutils
+
+from bpy_extras import anim_utils
+from mathutils import Vector
+
+from . import devices, sweep
+from .utils import HideObjects
+
+# Frustum culling
+# Before rendering, every mesh object is tested against the frusta of the rig cameras and projectors
+# at each board pose (or timeline frame). Objects which are outside of all of them can not be seen
+# and are not lit by a projector, so hide_render is keyed on for those poses. Objects inside a projector
+# frustum are kept even when they are not seen, they may still cast shadows onto the visible scene.
+#
+# Objects outside of every frustum only ever reach the camera through ambient bounce light, which
+# is dropped. The board, the crop target and objects with their own hide_render animation are never culled.
+# A projector which is shadow linked to its measured collection only keeps the measured objects.
+
+CULLED_STR = "sfdi_culled"
+
+def FrustumPlanes(corners, perspective=True, near=None, far=None):
+    # Inward (normal, offset) planes of a frustum looking down -z, from the 4 corners of its frame
+    # in local space. Points p are inside when normal . p >= offset for every plane
+    centre = sum(corners, Vector()) / len(corners)
+
+    planes = []
+    for a, b in zip(corners, corners[1:] + corners[:1]):
+        if perspective: normal, offset = a.cross(b), 0.0
+        else:
+            normal = (b - a).cross(Vector((0.0, 0.0, -1.0)))
+            offset = normal.dot(a)
+
+        # Orient towards the centre of the frame
+        if normal.dot(centre) < offset: normal, offset = -normal, -offset
+
+        planes.append((normal, offset))
+
+    # In front of the device, or between the clip distances
+    planes.append((Vector((0.0, 0.0, -1.0)), near or 0.0))
+    if far is not None: planes.append((Vector((0.0, 0.0, 1.0)), -far))
+
+    normals = np.array([normal for normal, _ in planes], dtype=np.float64)
+    offsets = np.array([offset for _, offset in planes], dtype=np.float64)
+
+    return normals, offsets
+
+def CameraFrustum(scene, camera):
+    # World to camera space and the planes of the camera view
+    data = camera.bl_obj.data
+    corners = [Vector(c) for c in data.view_frame(scene=scene)]
+
+    planes = FrustumPlanes(corners, perspective=data.type != 'ORTHO', near=data.clip_start, far=data.clip_end)
+
+    return np.array(camera.bl_obj.matrix_world.inverted()), planes
+
+def ProjectorFrustum(projector):
+    # Mirrors BL_Projector.__generate_shader: points are lit when the Mapping node takes their light
+    # space (x/z, y/z) into [0, 1], so the frame corners are found by inverting the Mapping node.
+    # The aspect and throw ratios are driven into the Mapping node and the object scale
+    mapping = projector.bl_obj.data.node_tree.nodes["Mapping"]
+    location, rotation, scale = (Vector(mapping.inputs[i].default_value) for i in (1, 2, 3))
+
+    inverse = mathutils.Euler(rotation).to_matrix().transposed()
+
+    corners = []
+    for u, v in ((0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0)):
+        x, y, _ = inverse @ (Vector((u, v, 0.0)) - location)
+
+        # The spot points down -z, so (x/z, y/z) = (a, b) at z = -1 is (-a, -b, -1)
+        corners.append(Vector((-x / scale.x, -y / scale.y, -1.0)))
+
+    # The texture coordinate normal is taken to light space with the transposed object matrix
+    matrix = projector.bl_obj.matrix_world
+    to_light = matrix.to_3x3().transposed()
+
+    to_local = to_light.to_4x4()
+    to_local.translation = -(to_light @ matrix.translation)
+
+    return np.array(to_local), FrustumPlanes(corners)
+
+def ProjectorAffects(projector, bl_objs):
+    # Objects which the projector lights or is shadowed by, see BL_Projector.set_light_linking
+    blockers = projector.bl_obj.light_linking.blocker_collection
+    if blockers is None: return np.ones(len(bl_objs), dtype=bool)
+
+    linked = set(blockers.all_objects)
+
+    return np.array([bl_obj in linked for bl_obj in bl_objs], dtype=bool)
+
+def WorldBounds(bl_objs):
+    # (n, 8, 3) world space bounding box corners
+    return np.array([
+        [list(bl_obj.matrix_world @ Vector(corner)) for corner in bl_obj.bound_box]
+        for bl_obj in bl_objs
+    ], dtype=np.float64).reshape(len(bl_objs), 8, 3)
+
+def OutsideFrustum(bounds, frustum):
+    # Conservative: a box is only outside when all of its corners are behind the same plane
+    to_local, (normals, offsets) = frustum
+
+    local = bounds @ to_local[:3, :3].T + to_local[:3, 3]
+    distances = local @ normals.T - offsets
+
+    return (distances < 0.0).all(axis=1).any(axis=-1)
+
+def CullCandidates(scene):
+    settings = scene.fp_stereo
+    keep = {settings.char_board, settings.crop_target}
+
+    candidates = []
+    for bl_obj in sorted(scene.objects, key=lambda o: o.name):
+        if bl_obj.type != 'MESH' or bl_obj in keep: continue
+
+        # Culled by a previous run, so the hide_render keys are ours
+        if bl_obj.get(CULLED_STR): candidates.append(bl_obj)
+        elif not bl_obj.hide_render and not IsAnimated(bl_obj, "hide_render"): candidates.append(bl_obj)
+
+    return candidates
+
+def IsAnimated(bl_obj, data_path):
+    anim = bl_obj.animation_data
+    if anim is None or anim.action is None: return False
+
+    channelbag = anim_utils.action_get_channelbag_for_slot(anim.action, anim.action_slot)
+
+    return channelbag is not None and channelbag.fcurves.find(data_path) is not None
+
+def ClearCulling(bl_objs):
+    # Removes the hide_render keys of a previous run
+    for bl_obj in bl_objs:
+        if not bl_obj.get(CULLED_STR): continue
+
+        anim = bl_obj.animation_data
+        if anim is not None and anim.action is not None:
+            channelbag = anim_utils.action_get_channelbag_for_slot(anim.action, anim.action_slot)
+            fcurve = channelbag.fcurves.find("hide_render") if channelbag is not None else None
+
+            if fcurve is not None: channelbag.fcurves.remove(fcurve)
+
+        del bl_obj[CULLED_STR]
+        HideObjects([bl_obj], False)
+
+def CulledCurves(scene):
+    # hide_render F-curves keyed by KeyCulling
+    curves = []
+    for bl_obj in sorted(scene.objects, key=lambda o: o.name):
+        anim = bl_obj.animation_data
+        if not bl_obj.get(CULLED_STR) or anim is None or anim.action is None: continue
+
+        channelbag = anim_utils.action_get_channelbag_for_slot(anim.action, anim.action_slot)
+        fcurve = channelbag.fcurves.find("hide_render") if channelbag is not None else None
+
+        if fcurve is not None: curves.append(fcurve)
+
+    return curves
+
+def CulledObjects(scene, bl_objs):
+    # Objects outside of every camera and projector frustum at the current frame
+    if not bl_objs: return []
+
+    bounds = WorldBounds(bl_objs)
+
+    outside = np.ones(len(bl_objs), dtype=bool)
+    for camera in devices.BL_Camera.rig_cameras(scene.fp_stereo):
+        outside &= OutsideFrustum(bounds, CameraFrustum(scene, camera))
+
+    for projector in devices.BL_Projector.rig_projectors(scene):
+        outside &= OutsideFrustum(bounds, ProjectorFrustum(projector)) | ~ProjectorAffects(projector, bl_objs)
+
+    return [bl_obj for bl_obj, culled in zip(bl_objs, outside) if culled]
+
+def CullingFrames(frames, mode):
+    # Timeline frames at which visibility is tested, the first frame of every pose by default
+    cull_frames = []
+    previous_pose = None
+
+    for frame_id, group in sweep.GroupBy(frames, lambda f: f["frame"]):
+        if mode == "FRAME" or not cull_frames or previous_pose != group[0]["pose"]:
+            cull_frames.append(frame_id)
+
+        previous_pose = group[0]["pose"]
+
+    return cull_frames
+
+def KeyCulling(scene, frames, mode="POSE"):
+    # Keys hide_render of every object which can not contribute to the render, returns the number of
+    # culled (object, frame) pairs
+    bl_objs = CullCandidates(scene)
+    ClearCulling(bl_objs)
+
+    if mode == "NONE" or not frames: return 0
+
+    frame_current = scene.frame_current
+    cull_frames = CullingFrames(frames, mode)
+
+    culled = {}
+    for frame_id in cull_frames:
+        scene.frame_set(frame_id)
+        culled[frame_id] = set(CulledObjects(scene, bl_objs))
+
+    scene.frame_set(frame_current)
+
+    count = 0
+    for bl_obj in bl_objs:
+        states = [bl_obj in culled[frame_id] for frame_id in cull_frames]
+        if not any(states): continue
+
+        bl_obj[CULLED_STR] = True
+
+        # Only key visibility changes
+        previous = None
+        for frame_id, state in zip(cull_frames, states):
+            if state != previous:
+                HideObjects([bl_obj], state)
+                bl_obj.keyframe_insert(data_path="hide_render", frame=frame_id)
+
+            previous = state
+
+        count += sum(states)
+
+    scene.frame_set(frame_current)
+
+    return count
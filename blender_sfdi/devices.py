@@ -2,7 +2,8 @@ import bpy
 import numpy as np
 
 from opensfdi import devices, characterisation as ch
-from .utils import AddDriver
+from .utils import AddDriver, AddExpressionDriver
+from .profiles import ApplyProfile
 
 
 # Camera
@@ -27,6 +28,18 @@ class BL_Camera(devices.BaseCamera):
 
         return data.type == "CAMERA"
 
+    @staticmethod
+    def rig_cameras(settings):
+        # Main camera first, then the additional cameras of a multi-view rig
+        bl_objs = [settings.camera] + [item.camera for item in settings.cameras]
+
+        cameras = []
+        for bl_obj in bl_objs:
+            if BL_Camera.is_camera(bl_obj) and all(camera.bl_obj != bl_obj for camera in cameras):
+                cameras.append(BL_Camera(bl_obj))
+
+        return cameras
+
     @staticmethod
     def create_bl_obj(location=None, rotation=None, name="Camera"):
         bl_obj = bpy.data.objects.new(name, bpy.data.cameras.new(name))
@@ -47,6 +60,26 @@ class BL_Camera(devices.BaseCamera):
 
     def capture(self):
         pass
+
+    def set_scene(self, scene):
+        # Camera settings
+        scene.render.fps = self.refresh_rate
+        scene.render.resolution_x = self.resolution[0]
+        scene.render.resolution_y = self.resolution[1]
+        scene.render.image_settings.color_mode = "RGB" if self.channels == 3 else "BW"
+
+        # Cycles engine
+        scene.render.engine = "CYCLES"
+
+        # Pixel bit depth
+        scene.render.image_settings.color_depth = self.settings.bit_depth
+
+        # Use .tif
+        scene.render.image_settings.file_format = self.settings.file_format
+        if self.settings.file_format == "TIFF": scene.render.image_settings.tiff_codec = 'NONE'
+
+        # Render profile and number of samples
+        scene.cycles.samples = ApplyProfile(scene, self.settings.render_profile, self.settings.render_samples)
     
     @property
     def resolution(self):
@@ -100,6 +133,9 @@ class BL_Projector(devices.BaseProjector):
 
     MASK_NAME = "ProjectorImage"
 
+    # Extra spread of the spot cone around the image corners
+    CONE_MARGIN = 1.02
+
     def __init__(self, bl_obj, char:ch.ZhangChar=None):
         super().__init__(char=char)
 
@@ -112,6 +148,80 @@ class BL_Projector(devices.BaseProjector):
 
         return (bl_obj.type == "LIGHT") and (BL_Projector.IS_PROJECTOR_STR in bl_obj.data)
 
+    @staticmethod
+    def rig_projectors(scene):
+        # Sweep projector first, then every other projector which is rendered
+        projector = scene.fp_stereo.projector
+
+        others = [
+            bl_obj for bl_obj in sorted(scene.objects, key=lambda o: o.name)
+            if bl_obj != projector and BL_Projector.is_projector(bl_obj) and not bl_obj.hide_render
+        ]
+
+        return [BL_Projector(bl_obj) for bl_obj in [projector] + others if BL_Projector.is_projector(bl_obj)]
+
+    @staticmethod
+    def lightgroup_name(bl_obj):
+        # Light group names may only contain letters, digits and underscores
+        return "".join(c if c.isalnum() else "_" for c in bl_obj.name)
+
+    @staticmethod
+    def set_lightgroup(bl_obj, scene):
+        name = BL_Projector.lightgroup_name(bl_obj)
+
+        for view_layer in scene.view_layers:
+            if name not in view_layer.lightgroups: view_layer.lightgroups.add(name=name)
+
+        bl_obj.lightgroup = name
+
+    # Shader nodes the drivers and render modes rely on
+    REQUIRED_NODES = ["Mapping", "Image Mask", "Channel 1", "Channel 2", "Channel 3", "Channels Switch", "Light Falloff Switch"]
+
+    @staticmethod
+    def drivers(bl_obj):
+        # (to_drive, prop, data_path, index) of every driver from the projector settings to its shader
+        node_tree = bl_obj.data.node_tree
+
+        drivers = [
+            # Aspect Ratio
+            (node_tree.nodes["Mapping"].inputs[3], 'default_value', 'data.sfdi.aspect_ratio', 1),
+
+            # Throw Ratio: TODO: Currently inverse relationship, need to flip in driver
+            (bl_obj, 'scale', 'data.sfdi.throw_ratio', 2),
+        ]
+
+        for i in range(3):
+            node = node_tree.nodes[f"Channel {i+1}"]
+
+            for name, prop in [("Intensity", "intensity"), ("Stripe Count", "stripe_count"), ("Phase", "phase"), ("Rotation", "rotation"), ("Noise", "noise")]:
+                drivers.append((node.inputs[name], 'default_value', f'data.sfdi.channels_list[{i}].{prop}', -1))
+
+        return drivers
+
+    @staticmethod
+    def set_drivers(bl_obj):
+        for to_drive, prop, data_path, index in BL_Projector.drivers(bl_obj):
+            AddDriver(to_drive, bl_obj, prop, data_path, index=index)
+
+    @staticmethod
+    def set_spot_driver(bl_obj):
+        # Tightest spot cone around the projected image, so light samples are not spent where the mask is zero.
+        # The image corners are at (x/z, y/z) = (t/2, t/(2 * a)) in light space (see the Mapping node), and
+        # the cone is stretched by the throw ratio object scale, so tan(spot_size / 2) = t^2 / 2 * sqrt(1 + 1 / a^2)
+        bl_obj.data.spot_blend = 0.0
+
+        AddExpressionDriver(bl_obj.data, bl_obj, 'spot_size',
+            {"t" : 'data.sfdi.throw_ratio', "a" : 'data.sfdi.aspect_ratio'},
+            f"2 * atan({BL_Projector.CONE_MARGIN} * t * t / 2 * sqrt(1 + 1 / (a * a)))")
+
+    @staticmethod
+    def set_light_linking(bl_obj):
+        # Cycles light / shadow linking to the measured collection, other lights still reach everything
+        settings = bl_obj.data.sfdi
+
+        bl_obj.light_linking.receiver_collection = settings.measured
+        bl_obj.light_linking.blocker_collection = settings.measured if settings.shadow_linking else None
+
     @staticmethod
     def __fringe_shader():
         # Check if exists already, and return
@@ -682,6 +792,9 @@ class BL_Projector(devices.BaseProjector):
         bl_light_obj = bpy.data.objects.new(name=name, object_data=bl_light_data)
         bpy.context.collection.objects.link(bl_light_obj)
 
+        # Own light group so every projector can be written from a single render
+        BL_Projector.set_lightgroup(bl_light_obj, bpy.context.scene)
+
         # Set default property values
         bl_light_data.sfdi.channels = "RGB" if channels == 3 else "Monochrome"
         for _ in range(max(3, channels)): bl_light_data.sfdi.channels_list.add()
@@ -690,29 +803,16 @@ class BL_Projector(devices.BaseProjector):
         bl_light_data[BL_Projector.IS_PROJECTOR_STR] = True
 
         # Add drivers for props to shader
-        node_tree = bl_light_data.node_tree
-
-        # Aspect Ratio
-        AddDriver(node_tree.nodes["Mapping"].inputs[3], bl_light_obj, 'default_value', 'data.sfdi.aspect_ratio', index=1)
+        BL_Projector.set_drivers(bl_light_obj)
 
-        # Throw Ratio: TODO: Currently inverse relationship, need to flip in driver
-        AddDriver(bl_light_obj, bl_light_obj, 'scale', 'data.sfdi.throw_ratio', index=2)
+        # Spot cone around the image, follows the throw and aspect ratios
+        BL_Projector.set_spot_driver(bl_light_obj)
 
         # Channels (Currently Not Supported as of Blender 5.0)
         # AddDriver(node_tree.nodes["Channels Switch"].inputs[0], bl_light_obj, 'default_value', 'data.sfdi.channels')
         
         # Light Falloff (Currently Not Supported as of Blender 5.0)
         # AddDriver(node_tree.nodes["Light Falloff Switch"].inputs[0], bl_light_obj, 'default_value', f'data.sfdi.light_falloff')
-
-        for i in range(3):
-            node = node_tree.nodes[f"Channel {i+1}"]
-
-            AddDriver(node.inputs["Intensity"], bl_light_obj, 'default_value', f'data.sfdi.channels_list[{i}].intensity')
-            AddDriver(node.inputs["Stripe Count"], bl_light_obj, 'default_value', f'data.sfdi.channels_list[{i}].stripe_count')
-            AddDriver(node.inputs["Phase"], bl_light_obj, 'default_value', f'data.sfdi.channels_list[{i}].phase')
-            AddDriver(node.inputs["Rotation"], bl_light_obj, 'default_value', f'data.sfdi.channels_list[{i}].rotation')
-            AddDriver(node.inputs["Noise"], bl_light_obj, 'default_value', f'data.sfdi.channels_list[{i}].noise')
-            
         
         # TODO: Figure out resolution
 
@@ -785,6 +885,10 @@ class BL_Projector(devices.BaseProjector):
     def light_falloff(self):
         return self.settings.light_falloff
 
+    @property
+    def lightgroup(self):
+        return self.bl_obj.lightgroup or BL_Projector.lightgroup_name(self.bl_obj)
+
     @property
     def bl_obj(self):
         return self._bl_obj
@@ -0,0 +1,180 @@
+import sys
+import json
+import math
+import time
+import argparse
+import tempfile
+
+from pathlib import Path
+
+if __name__ == "__main__" and not __package__:
+    # Run as a script through "blender -b -P blender_sfdi/estimate.py", so make the package importable
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    import blender_sfdi
+    __package__ = "blender_sfdi"
+
+from . import batch, planner, render, sweep
+from .sweep import StratifiedUnits
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+# Dry-run estimator
+# Renders a stratified sample of the sweep with the configured settings into a temporary directory
+# and extrapolates render time, memory and disk usage for the whole sweep.
+#
+#   python -m blender_sfdi.estimate job.json --samples 4 --workers 1 2 4 8
+#
+# Frames are sampled in the units the render mode renders together (timeline frames, or whole poses
+# for the synthesis modes). The first unit also pays for scene sync, BVH build and kernel compilation,
+# which is counted once per worker. Workers are assumed to be separate nodes (see workqueue.py).
+
+DEFAULT_WORKERS = [1, 2, 4, 8]
+
+def PeakMemory():
+    # Peak resident memory of this process in bytes, None when unknown
+    if resource is None: return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def UnitKey(driver):
+    # Frames rendered together by the driver
+    return getattr(driver, "group_key", lambda params: params["frame"])
+
+def EstimateRender(scene, frames, mode=None, samples=4, workers=None):
+    mode = (mode or scene.fp_stereo.render_mode).upper()
+    workers = workers or DEFAULT_WORKERS
+
+    if not frames: raise ValueError("The sweep has no frames to estimate")
+
+    if mode not in batch.DRIVERS:
+        raise ValueError(f"Unknown render mode '{mode}', expected one of {list(batch.DRIVERS)}")
+
+    with tempfile.TemporaryDirectory(prefix="sfdi_estimate_") as output_dir:
+        driver = batch.DRIVERS[mode](scene, output_dir=output_dir, resume=False)
+
+        units = sweep.GroupBy(frames, UnitKey(driver))
+        picked = StratifiedUnits(units, samples)
+
+        times = []
+        sizes = []
+        for _, unit in picked:
+            start = time.monotonic()
+            entries = driver.render(unit)
+            times.append(time.monotonic() - start)
+
+            sizes.extend((Path(output_dir) / entry["file"]).stat().st_size for entry in entries)
+
+    scene.frame_set(frames[0]["frame"])
+
+    outputs = len(driver.output_frames(frames))
+
+    # Later units run warm, the first one also pays for the setup
+    seconds_per_unit = sum(times[1:]) / (len(times) - 1) if 1 < len(times) else times[0]
+    setup_seconds = max(0.0, times[0] - seconds_per_unit)
+
+    bytes_per_output = sum(sizes) / len(sizes) if sizes else 0.0
+    peak_ram = PeakMemory()
+
+    return {
+        "mode" : mode,
+        "timeline_frames" : len({params["frame"] for params in frames}),
+        "outputs" : outputs,
+        "units" : len(units),
+        "sampled_units" : len(picked),
+        "sampled_outputs" : len(sizes),
+        "setup_seconds" : setup_seconds,
+        "seconds_per_unit" : seconds_per_unit,
+        "seconds_per_output" : seconds_per_unit * len(units) / outputs,
+        "bytes_per_output" : bytes_per_output,
+        "peak_ram_bytes" : peak_ram,
+        "bvh_rebuilds" : planner.CountRebuilds(scene, frames),
+        "total_seconds" : setup_seconds + seconds_per_unit * len(units),
+        "total_bytes" : bytes_per_output * outputs,
+        "workers" : [
+            {
+                "workers" : count,
+                "seconds" : setup_seconds + seconds_per_unit * math.ceil(len(units) / count),
+                # Every worker holds its own copy of the scene
+                "peak_ram_bytes" : peak_ram * count if peak_ram is not None else None,
+            }
+            for count in workers
+        ],
+    }
+
+def FormatDuration(seconds):
+    hours, remainder = divmod(int(round(seconds)), 3600)
+    minutes, seconds = divmod(remainder, 60)
+
+    return f"{hours}h {minutes:02d}m {seconds:02d}s"
+
+def FormatBytes(size):
+    if size is None: return "unknown"
+
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024: return f"{size:.1f} {unit}"
+        size /= 1024
+
+    return f"{size:.1f} TB"
+
+def FormatEstimate(estimate):
+    lines = [
+        f"{estimate['mode']}: {estimate['outputs']} outputs from {estimate['timeline_frames']} timeline frames "
+        f"({estimate['sampled_units']} of {estimate['units']} render units sampled)",
+        f"Per output: {estimate['seconds_per_output']:.2f}s, {FormatBytes(estimate['bytes_per_output'])}, "
+        f"setup {estimate['setup_seconds']:.1f}s",
+        f"Total: {FormatDuration(estimate['total_seconds'])}, {FormatBytes(estimate['total_bytes'])} on disk, "
+        f"{FormatBytes(estimate['peak_ram_bytes'])} peak RAM, {estimate['bvh_rebuilds']} BVH builds",
+    ]
+
+    for entry in estimate["workers"]:
+        lines.append(f"  {entry['workers']} workers: {FormatDuration(entry['seconds'])}, {FormatBytes(entry['peak_ram_bytes'])} RAM")
+
+    return lines
+
+def ParseArgs(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(prog="blender_sfdi.estimate", description="Estimate render time, memory and disk usage of a job")
+    parser.add_argument("job", help="Job spec (.json or .toml)")
+    parser.add_argument("--blend", default=None, help="Rig .blend file, overrides the job spec")
+    parser.add_argument("--frames", default=None, help="Inclusive frame range to estimate, e.g. 0:99")
+    parser.add_argument("--mode", default=None, help=f"Render mode, one of {list(batch.DRIVERS)}")
+    parser.add_argument("--samples", type=int, default=4, help="Render units to render")
+    parser.add_argument("--workers", type=int, nargs="+", default=DEFAULT_WORKERS, help="Worker counts to extrapolate to")
+    parser.add_argument("--threads", type=int, default=None, help="Render threads, 0 for automatic")
+    parser.add_argument("--json", default=None, help="Also write the estimate to this file")
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = ParseArgs(argv)
+
+    job = batch.LoadJob(args.job)
+    scene = batch.PrepareScene(job, blend=args.blend)
+
+    threads = args.threads if args.threads is not None else job.get("render", {}).get("threads")
+    render.SetThreads(scene, threads)
+
+    frames = batch.JobFrames(scene, job, args.frames)
+    mode = args.mode or job.get("render", {}).get("mode")
+
+    estimate = EstimateRender(scene, frames, mode=mode, samples=args.samples, workers=args.workers)
+
+    for line in FormatEstimate(estimate): print(line)
+
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(estimate, json_file, indent=2)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
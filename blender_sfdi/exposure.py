@@ -0,0 +1,142 @@
+import bpy
+import tempfile
+import contextlib
+
+import numpy as np
+
+from pathlib import Path
+
+from . import devices, images
+from .numeric import EnergyScale, Peak, ProbeComponents
+from .render import ImageFormat, RenderSettings
+from .utils import MuteAnimation
+
+# Automatic exposure
+# Renders two low resolution, low sample probes per board pose with a constant projector pattern,
+# DC (half intensity) and full white, at the scene energy and exposure. The image is linear in the
+# projector light, so with P the projector and A the ambient contribution
+#   dc = A + P / 2, white = A + P  ->  P = 2 (white - dc), A = 2 dc - white
+# and the projector energy (PG_AutoExposureSettings.mode "ENERGY") or view exposure ("EXPOSURE") is
+# chosen so that the peak (a high percentile, robust to fireflies) of the brightest pose hits the target.
+# Exposure also scales the ambient light, energy does not.
+#
+# One value is chosen for the whole sweep so intensities stay comparable between poses. It is kept
+# in PG_AutoExposureSettings and written to the metadata with the pose which limited it. Jobs split
+# across workers are tuned once by the coordinator, which hands the value to the workers.
+
+class BoardPose:
+    # Temporarily moves the board to a pose, without its animation
+    def __init__(self, char_board, pose):
+        self._bl_obj = char_board.bl_obj if char_board is not None else None
+        self._pose = pose
+        self._saved = None
+
+    def __enter__(self):
+        if self._bl_obj is None or self._pose is None: return self
+
+        self._saved = (tuple(self._bl_obj.delta_location), tuple(self._bl_obj.delta_rotation_quaternion))
+
+        self._bl_obj.delta_location = self._pose.translation
+        self._bl_obj.delta_rotation_quaternion = self._pose.rotation
+
+        return self
+
+    def __exit__(self, *args):
+        if self._saved is None: return
+
+        self._bl_obj.delta_location, self._bl_obj.delta_rotation_quaternion = self._saved
+        self._saved = None
+
+class Probe:
+    # Low resolution, low sample float renders of a constant projector pattern
+    def __init__(self, scene, projector, directory):
+        self.scene = scene
+        self.projector = projector
+        self.directory = Path(directory)
+
+    def render(self, name, intensity):
+        scene = self.scene
+        path = self.directory / f"{name}.exr"
+
+        with contextlib.ExitStack() as stack:
+            for channel in self.projector.settings.channels_list:
+                stack.enter_context(RenderSettings(channel, stripe_count=0.0, phase=0.0, intensity=intensity, noise=0.0))
+
+            scene.render.filepath = str(path)
+            bpy.ops.render.render(write_still=True, scene=scene.name)
+
+        # Float renders skip the view transform
+        return images.LoadImage(path) * 2.0 ** scene.view_settings.exposure
+
+    def pose(self, name):
+        # (projector, ambient) of the current pose
+        return ProbeComponents(self.render(f"{name}_dc", 0.5), self.render(f"{name}_white", 1.0))
+
+def ApplyExposure(scene, value, limiting_pose=-1):
+    # Sets a tuned energy or exposure, also used by workers with the value their coordinator chose
+    fp_stereo = scene.fp_stereo
+    settings = fp_stereo.auto_exposure
+
+    if settings.mode == "ENERGY": fp_stereo.projector.data.energy = value
+    else: scene.view_settings.exposure = value
+
+    settings.value = value
+    settings.limiting_pose = limiting_pose
+    settings.tuned = True
+
+def AutoExposure(scene):
+    # Probes every board pose, applies the chosen energy or exposure and returns the value of every pose
+    fp_stereo = scene.fp_stereo
+    settings = fp_stereo.auto_exposure
+
+    if settings.mode == "OFF": return None
+
+    camera = devices.BL_Camera.from_bl_obj(fp_stereo.camera)
+    projector = devices.BL_Projector.from_bl_obj(fp_stereo.projector)
+
+    char_board = devices.BL_CharBoard.from_bl_obj(fp_stereo.char_board) if devices.BL_CharBoard.is_char_board(fp_stereo.char_board) else None
+    poses = list(char_board.settings.poses) if char_board is not None and char_board.settings.poses else [None]
+
+    energy = projector.bl_obj.data.energy
+    exposure = scene.view_settings.exposure
+
+    results = []
+    with contextlib.ExitStack() as stack:
+        directory = stack.enter_context(tempfile.TemporaryDirectory(prefix="sfdi_exposure_"))
+
+        # Board and projector values are set directly
+        bl_ids = [projector.bl_obj.data] + ([char_board.bl_obj] if char_board is not None else [])
+        stack.enter_context(MuteAnimation(*bl_ids))
+
+        stack.enter_context(RenderSettings(scene.render, resolution_percentage=settings.probe_scale))
+        stack.enter_context(RenderSettings(scene.cycles, samples=settings.probe_samples))
+        stack.enter_context(ImageFormat(scene))
+
+        probe = Probe(scene, projector, directory)
+
+        for i, pose in enumerate(poses):
+            with BoardPose(char_board, pose):
+                components = probe.pose(f"pose{i}")
+
+            white = components[0] + components[1]
+            result = {"pose" : i if pose is not None else None, "peak" : Peak(white, camera.channels, settings.percentile)}
+
+            if settings.mode == "ENERGY":
+                scale = EnergyScale(*components, settings.target, camera.channels, settings.percentile)
+                result["value"] = energy * scale if scale is not None else None
+            elif 0.0 < result["peak"]:
+                result["value"] = exposure + float(np.log2(settings.target / result["peak"]))
+            else:
+                result["value"] = None
+
+            results.append(result)
+
+    tuned = [result for result in results if result["value"] is not None]
+    if not tuned: raise ValueError("Projector light does not reach the camera at any pose")
+
+    # The brightest pose limits the value
+    limiting = min(tuned, key=lambda result: result["value"])
+
+    ApplyExposure(scene, limiting["value"], limiting["pose"] if limiting["pose"] is not None else -1)
+
+    return {"mode" : settings.mode, "value" : limiting["value"], "limiting_pose" : limiting["pose"], "poses" : results}
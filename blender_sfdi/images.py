@@ -0,0 +1,46 @@
+import os
+import bpy
+import numpy as np
+import tifffile
+
+from .numeric import LUMINANCE, BorderPixels, Demultiplex, Quantise, ToChannels
+
+# Image IO for frames which are composed in NumPy rather than written by Blender
+# Renders are loaded as linear float (h, w, 3) arrays, outputs are written with the camera bit depth
+
+def LoadImage(filepath):
+    bl_image = bpy.data.images.load(str(filepath), check_existing=False)
+
+    try:
+        w, h = bl_image.size
+        channels = bl_image.channels
+
+        pixels = np.empty(w * h * channels, dtype=np.float32)
+        bl_image.pixels.foreach_get(pixels)
+    finally:
+        bpy.data.images.remove(bl_image)
+
+    # Blender images start at the bottom left
+    return np.flipud(pixels.reshape(h, w, channels))[..., :3].copy()
+
+def WriteTiff(filepath, image):
+    # Written next to filepath and moved over it, so files hard linked from the render cache
+    # are replaced rather than written through
+    filepath = str(filepath)
+    temp_path = f"{filepath}.tmp"
+
+    tifffile.imwrite(temp_path, image, photometric='minisblack' if image.ndim == 2 else 'rgb')
+    os.replace(temp_path, filepath)
+
+def SaveImage(filepath, image, bit_depth=8, channels=3):
+    WriteTiff(filepath, Quantise(ToChannels(image, channels), bit_depth))
+
+def CompositeBorder(filepath, background_path, border):
+    # Fills a border render outside of its border from a full frame render with the same format
+    image = tifffile.imread(str(filepath))
+    background = tifffile.imread(str(background_path))
+
+    rows, cols = BorderPixels(image.shape, border)
+    background[rows, cols] = image[rows, cols]
+
+    WriteTiff(filepath, background)
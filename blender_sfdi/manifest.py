@@ -0,0 +1,80 @@
+import os
+import json
+import socket
+import hashlib
+
+from pathlib import Path
+
+from .sweep import FrameName
+
+# Completion manifest
+# Append-only record of every frame which has been fully written to disk, so an interrupted
+# render can carry on where it stopped. Each line holds the frame parameters, the output file,
+# its size in bytes and a checksum.
+#
+# Every writer appends to its own file (manifest.<host>.<pid>.jsonl) so several processes can
+# render into the same directory, readers merge all of them.
+
+MANIFEST_GLOB = "manifest*.jsonl"
+
+def Checksum(filepath, chunk_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+
+    with open(filepath, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+class Manifest:
+    def __init__(self, output_dir, name=None):
+        self.output_dir = Path(output_dir)
+
+        if name is None: name = f"manifest.{socket.gethostname()}.{os.getpid()}"
+        self.filepath = self.output_dir / f"{name}.jsonl"
+
+    def load(self):
+        entries = {}
+
+        for filepath in sorted(self.output_dir.glob(MANIFEST_GLOB)):
+            with open(filepath, "r") as manifest_file:
+                for line in manifest_file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Partially written line from a crash
+                        continue
+
+                    entries[FrameName(entry)] = entry
+
+        return entries
+
+    def record(self, params, filepath):
+        filepath = Path(filepath)
+
+        entry = dict(params,
+            file=filepath.name,
+            size=filepath.stat().st_size,
+            checksum=Checksum(filepath),
+        )
+
+        with open(self.filepath, "a") as manifest_file:
+            manifest_file.write(json.dumps(entry) + "\n")
+            manifest_file.flush()
+            os.fsync(manifest_file.fileno())
+
+        return entry
+
+    def verify(self, entry, params, full=True):
+        # Parameters must still match, the sweep may have changed since
+        for key, value in params.items():
+            if entry.get(key) != value: return False
+
+        filepath = self.output_dir / entry["file"]
+
+        try:
+            if filepath.stat().st_size != entry["size"]: return False
+        except FileNotFoundError:
+            return False
+
+        return not full or Checksum(filepath) == entry["checksum"]
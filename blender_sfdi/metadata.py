@@ -0,0 +1,157 @@
+from . import devices
+from .profiles import ProfileSettings
+
+# Metadata shared by the Save Metadata operator and the render drivers
+
+def CameraMetadata(camera: devices.BL_Camera):
+    translation = camera.world_matrix.to_translation()
+    rotation = camera.world_matrix.to_quaternion()
+
+    return {
+        "name" : camera.bl_obj.name,
+        "translation" : {
+            "x" : translation.x,
+            "y" : translation.y,
+            "z" : translation.z,
+        },
+        "rotation" : {
+            "w" : rotation.w,
+            "x" : rotation.x,
+            "y" : rotation.y,
+            "z" : rotation.z,
+        },
+        "resolution" : {
+            "width" : camera.resolution[0],
+            "height" : camera.resolution[1],
+        },
+        "channels": camera.channels,
+        "refresh_rate": camera.refresh_rate,
+        "render_samples": camera.render_samples,
+        "sample_mode": camera.settings.sample_mode,
+        "noise_target": camera.settings.noise_target if camera.settings.sample_mode == "NOISE" else None,
+        "time_budget": camera.settings.time_budget if camera.settings.sample_mode == "TIME" else None,
+        "render_profile": camera.settings.render_profile,
+        "render_settings": ProfileSettings(camera.settings.render_profile),
+    }
+
+def ProjectorMetadata(projector: devices.BL_Projector):
+    translation = projector.world_matrix.to_translation()
+    rotation = projector.world_matrix.to_quaternion()
+
+    return {
+        "name" : projector.bl_obj.name,
+        # "resolution" : {
+        #     "width" : {projector.resolution[0]},
+        #     "height" : {projector.resolution[1]},
+        # },
+        "translation" : {
+            "x" : translation.x,
+            "y" : translation.y,
+            "z" : translation.z,
+        },
+        "rotation" : {
+            "w" : rotation.w,
+            "x" : rotation.x,
+            "y" : rotation.y,
+            "z" : rotation.z,
+        },
+        "channels": [{
+                "fringes_type" : projector.settings.channels_list[i].fringes_type,
+                "intensity" : projector.settings.channels_list[i].intensity,
+                "noise" : projector.settings.channels_list[i].noise,
+        } for i in range(projector.channels)],
+
+        "refresh_rate" : projector.refresh_rate,
+        "throw_ratio" : projector.throw_ratio,
+        "aspect_ratio" : projector.aspect_ratio,
+        "light_falloff" : projector.settings.light_falloff,
+        "energy" : projector.bl_obj.data.energy,
+        "measured" : projector.settings.measured.name if projector.settings.measured else None,
+        "shadow_linking" : projector.settings.shadow_linking,
+    }
+
+def CharBoardMetadata(char_board: devices.BL_CharBoard):
+    return {
+        "poses" : [
+            {
+                "translation" : {
+                    "x" : pose.translation[0],
+                    "y" : pose.translation[1],
+                    "z" : pose.translation[2]
+                },
+                "rotation" : {
+                    "w" : pose.rotation[0],
+                    "x" : pose.rotation[1],
+                    "y" : pose.rotation[2],
+                    "z" : pose.rotation[3],
+                }
+            }
+            for pose in char_board.settings.poses
+        ]
+    }
+
+def GenerateMetadata(scene):
+    fp_stereo = scene.fp_stereo
+    fringes_manager = fp_stereo.fringes_manager
+
+    # Add Fringe Manager data first
+    metadata = {
+        "stripe_counts" : [prop.value for prop in fringes_manager.stripe_counts],
+        "phases" : [prop.value for prop in fringes_manager.phases],
+        "rotations" : [prop.value for prop in fringes_manager.rotations],
+        "multiplexing" : fringes_manager.multiplexing,
+    }
+
+    if fringes_manager.multiplexing:
+        metadata["multiplex_mode"] = fringes_manager.multiplex_mode
+        metadata["crosstalk"] = [list(row) for row in fringes_manager.crosstalk]
+
+    if fp_stereo.culling != "NONE": metadata["culling"] = fp_stereo.culling
+
+    # Energy or exposure chosen by the probe renders, see exposure.py
+    auto_exposure = fp_stereo.auto_exposure
+    if auto_exposure.tuned:
+        metadata["auto_exposure"] = {
+            "mode" : auto_exposure.mode,
+            "value" : auto_exposure.value,
+            "target" : auto_exposure.target,
+            "percentile" : auto_exposure.percentile,
+            "limiting_pose" : auto_exposure.limiting_pose if 0 <= auto_exposure.limiting_pose else None,
+            "exposure" : scene.view_settings.exposure,
+        }
+
+    if fp_stereo.crop:
+        target = fp_stereo.crop_target or fp_stereo.char_board
+        metadata["crop"] = {"target" : target.name if target else None, "padding" : fp_stereo.crop_padding, "fill" : fp_stereo.crop_fill}
+
+    # Add camera data if present
+    if devices.BL_Camera.is_camera(fp_stereo.camera):
+        camera = devices.BL_Camera.from_bl_obj(fp_stereo.camera)
+        metadata["camera"] = CameraMetadata(camera)
+
+        # Every camera of a multi-view rig, in output view order
+        cameras = devices.BL_Camera.rig_cameras(fp_stereo)
+        if 1 < len(cameras): metadata["cameras"] = [CameraMetadata(camera) for camera in cameras]
+
+    # Add projector data if present
+    if devices.BL_Projector.is_projector(fp_stereo.projector):
+        projector = devices.BL_Projector.from_bl_obj(fp_stereo.projector)
+        metadata["projector"] = ProjectorMetadata(projector)
+
+    # Add characterisation board data if present
+    if devices.BL_CharBoard.is_char_board(fp_stereo.char_board):
+        char_board = devices.BL_CharBoard.from_bl_obj(fp_stereo.char_board)
+        metadata["char_board"] = CharBoardMetadata(char_board)
+
+    return metadata
+
+def SplitViews(metadata):
+    # Per camera view of a multi-view dataset: its camera and the files it wrote
+    if "cameras" not in metadata: return metadata
+
+    metadata["views"] = [
+        dict(camera, files=[f["file"] for f in metadata.get("frames", []) if f.get("camera") == i])
+        for i, camera in enumerate(metadata["cameras"])
+    ]
+
+    return metadata
@@ -0,0 +1,178 @@
+import numpy as np
+import tifffile
+
+from mathutils import Vector
+from bpy_extras.object_utils import world_to_camera_view
+
+from . import devices
+from .numeric import LUMINANCE, Modulation, SaturatedFraction
+
+# Image sanity monitor
+# Cheap statistics of every frame as it is written (PG_MonitorSettings):
+#   saturated  : fraction of pixels at the maximum value in any channel
+#   mean       : mean intensity in [0, 1]
+#   board      : fraction of the characterisation board inside the camera view, per pose
+#   modulation : median fringe modulation (B / A) of the phase shifts of one stripe count, from the
+#                N-step phase shift estimate, once all of them have been written
+#
+# Each check counts its consecutive failures, after "patience" failures in a row the monitor warns,
+# skips the rest of the pose or aborts the render, and reports why.
+
+# Pixel stride of the modulation estimate
+MODULATION_STRIDE = 4
+
+# Board samples per side
+BOARD_SAMPLES = 5
+
+class MonitorAbort(Exception):
+    # Raised by the ABORT action, check is the name of the failing check
+    def __init__(self, check, report):
+        super().__init__(f"Render aborted by the image monitor, {check} check failed for {report}")
+        self.check = check
+
+def LoadNormalised(filepath):
+    image = tifffile.imread(str(filepath))
+    max_value = np.iinfo(image.dtype).max if np.issubdtype(image.dtype, np.integer) else 1.0
+
+    return image, max_value
+
+def BoardVisibility(scene, camera, board):
+    # Fraction of a grid over the board's bounding box which projects into the camera image
+    corners = [Vector(corner) for corner in board.bound_box]
+    low = Vector(np.min(corners, axis=0))
+    high = Vector(np.max(corners, axis=0))
+
+    visible = 0
+    for u in np.linspace(0.0, 1.0, BOARD_SAMPLES):
+        for v in np.linspace(0.0, 1.0, BOARD_SAMPLES):
+            point = Vector((low.x + u * (high.x - low.x), low.y + v * (high.y - low.y), (low.z + high.z) / 2.0))
+            co = world_to_camera_view(scene, camera, board.matrix_world @ point)
+
+            visible += 0.0 < co.z and 0.0 <= co.x <= 1.0 and 0.0 <= co.y <= 1.0
+
+    return visible / BOARD_SAMPLES ** 2
+
+def PhaseGroup(params):
+    # Output frames which only differ by their phase shift
+    return tuple(params.get(key) for key in ("pose", "rotation", "stripe_count", "level", "projector", "camera"))
+
+class ImageMonitor:
+    def __init__(self, scene, output_dir):
+        self.scene = scene
+        self.output_dir = output_dir
+        self.settings = scene.fp_stereo.monitor
+
+        self.cameras = devices.BL_Camera.rig_cameras(scene.fp_stereo)
+        self.board = scene.fp_stereo.char_board if devices.BL_CharBoard.is_char_board(scene.fp_stereo.char_board) else None
+
+        self.skipped = {}
+        self.reports = []
+
+        self._failures = {}
+        self._board = {}
+
+        # Phase shifts of the phase groups still being written, frames of a group may be interleaved
+        # with other groups (e.g. multi-view rigs or planned render orders)
+        self._groups = {}
+        self._phase_count = len(scene.fp_stereo.fringes_manager.phases)
+
+    def is_skipped(self, params):
+        return params.get("pose") in self.skipped
+
+    def board_visibility(self, params):
+        key = (params.get("pose"), params.get("camera") or 0)
+
+        if key not in self._board:
+            frame_current = self.scene.frame_current
+
+            self.scene.frame_set(params["frame"])
+            self._board[key] = BoardVisibility(self.scene, self.cameras[key[1]].bl_obj, self.board)
+            self.scene.frame_set(frame_current)
+
+        return self._board[key]
+
+    def check(self, name, failed, reason, params):
+        if not failed:
+            self._failures[name] = 0
+            return
+
+        self._failures[name] = self._failures.get(name, 0) + 1
+        if self._failures[name] < self.settings.patience: return
+
+        self._failures.clear()
+
+        pose = params.get("pose")
+        report = f"{self.settings.patience} frames in a row up to frame {params['frame']} (pose {pose}): {reason}"
+
+        if self.settings.action == "ABORT": raise MonitorAbort(name, report)
+
+        if self.settings.action == "SKIP":
+            self.skipped[pose] = reason
+            report = f"Skipped pose {pose}, {report}"
+
+        self.reports.append(report)
+
+    def finish_group(self, group):
+        images = self._groups.pop(group)
+
+        # Constant patterns have no modulation
+        if len(images) < 3 or not group[2]: return
+
+        modulation = Modulation([image for image, _, _ in images], [phase for _, phase, _ in images], self.settings.min_mean)
+
+        self.check("modulation", modulation < self.settings.min_modulation,
+            f"fringe modulation {modulation:.3f} is below {self.settings.min_modulation:.3f}", images[-1][2])
+
+    def observe(self, entry):
+        # Adds the statistics of a written frame to its entry
+        image, max_value = LoadNormalised(self.output_dir / entry["file"])
+
+        stats = {
+            "saturated" : SaturatedFraction(image, max_value),
+            "mean" : float(image.mean() / max_value),
+        }
+
+        if self.board is not None: stats["board"] = self.board_visibility(entry)
+
+        settings = self.settings
+
+        self.check("saturated", settings.max_saturated < stats["saturated"],
+            f"{stats['saturated']:.1%} of pixels are saturated, more than {settings.max_saturated:.1%}", entry)
+        self.check("mean", stats["mean"] < settings.min_mean,
+            f"mean intensity {stats['mean']:.4f} is below {settings.min_mean:.4f}", entry)
+
+        if "board" in stats:
+            self.check("board", stats["board"] < settings.min_board,
+                f"{stats['board']:.0%} of the board is in view, less than {settings.min_board:.0%}", entry)
+
+        if entry.get("phase") is not None:
+            luminance = image @ LUMINANCE if image.ndim == 3 else image
+            small = luminance[::MODULATION_STRIDE, ::MODULATION_STRIDE].astype(np.float32) / max_value
+
+            group = PhaseGroup(entry)
+            images = self._groups.setdefault(group, [])
+            images.append((small, entry["phase"], entry))
+
+            if self._phase_count <= len(images): self.finish_group(group)
+
+        return dict(entry, stats=stats)
+
+    def finish(self):
+        # Phase groups of the render which were not completed, e.g. resumed renders
+        for group in list(self._groups): self.finish_group(group)
+
+    def summary(self):
+        settings = self.settings
+
+        return {
+            "action" : settings.action,
+            "patience" : settings.patience,
+            "thresholds" : {
+                "max_saturated" : settings.max_saturated,
+                "min_mean" : settings.min_mean,
+                "min_modulation" : settings.min_modulation,
+                "min_board" : settings.min_board,
+            },
+            "reports" : self.reports,
+            "skipped_poses" : [{"pose" : pose, "reason" : reason} for pose, reason in self.skipped.items()],
+        }
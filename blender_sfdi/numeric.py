@@ -0,0 +1,139 @@
+import numpy as np
+
+# NumPy helpers of the render drivers, exposure tuning and image monitor. They do not use bpy, so
+# they can be used (and tested) outside of Blender, the modules using them import them from here
+
+# Image channels and formats
+
+LUMINANCE = np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+
+def Demultiplex(image, crosstalk=None):
+    # Separates the projector channels of a multiplexed (h, w, 3) render, crosstalk[i][j] is the
+    # response of camera channel i to projector channel j
+    if crosstalk is None: return image
+
+    return image @ np.linalg.inv(np.asarray(crosstalk, dtype=np.float32)).T
+
+def Quantise(image, bit_depth):
+    max_value = (1 << int(bit_depth)) - 1
+    dtype = np.uint8 if int(bit_depth) <= 8 else np.uint16
+
+    return np.clip(np.rint(image * max_value), 0, max_value).astype(dtype)
+
+def ToChannels(image, channels):
+    if channels == 1 and image.ndim == 3:
+        # Same weights Blender uses for BW output
+        return image @ LUMINANCE
+
+    return image
+
+def BorderPixels(shape, border):
+    # Pixel rows / columns inside a normalised (min_x, max_x, min_y, max_y) render border,
+    # rows start at the top of the image
+    h, w = shape[:2]
+    min_x, max_x, min_y, max_y = border
+
+    rows = slice(h - int(np.floor(max_y * h)), h - int(np.ceil(min_y * h)))
+    cols = slice(int(np.ceil(min_x * w)), int(np.floor(max_x * w)))
+
+    return rows, cols
+
+# Synthesised frames (see synthesis.py)
+
+def SynthesisePhase(dc, cos, sin, phase):
+    c = cos - dc
+    s = dc - sin
+
+    return dc + c * np.cos(phase) - s * np.sin(phase)
+
+def ComposeLevel(projector, ambient, intensity=1.0, energy_scale=1.0, exposure=0.0, ambient_scale=1.0):
+    return (2.0 ** exposure) * (intensity * energy_scale * projector + ambient_scale * ambient)
+
+def FringePattern(x, y, stripe_count, phase, rotation, fringes_type="Sinusoidal", intensity=1.0, noise=0.0, rng=None):
+    # Mirrors the "Fringe Intensity Map" node group
+    rotated = x * np.cos(rotation) - y * np.sin(rotation)
+
+    value = np.clip((1.0 + np.cos(2.0 * np.pi * stripe_count * rotated + phase)) / 2.0, 0.0, 1.0)
+    if fringes_type == "Binary": value = (0.5 < value).astype(value.dtype)
+
+    value = intensity * value
+
+    if 0.0 < noise:
+        if rng is None: rng = np.random.default_rng()
+        value = value + noise * (rng.random(value.shape, dtype=np.float32) - 0.5) / 2.0
+
+    # Pixels without a projector coordinate (background) are not lit
+    return np.nan_to_num(np.clip(value, 0.0, 1.0), nan=0.0)
+
+# Sample budgets (see render.py)
+
+def NoiseEstimate(halves):
+    # RMS standard error of the mean of two (sum, samples) halves. The difference of the half means
+    # has a variance of sigma^2 (1 / n_a + 1 / n_b) for any split of the samples
+    (a, n_a), (b, n_b) = halves
+
+    variance = (a / n_a - b / n_b) ** 2 / (1.0 / n_a + 1.0 / n_b)
+
+    return float(np.sqrt(np.mean(variance / (n_a + n_b))))
+
+# Automatic exposure (see exposure.py)
+
+# Upper bound of the energy search, as a multiple of the scene energy
+MAX_ENERGY_SCALE = 2.0 ** 20
+
+# Bisection steps of the energy search
+ENERGY_STEPS = 40
+
+def Peak(image, channels, percentile):
+    # Output intensity which percentile % of the pixels are below, per output channel
+    image = ToChannels(image, channels)
+
+    return float(np.percentile(image, percentile))
+
+def ProbeComponents(dc, white):
+    projector = np.maximum(2.0 * (white - dc), 0.0)
+    ambient = np.maximum(2.0 * dc - white, 0.0)
+
+    return projector, ambient
+
+def EnergyScale(projector, ambient, target, channels, percentile):
+    # Scale of the projector light at which the peak of A + k P is the target, None when
+    # the projector does not reach the camera
+    if Peak(projector, channels, percentile) <= 0.0: return None
+
+    if target <= Peak(ambient, channels, percentile):
+        raise ValueError("Ambient light alone reaches the target peak, lower the ambient light or tune the exposure")
+
+    low, high = 0.0, 1.0
+    while Peak(ambient + high * projector, channels, percentile) < target:
+        low, high = high, 2.0 * high
+        if MAX_ENERGY_SCALE < high: return MAX_ENERGY_SCALE
+
+    for _ in range(ENERGY_STEPS):
+        middle = (low + high) / 2.0
+
+        if Peak(ambient + middle * projector, channels, percentile) < target: low = middle
+        else: high = middle
+
+    return low
+
+# Image statistics (see monitor.py)
+
+def SaturatedFraction(image, max_value):
+    saturated = max_value <= image
+    if saturated.ndim == 3: saturated = saturated.any(axis=-1)
+
+    return float(saturated.mean())
+
+def Modulation(images, phases, min_mean=0.0):
+    # Median B / A of I_k = A + B cos(x + phase_k), phases evenly spread over 2 pi
+    stack = np.stack(images)
+    phases = np.asarray(phases, dtype=np.float32).reshape(-1, 1, 1)
+
+    a = stack.mean(axis=0)
+    b = 2.0 / len(images) * np.abs((stack * np.exp(-1j * phases)).sum(axis=0))
+
+    valid = min_mean < a
+    if not valid.any(): return 0.0
+
+    return float(np.median(b[valid] / a[valid]))
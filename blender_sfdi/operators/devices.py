@@ -362,29 +362,8 @@ class OP_CameraSetScene(Operator):
         return devices.BL_Camera.is_camera(bl_obj)
 
     def execute(self, context):
-        scene = context.scene
-
         camera = devices.BL_Camera.from_bl_obj(context.object)
-
-        # Camera settings
-        scene.render.fps = camera.refresh_rate
-        scene.render.resolution_x = camera.resolution[0]
-        scene.render.resolution_y = camera.resolution[1]
-        scene.render.image_settings.color_mode = "RGB" if camera.channels == 3 else "BW"
-
-        # Blender settings
-        # Cycles engine 
-        scene.render.engine = "CYCLES" 
-
-        # Pixel bit depth
-        scene.render.image_settings.color_depth = camera.settings.bit_depth   
-
-         # Use .tif
-        scene.render.image_settings.file_format = camera.settings.file_format
-        if camera.settings.file_format == "TIFF": scene.render.image_settings.tiff_codec = 'NONE'
-            
-        # Number of viewport samples
-        scene.cycles.samples = camera.settings.render_samples # Set scene sample rate
+        camera.set_scene(context.scene)
 
         return {'FINISHED'}
 
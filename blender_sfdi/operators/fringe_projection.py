@@ -1,11 +1,16 @@
 import bpy
 import json
 
+import numpy as np
+
 from pathlib import Path
+from bpy_extras import anim_utils
 from bpy_extras.io_utils import ImportHelper
 from bpy.types import Operator
 
-from .. import devices
+from .. import culling, devices, estimate, exposure, planner, renderqueue, sweep
+from ..preflight import Preflight
+from ..metadata import GenerateMetadata
 
 # TODO: Add support for selecting filetype
 # TODO: Add support for measurements being automatically added to Blender
@@ -16,48 +21,102 @@ class OP_CreateAnimation(Operator):
     bl_idname = "op.fp_createanimation"
     bl_label = "Characterise"
 
-    def _set_interp(self, animatable, data_path, mode, index=-1):
-        action = animatable.animation_data.action   
+    # KeyframePoint.interpolation enum value of 'CONSTANT'
+    CONSTANT = 0
+
+    def _fcurve(self, bl_id, data_path, index=0, group_name=""):
+        # F-curve in the action of bl_id, the action and its slot are created when missing
+        anim = bl_id.animation_data_create()
+        if anim.action is None: anim.action = bpy.data.actions.new(name=f"{bl_id.name}Action")
+
+        return anim.action.fcurve_ensure_for_datablock(datablock=bl_id, data_path=data_path, index=index, group_name=group_name)
+
+    def _set_keys(self, fcurve, frame_ids, values):
+        # Constant keys, all added at once
+        count = len(frame_ids)
 
-        fcurve = action.fcurve_ensure_for_datablock(datablock=animatable, data_path=data_path, index=index)
-        for i in range(len(fcurve.keyframe_points)):
-            fcurve.keyframe_points[i].interpolation = mode
+        co = np.empty(2 * count, dtype=np.float32)
+        co[0::2] = frame_ids
+        co[1::2] = values
 
-    def _generate_animation(self, camera, projector, stripe_counts, phases, rotations, frame_start=0):
-        frame_id = frame_start
+        points = fcurve.keyframe_points
+        points.clear()
+        points.add(count)
+        points.foreach_set("co", co)
+        points.foreach_set("interpolation", np.full(count, self.CONSTANT, dtype=np.int32))
 
-        channel = projector.settings.channels_list[0]
+        fcurve.update()
 
-        for rotation in rotations: # Set projector rotation
-            channel.rotation = rotation
-            projector.bl_obj.data.keyframe_insert(data_path="sfdi.channels_list[0].rotation", frame=frame_id)
+    def _clear_channels(self, projector):
+        # Channel keys of a previous run, e.g. channels 1 and 2 after multiplexing was switched off
+        anim = projector.bl_obj.data.animation_data
+        if anim is None or anim.action is None: return
 
-            for stripe_count in stripe_counts: # Set projector stripe count
-                channel.stripe_count = stripe_count
-                projector.bl_obj.data.keyframe_insert(data_path=f"sfdi.channels_list[0].stripe_count", frame=frame_id)
+        channelbag = anim_utils.action_get_channelbag_for_slot(anim.action, anim.action_slot)
+        if channelbag is None: return
 
-                for phase in phases: # Set projector phase
-                    channel.phase = phase
-                    projector.bl_obj.data.keyframe_insert(data_path="sfdi.channels_list[0].phase", frame=frame_id)
+        for fcurve in [fcurve for fcurve in channelbag.fcurves if fcurve.data_path.startswith("sfdi.channels_list[")]:
+            channelbag.fcurves.remove(fcurve)
+
+    def _generate_animation(self, projector, char_board, frames):
+        props = ["rotation", "stripe_count", "phase"]
+
+        frame_ids = np.array([params["frame"] for params in frames], dtype=np.float32)
+        poses = np.array([-1 if params["pose"] is None else params["pose"] for params in frames], dtype=np.int64)
+        channels = np.array([params.get("channel", 0) for params in frames], dtype=np.int64)
+        values = np.array([[params[prop] for prop in props] for params in frames], dtype=np.float64).reshape(-1, len(props))
+
+        # Characterisation board positions, keyed on the first frame of each pose
+        if char_board is not None:
+            new_pose = np.ones(len(frames), dtype=bool)
+            new_pose[1:] = poses[1:] != poses[:-1]
 
-                    frame_id += 1
+            pose_settings = char_board.settings.poses
+            translations = np.empty(3 * len(pose_settings), dtype=np.float32)
+            rotations = np.empty(4 * len(pose_settings), dtype=np.float32)
+            pose_settings.foreach_get("translation", translations)
+            pose_settings.foreach_get("rotation", rotations)
 
-        # Disable any interpolation
-        self._set_interp(projector.bl_obj.data, data_path="sfdi.channels_list[0].stripe_count", mode='CONSTANT')
-        self._set_interp(projector.bl_obj.data, data_path="sfdi.channels_list[0].rotation", mode='CONSTANT')
-        self._set_interp(projector.bl_obj.data, data_path="sfdi.channels_list[0].phase", mode='CONSTANT')
+            keyed = poses[new_pose]
+            for data_path, transforms, size in [("delta_location", translations, 3), ("delta_rotation_quaternion", rotations, 4)]:
+                transforms = transforms.reshape(-1, size)[keyed]
 
-        return frame_id
+                for i in range(size):
+                    fcurve = self._fcurve(char_board.bl_obj, data_path, index=i, group_name="Object Transforms")
+                    self._set_keys(fcurve, frame_ids[new_pose], transforms[:, i])
+
+        # Projector values of each channel, multiplexed frames use several channels.
+        # Only keyed when they change, or on a new pose
+        self._clear_channels(projector)
+
+        for i in np.unique(channels):
+            in_channel = channels == i
+            channel_frames, channel_poses, channel_values = frame_ids[in_channel], poses[in_channel], values[in_channel]
+
+            for j, prop in enumerate(props):
+                changed = np.ones(len(channel_frames), dtype=bool)
+                changed[1:] = (channel_values[1:, j] != channel_values[:-1, j]) | (channel_poses[1:] != channel_poses[:-1])
+
+                fcurve = self._fcurve(projector.bl_obj.data, f"sfdi.channels_list[{i}].{prop}")
+                self._set_keys(fcurve, channel_frames[changed], channel_values[changed, j])
 
     def execute(self, context):
         scene = context.scene
         settings = scene.fp_stereo
 
-        fringes_manager = settings.fringes_manager
-        
         # Check correct devices were passed
         if not devices.BL_Camera.is_camera(settings.camera): return {"FINISHED"}
         if not devices.BL_Projector.is_projector(settings.projector): return {"FINISHED"}
+
+        # Stop before anything is keyed if the scene would ruin the data
+        try:
+            warnings = Preflight(scene, settings.preflight)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        for warning in warnings:
+            self.report({'WARNING'}, warning.message)
             
         # Create devices and clear animation data
         camera = devices.BL_Camera.from_bl_obj(settings.camera)
@@ -68,47 +127,240 @@ class OP_CreateAnimation(Operator):
         
         # Check if characterising
         char_board = None
-        if devices.BL_CharBoard.is_char_board(settings.char_board): # Error
+        if devices.BL_CharBoard.is_char_board(settings.char_board):
             char_board = devices.BL_CharBoard.from_bl_obj(settings.char_board)
             char_board.bl_obj.animation_data_clear()
 
-        # Get fringe manager values
-        stripe_counts = [prop.value for prop in fringes_manager.stripe_counts]
-        phases = [prop.value for prop in fringes_manager.phases]
-        rotations = [prop.value for prop in fringes_manager.rotations]
+        # Same frame order as the render drivers use
+        frames = sweep.SceneSweep(scene)
 
         # Set scene start value
         scene.frame_start = 0
         scene.frame_step = 1
 
-        if char_board is not None:
-            frame_track = 0
-
-            # Create animation for each board pose
-            for pose in char_board.bl_obj.sfdi.poses:
-                char_board.bl_obj.delta_location = pose.translation
-                char_board.bl_obj.delta_rotation_quaternion = pose.rotation
+        if frames:
+            self._generate_animation(projector, char_board, frames)
 
-                # Generateo characterisation board positions first
-                char_board.bl_obj.keyframe_insert(data_path='delta_location', frame=frame_track)
-                char_board.bl_obj.keyframe_insert(data_path='delta_rotation_quaternion', frame=frame_track)
+            # Keys are added without setting the properties, so evaluate them
+            scene.frame_set(scene.frame_current)
 
-                frame_track = self._generate_animation(camera, projector, stripe_counts, phases, rotations, frame_start=frame_track)
+        scene.frame_end = len({params["frame"] for params in frames}) - 1
 
-            # Disable any interp
-            for i in range(3):
-                self._set_interp(char_board.bl_obj, data_path="delta_location", mode='CONSTANT', index=i)
+        # Hide objects which can not contribute, after the board has been animated
+        culled = culling.KeyCulling(scene, frames, mode=settings.culling)
+        if culled: self.report({'INFO'}, f"Culled {culled} object poses")
 
-            for i in range(4):
-                self._set_interp(char_board.bl_obj, data_path="delta_rotation_quaternion", mode='CONSTANT', index=i)
-            
-        else: frame_track = self._generate_animation(camera, projector, stripe_counts, phases, rotations)
-            
-        scene.frame_end = frame_track - 1
+        if frames: self.report({'INFO'}, f"{planner.CountRebuilds(scene, planner.PlanFrames(scene, frames))} BVH builds expected")
 
         return {"FINISHED"}
 
 
+class OP_EstimateRender(Operator):
+    bl_idname = "op.fp_estimaterender"
+    bl_label = "Estimate"
+    bl_description = "Render a few frames of the sweep and estimate the time, memory and disk space of the whole sweep"
+
+    samples : bpy.props.IntProperty(name="Samples", description="Render units to render", default=4, min=1) # type: ignore
+
+    def execute(self, context):
+        scene = context.scene
+
+        # Same frames as the animation
+        bpy.ops.op.fp_createanimation()
+
+        try:
+            result = estimate.EstimateRender(scene, planner.PlanFrames(scene, sweep.SceneSweep(scene)), samples=self.samples)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        for line in estimate.FormatEstimate(result):
+            self.report({'INFO'}, line)
+
+        return {'FINISHED'}
+
+
+class OP_AutoExposure(Operator):
+    bl_idname = "op.fp_autoexposure"
+    bl_label = "Auto Exposure"
+    bl_description = "Render low resolution probes of every board pose and tune the projector energy or camera exposure"
+
+    @classmethod
+    def poll(cls, context):
+        return context.scene.fp_stereo.auto_exposure.mode != "OFF"
+
+    def execute(self, context):
+        scene = context.scene
+        settings = scene.fp_stereo
+
+        if not devices.BL_Camera.is_camera(settings.camera) or not devices.BL_Projector.is_projector(settings.projector):
+            self.report({'ERROR'}, "Auto exposure needs a camera and a projector")
+            return {'CANCELLED'}
+
+        try:
+            result = exposure.AutoExposure(scene)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        self.report({'INFO'}, f"{result['mode'].capitalize()} set to {result['value']:.4g}, limited by pose {result['limiting_pose']}")
+
+        return {'FINISHED'}
+
+
+# Render queue
+
+class OP_RenderQueue(Operator):
+    bl_idname = "op.fp_renderqueue"
+    bl_label = "Render Queue"
+    bl_description = "Render the queued sweeps in the background, one after another"
+
+    POLL_SECONDS = 1.0
+
+    _timer = None
+
+    def invoke(self, context, event):
+        # A single operator polls the queue
+        if renderqueue.QUEUE.polling: return {'CANCELLED'}
+
+        renderqueue.QUEUE.polling = True
+
+        self._timer = context.window_manager.event_timer_add(self.POLL_SECONDS, window=context.window)
+        context.window_manager.modal_handler_add(self)
+
+        return {'RUNNING_MODAL'}
+
+    def modal(self, context, event):
+        if event.type != 'TIMER': return {'PASS_THROUGH'}
+
+        queue = renderqueue.QUEUE
+
+        for job in queue.update():
+            if job.status == renderqueue.DONE: self.report({'INFO'}, f"Rendered {job.name}: {job.done} frames")
+            else: self.report({'ERROR'}, f"Render of {job.name} failed: {job.message}")
+
+        # Progress is drawn in the SFDI panel
+        for window in context.window_manager.windows:
+            for area in window.screen.areas:
+                if area.type == 'VIEW_3D': area.tag_redraw()
+
+        if not queue.is_idle: return {'PASS_THROUGH'}
+
+        context.window_manager.event_timer_remove(self._timer)
+        queue.polling = False
+
+        return {'FINISHED'}
+
+    def cancel(self, context):
+        context.window_manager.event_timer_remove(self._timer)
+        renderqueue.QUEUE.polling = False
+
+class OP_EnqueueRender(Operator):
+    bl_idname = "op.fp_enqueuerender"
+    bl_label = "Queue Render"
+    bl_description = "Save a snapshot of the file and render its sweep in the background"
+
+    def execute(self, context):
+        scene = context.scene
+        settings = scene.fp_stereo
+
+        if not devices.BL_Camera.is_camera(settings.camera) or not devices.BL_Projector.is_projector(settings.projector):
+            self.report({'ERROR'}, "Rendering needs a camera and a projector")
+            return {'CANCELLED'}
+
+        # Report problems now rather than from the background render
+        try:
+            warnings = Preflight(scene, settings.preflight)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        for warning in warnings:
+            self.report({'WARNING'}, warning.message)
+
+        job = renderqueue.QUEUE.add(scene)
+        self.report({'INFO'}, f"Queued {job.name}, {job.total} frames")
+
+        bpy.ops.op.fp_renderqueue('INVOKE_DEFAULT')
+
+        return {'FINISHED'}
+
+class OP_PauseRender(Operator):
+    bl_idname = "op.fp_pauserender"
+    bl_label = "Pause Render"
+    bl_description = "Pause or resume the running render"
+
+    job_id : bpy.props.IntProperty(name="Render ID") # type: ignore
+
+    def execute(self, context):
+        job = renderqueue.QUEUE.find(self.job_id)
+        if job is None or not job.is_active: return {'CANCELLED'}
+
+        try:
+            job.pause(job.status == renderqueue.RUNNING)
+        except ValueError as e:
+            self.report({'ERROR'}, str(e))
+            return {'CANCELLED'}
+
+        return {'FINISHED'}
+
+class OP_CancelRender(Operator):
+    bl_idname = "op.fp_cancelrender"
+    bl_label = "Cancel Render"
+    bl_description = "Cancel a queued or running render, frames already written are kept"
+
+    job_id : bpy.props.IntProperty(name="Render ID") # type: ignore
+
+    def execute(self, context):
+        job = renderqueue.QUEUE.find(self.job_id)
+        if job is None: return {'CANCELLED'}
+
+        job.cancel()
+
+        return {'FINISHED'}
+
+class OP_ClearRenderQueue(Operator):
+    bl_idname = "op.fp_clearrenderqueue"
+    bl_label = "Clear Finished"
+    bl_description = "Remove finished, failed and cancelled renders from the queue"
+
+    def execute(self, context):
+        renderqueue.QUEUE.clear()
+
+        return {'FINISHED'}
+
+
+# Rig cameras
+
+class OP_AddRigCamera(Operator):
+    bl_idname = "menu.op_add_rig_camera"
+    bl_label = "Add Camera"
+
+    def execute(self, context):
+        settings = context.scene.fp_stereo
+
+        new_item = settings.cameras.add()
+
+        return {'FINISHED'}
+
+class OP_RemoveRigCamera(Operator):
+    bl_idname = "menu.op_remove_rig_camera"
+    bl_label = "Remove Camera"
+
+    camera_id : bpy.props.IntProperty(name="Remove Camera ID") # type: ignore
+
+    @classmethod
+    def poll(cls, context):
+        return 0 < len(context.scene.fp_stereo.cameras)
+
+    def execute(self, context):
+        settings = context.scene.fp_stereo
+
+        settings.cameras.remove(self.camera_id)
+
+        return {'FINISHED'}
+
+
 # Fringes Manager
 
 class OP_AddStripeCount(Operator):
@@ -265,115 +517,6 @@ class OP_SaveMetadata(bpy.types.Operator, ImportHelper):
         options={'HIDDEN'}
     ) # type: ignore
 
-    def _camera_metadata(self, camera: devices.BL_Camera):
-        translation = camera.world_matrix.to_translation()
-        rotation = camera.world_matrix.to_quaternion()
-
-        return {
-            "name" : camera.bl_obj.name,
-            "translation" : {
-                "x" : translation.x,
-                "y" : translation.y,
-                "z" : translation.z,
-            },
-            "rotation" : {
-                "w" : rotation.w,
-                "x" : rotation.x,
-                "y" : rotation.y,
-                "z" : rotation.z,
-            },
-            "resolution" : {
-                "width" : camera.resolution[0],
-                "height" : camera.resolution[1],
-            },
-            "channels": camera.channels,
-            "refresh_rate": camera.refresh_rate,
-            "render_samples": camera.render_samples,
-        }
-
-    def _projector_metadata(self, projector: devices.BL_Projector):
-        translation = projector.world_matrix.to_translation()
-        rotation = projector.world_matrix.to_quaternion()
-
-        return {
-            "name" : projector.bl_obj.name,
-            # "resolution" : {
-            #     "width" : {projector.resolution[0]},
-            #     "height" : {projector.resolution[1]},
-            # },
-            "translation" : {
-                "x" : translation.x,
-                "y" : translation.y,
-                "z" : translation.z,
-            },
-            "rotation" : {
-                "w" : rotation.w,
-                "x" : rotation.x,
-                "y" : rotation.y,
-                "z" : rotation.z,
-            },
-            "channels": [{
-                    "fringes_type" : projector.settings.channels_list[i].fringes_type,
-                    "intensity" : projector.settings.channels_list[i].intensity,
-                    "noise" : projector.settings.channels_list[i].noise,
-            } for i in range(projector.channels)],
-
-            "refresh_rate" : projector.refresh_rate,
-            "throw_ratio" : projector.throw_ratio,
-            "aspect_ratio" : projector.aspect_ratio,
-            "light_falloff" : projector.settings.light_falloff,
-        }
-
-    def _char_board_metadata(self, char_board: devices.BL_CharBoard):
-        return {
-            "poses" : [
-                {
-                    "translation" : {
-                        "x" : pose.translation[0],
-                        "y" : pose.translation[1],
-                        "z" : pose.translation[2]
-                    },
-                    "rotation" : {
-                        "w" : pose.rotation[0],
-                        "x" : pose.rotation[1],
-                        "y" : pose.rotation[2],
-                        "z" : pose.rotation[3],
-                    }
-                } 
-                for pose in char_board.settings.poses
-            ]
-        }
-
-    def _generate_metadata(self, scene):
-        fp_stereo = scene.fp_stereo
-        fringes_manager = fp_stereo.fringes_manager
-
-
-        # Add Fringe Manager data first
-        metadata = {
-            "stripe_counts" : [prop.value for prop in fringes_manager.stripe_counts],
-            "phases" : [prop.value for prop in fringes_manager.phases],
-            "rotations" : [prop.value for prop in fringes_manager.rotations],
-            "multiplexing" : fringes_manager.multiplexing,
-        }
-
-        # Add camera data if present
-        if devices.BL_Camera.is_camera(fp_stereo.camera):
-            camera = devices.BL_Camera.from_bl_obj(fp_stereo.camera)
-            metadata["camera"] = self._camera_metadata(camera)
-        
-        # Add projector data if present
-        if devices.BL_Projector.is_projector(fp_stereo.projector):
-            projector = devices.BL_Projector.from_bl_obj(fp_stereo.projector)
-            metadata["projector"] = self._projector_metadata(projector)
-
-        # Add projector data if present
-        if devices.BL_CharBoard.is_char_board(fp_stereo.char_board):
-            char_board = devices.BL_CharBoard.from_bl_obj(fp_stereo.char_board)
-            metadata["char_board"] = self._char_board_metadata(char_board)
-
-        return metadata
-    
     def execute(self, context):
         """Called when user confirms file selection"""
         filepath = self.filepath
@@ -383,7 +526,7 @@ class OP_SaveMetadata(bpy.types.Operator, ImportHelper):
 
         scene = context.scene
 
-        metadata = self._generate_metadata(scene)
+        metadata = GenerateMetadata(scene)
 
         with open(filepath, 'w') as json_file:
             json.dump(metadata, json_file, indent=2)
@@ -399,6 +542,10 @@ class OP_SaveMetadata(bpy.types.Operator, ImportHelper):
         return {'RUNNING_MODAL'}
 
 classes = [
+    # Rig cameras
+    OP_AddRigCamera,
+    OP_RemoveRigCamera,
+
     # Calibration,
     OP_AddStripeCount,
     OP_AddPhase,
@@ -410,6 +557,15 @@ classes = [
 
     OP_SaveMetadata,
     OP_CreateAnimation,
+    OP_EstimateRender,
+    OP_AutoExposure,
+
+    # Render queue
+    OP_RenderQueue,
+    OP_EnqueueRender,
+    OP_PauseRender,
+    OP_CancelRender,
+    OP_ClearRenderQueue,
 ]
 
 def register():
@@ -417,5 +573,8 @@ def register():
         bpy.utils.register_class(cls)
 
 def unregister():
+    # Background renders would outlive the add-on
+    renderqueue.QUEUE.cancel_all()
+
     for cls in classes:
         bpy.utils.unregister_class(cls)
\ No newline at end of file
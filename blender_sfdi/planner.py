@@ -0,0 +1,86 @@
+import json
+
+from pathlib import Path
+
+from . import devices
+from .culling import CulledCurves
+from .sweep import FrameName, GroupBy, RenderName
+
+# Sweep planner
+# With persistent data (scene.render.use_persistent_data) Cycles keeps the scene between renders and
+# only rebuilds the BVH when the geometry changes, i.e. an object moves or is hidden. Projector
+# patterns, levels and camera views only change shader and film inputs, which is cheap.
+#
+# The timeline stays nested as poses -> rotations -> stripe counts -> phases, so outputs keep their
+# names, and the planner only changes the order the frames are rendered in. Frames are grouped by
+# geometry state, the board pose and the objects hidden by culling, and every state is rendered in one
+# run. Board poses with the same transform (e.g. repeated captures) share a state.
+#
+# plan.json maps the render order to the timeline frames, their parameters and output names.
+
+# Decimals of the pose transforms compared for repeated poses
+POSE_DECIMALS = 6
+
+def PoseKeys(scene):
+    # Index of the first board pose with the same transform, for every pose
+    settings = scene.fp_stereo
+    if not devices.BL_CharBoard.is_char_board(settings.char_board): return {}
+
+    keys = {}
+    first = {}
+    for i, pose in enumerate(settings.char_board.sfdi.poses):
+        transform = tuple(round(value, POSE_DECIMALS) for value in (*pose.translation, *pose.rotation))
+        keys[i] = first.setdefault(transform, i)
+
+    return keys
+
+def GeometryKeys(scene, frames):
+    # Geometry state of every timeline frame of the sweep
+    pose_keys = PoseKeys(scene)
+    curves = CulledCurves(scene)
+
+    keys = {}
+    for frame_id, group in GroupBy(frames, lambda params: params["frame"]):
+        pose = group[0].get("pose")
+        culled = tuple(0.5 < fcurve.evaluate(frame_id) for fcurve in curves)
+
+        keys[frame_id] = (pose_keys.get(pose, pose), culled)
+
+    return keys
+
+def PlanFrames(scene, frames):
+    # Stable reorder of the sweep so every geometry state is rendered in one run
+    keys = GeometryKeys(scene, frames)
+
+    return [params for _, group in GroupBy(frames, lambda params: keys[params["frame"]]) for params in group]
+
+def CountRebuilds(scene, frames):
+    # Expected BVH builds when rendering frames in order, the first build included.
+    # Without persistent data every render builds the BVH
+    renders = [group[0]["frame"] for _, group in GroupBy(frames, RenderName)]
+
+    if not scene.render.use_persistent_data: return len(renders)
+
+    keys = GeometryKeys(scene, frames)
+
+    return sum(1 for i, frame_id in enumerate(renders) if i == 0 or keys[frame_id] != keys[renders[i - 1]])
+
+def PlanReport(scene, frames, planned):
+    return {
+        "renders" : len(GroupBy(frames, RenderName)),
+        "geometry_states" : len(set(GeometryKeys(scene, frames).values())),
+        "persistent_data" : scene.render.use_persistent_data,
+        "bvh_rebuilds" : CountRebuilds(scene, planned),
+        "bvh_rebuilds_sweep_order" : CountRebuilds(scene, frames),
+    }
+
+def WritePlan(output_dir, planned, report, filename="plan.json"):
+    filepath = Path(output_dir) / filename
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+
+    plan = dict(report, frames=[dict(params, order=i, name=FrameName(params)) for i, params in enumerate(planned)])
+
+    with open(filepath, "w") as json_file:
+        json.dump(plan, json_file, indent=2)
+
+    return filepath
@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from pathlib import Path
+
+import bpy
+
+if __name__ == "__main__" and not __package__:
+    # Run as a script through "blender -b -P blender_sfdi/pool.py", so make the package importable
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    import blender_sfdi
+    __package__ = "blender_sfdi"
+
+from . import batch, render, sweep
+from .metadata import SplitViews
+from .sweep import SplitFrames
+
+# Local render pool
+# Splits the frames of a job across several background Blender workers on the same .blend
+#
+#   python -m blender_sfdi.pool job.json --workers 4
+
+PACKAGE_DIR = Path(__file__).resolve().parent
+
+def WorkerMetadataName(worker_id):
+    return f"metadata.worker{worker_id}.json"
+
+def SplitCPUs(workers, threads=None):
+    if hasattr(os, "sched_getaffinity"): cpus = sorted(os.sched_getaffinity(0))
+    else: cpus = list(range(os.cpu_count() or 1))
+
+    if threads is None: threads = max(1, len(cpus) // workers)
+
+    return [cpus[(i * threads) % len(cpus):][:threads] for i in range(workers)]
+
+def _set_affinity(pid, cpus):
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(pid, cpus)
+        return
+
+    # Windows
+    try:
+        import psutil
+    except ImportError:
+        return
+
+    psutil.Process(pid).cpu_affinity(cpus)
+
+def WorkerEnv():
+    # Workers must be able to import the package
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(PACKAGE_DIR.parent), env.get("PYTHONPATH")]))
+
+    return env
+
+def WorkerCommand(job_path, blend, frames, threads, output_dir, worker_id, blender=None, tuned_exposure=None):
+    args = [
+        str(job_path),
+        "--frames", f"{frames[0]['frame']}:{frames[-1]['frame']}",
+        "--threads", str(threads),
+        "--output", str(output_dir),
+        "--metadata",
+        "--metadata-name", WorkerMetadataName(worker_id),
+        "--no-plan",
+    ]
+
+    if blend is not None: args += ["--blend", str(blend)]
+
+    # Tuned once by the pool, so every worker renders with the same value
+    if tuned_exposure is not None: args += ["--exposure", repr(tuned_exposure[0]), "--exposure-pose", str(tuned_exposure[1])]
+
+    # Blender binary, otherwise the bpy Python module
+    if blender:
+        command = [blender, "-b"]
+        if blend is not None: command.append(str(blend))
+
+        return command + ["-t", str(threads), "-P", str(PACKAGE_DIR / "batch.py"), "--"] + args
+
+    return [sys.executable, "-m", f"{__package__}.batch"] + args
+
+def MergeMetadata(output_dir, workers, filename="metadata.json"):
+    merged = None
+    frames = []
+
+    for worker_id in range(workers):
+        filepath = Path(output_dir) / WorkerMetadataName(worker_id)
+        if not filepath.exists(): continue
+
+        with open(filepath, "r") as json_file:
+            metadata = json.load(json_file)
+
+        frames += metadata.pop("frames", [])
+        if merged is None: merged = metadata
+
+        filepath.unlink()
+
+    if merged is None: return None
+
+    merged["frames"] = sorted(frames, key=sweep.FrameName)
+    merged["workers"] = workers
+    SplitViews(merged)
+
+    filepath = Path(output_dir) / filename
+    with open(filepath, 'w') as json_file:
+        json.dump(merged, json_file, indent=2)
+
+    return filepath
+
+class RenderPool:
+    def __init__(self, job_path, workers, threads=None, blend=None, blender=None, affinity=True, tuned_exposure=None):
+        self.job_path = Path(job_path).resolve()
+        self.workers = workers
+        self.threads = threads
+        self.blend = blend
+        self.blender = blender
+        self.affinity = affinity
+        self.tuned_exposure = tuned_exposure
+
+    def run(self, frames, output_dir):
+        chunks = SplitFrames(frames, self.workers)
+        cpu_sets = SplitCPUs(len(chunks), self.threads)
+
+        procs = []
+        for worker_id, (chunk, cpus) in enumerate(zip(chunks, cpu_sets)):
+            command = WorkerCommand(self.job_path, self.blend, chunk, len(cpus), output_dir, worker_id, blender=self.blender, tuned_exposure=self.tuned_exposure)
+
+            proc = subprocess.Popen(command, env=WorkerEnv())
+            if self.affinity: _set_affinity(proc.pid, cpus)
+
+            print(f"Worker {worker_id}: frames {chunk[0]['frame']}-{chunk[-1]['frame']} on CPUs {cpus}", flush=True)
+            procs.append(proc)
+
+        failed = [i for i, proc in enumerate(procs) if proc.wait() != 0]
+
+        MergeMetadata(output_dir, len(chunks))
+
+        return failed
+
+def ParseArgs(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(prog="blender_sfdi.pool", description="Render a job across several local Blender workers")
+    parser.add_argument("job", help="Job spec (.json or .toml)")
+    parser.add_argument("--workers", type=int, default=2, help="Number of Blender workers")
+    parser.add_argument("--threads", type=int, default=None, help="Threads per worker, defaults to an even split of the CPUs")
+    parser.add_argument("--blend", default=None, help="Rig .blend file, overrides the job spec")
+    parser.add_argument("--blender", default=None, help="Blender binary for the workers, defaults to the bpy module")
+    parser.add_argument("--frames", default=None, help="Inclusive frame range to render, e.g. 0:99")
+    parser.add_argument("--no-affinity", action="store_true", help="Do not pin workers to CPUs")
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = ParseArgs(argv)
+
+    # Build the sweep once here to split it, the workers rebuild the same scene
+    job = batch.LoadJob(args.job)
+    scene = batch.PrepareScene(job, blend=args.blend)
+
+    frames = sweep.SelectFrames(sweep.SceneSweep(scene), args.frames or job.get("render", {}).get("frames"))
+    if not frames:
+        print("Nothing to render")
+        return 0
+
+    blend = args.blend or (bpy.data.filepath or None)
+    blender = args.blender or (bpy.app.binary_path or None)
+
+    output_dir = render.RenderDriver(scene).output_dir
+
+    # The plan of the whole job, the workers do not write their own
+    batch.WritePlan(scene, batch.JobFrames(scene, job, args.frames), output_dir)
+
+    pool = RenderPool(args.job, args.workers, threads=args.threads, blend=blend, blender=blender, affinity=not args.no_affinity, tuned_exposure=batch.TunedExposure(scene))
+    failed = pool.run(frames, output_dir)
+
+    if failed: print(f"Workers failed: {failed}")
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
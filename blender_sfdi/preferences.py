@@ -12,10 +12,16 @@ def GetAddonPath():
         if mod.bl_info['name'] == "BlenderSFDI":
             return Path(mod.__file__).parent
         
-    return None
+    # Not installed as an extension (e.g. imported by the batch scripts)
+    return Path(__file__).parent
 
 def GetStoragePath():
-    path = Path(bpy.utils.extension_path_user(__package__, create=True))
+    try:
+        path = Path(bpy.utils.extension_path_user(__package__, create=True))
+    except ValueError:
+        # Not installed as an extension, fall back to the user data directory
+        path = Path(bpy.utils.user_resource('DATAFILES', path=__package__, create=True))
+
     return path
 
 def GetOutputPath():
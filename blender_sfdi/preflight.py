@@ -0,0 +1,194 @@
+from . import devices
+from .profiles import PROFILES
+
+# Preflight checks
+# Settings which silently ruin a dataset (see "Blender Settings Requirements" in the README) are checked
+# before anything is rendered, by the render drivers and by OP_CreateAnimation. Errors stop the render,
+# warnings are only reported. Most issues have a fix, which is applied with PG_StereoFP.preflight "FIX".
+
+ERROR = "ERROR"
+WARNING = "WARNING"
+
+class Issue:
+    def __init__(self, severity, message, fix=None):
+        self.severity = severity
+        self.message = message
+        self.fix = fix
+
+    def __str__(self):
+        return f"{self.severity}: {self.message}" + (" (fixable)" if self.fix is not None else "")
+
+def _setter(data, key, value):
+    return lambda: setattr(data, key, value)
+
+def CheckRender(scene):
+    issues = []
+
+    if scene.render.engine != 'CYCLES':
+        issues.append(Issue(ERROR, f"Render engine is {scene.render.engine}, projectors only work in Cycles", _setter(scene.render, "engine", 'CYCLES')))
+
+    if scene.render.dither_intensity != 0.0:
+        issues.append(Issue(ERROR, "Dithering adds noise to the images", _setter(scene.render, "dither_intensity", 0.0)))
+
+    if scene.view_settings.view_transform != 'Raw':
+        issues.append(Issue(ERROR, f"View transform is {scene.view_settings.view_transform}, images are not linear", _setter(scene.view_settings, "view_transform", 'Raw')))
+
+    if scene.view_settings.look != 'None':
+        issues.append(Issue(ERROR, f"Look {scene.view_settings.look} changes the image tones", _setter(scene.view_settings, "look", 'None')))
+
+    if scene.cycles.use_denoising:
+        issues.append(Issue(ERROR, "Denoising adds artifacts to the fringes", _setter(scene.cycles, "use_denoising", False)))
+
+    if scene.render.resolution_percentage != 100:
+        issues.append(Issue(ERROR, f"Resolution scale is {scene.render.resolution_percentage}%", _setter(scene.render, "resolution_percentage", 100)))
+
+    return issues
+
+def CheckWorld(scene):
+    # World light is added to every image, even without any lights in the scene
+    if scene.world is None or scene.world.node_tree is None: return []
+
+    issues = []
+    for node in scene.world.node_tree.nodes:
+        if node.type != 'BACKGROUND': continue
+
+        strength = node.inputs["Strength"]
+        color = node.inputs["Color"]
+
+        if strength.is_linked or color.is_linked or (0.0 < strength.default_value and any(color.default_value[:3])):
+            # Not fixed, the world may be the ambient light on purpose
+            issues.append(Issue(WARNING, f"World background '{node.name}' lights the scene"))
+
+    return issues
+
+def CheckCamera(scene):
+    settings = scene.fp_stereo
+
+    if not devices.BL_Camera.is_camera(settings.camera): return [Issue(ERROR, "No camera is set")]
+
+    camera = devices.BL_Camera.from_bl_obj(settings.camera)
+    image_settings = scene.render.image_settings
+
+    samples = camera.settings.render_samples
+    if camera.settings.render_profile in PROFILES:
+        samples = min(samples, PROFILES[camera.settings.render_profile].get("max_samples", samples))
+
+    expected = {
+        "resolution" : ((scene.render.resolution_x, scene.render.resolution_y), tuple(camera.resolution)),
+        "colour mode" : (image_settings.color_mode, "RGB" if camera.channels == 3 else "BW"),
+        "bit depth" : (image_settings.color_depth, camera.settings.bit_depth),
+        "file format" : (image_settings.file_format, camera.settings.file_format),
+        "samples" : (scene.cycles.samples, samples),
+    }
+
+    if camera.settings.file_format == "TIFF": expected["compression"] = (image_settings.tiff_codec, 'NONE')
+
+    issues = []
+
+    mismatched = [name for name, (value, wanted) in expected.items() if value != wanted]
+    if mismatched:
+        issues.append(Issue(ERROR, f"Scene {', '.join(mismatched)} do not match camera '{camera.bl_obj.name}'", lambda: camera.set_scene(scene)))
+
+    for other in devices.BL_Camera.rig_cameras(settings)[1:]:
+        if tuple(other.resolution) != tuple(camera.resolution):
+            issues.append(Issue(ERROR, f"Camera '{other.bl_obj.name}' has a different resolution to the main camera"))
+
+    return issues
+
+def FindDriver(to_drive, prop, index=-1):
+    anim = to_drive.id_data.animation_data
+    if anim is None: return None
+
+    return anim.drivers.find(to_drive.path_from_id(prop), index=max(index, 0))
+
+def IsValidDriver(fcurve):
+    driver = fcurve.driver
+
+    return fcurve.is_valid and driver.is_valid and all(
+        variable.is_valid and all(target.id is not None for target in variable.targets)
+        for variable in driver.variables
+    )
+
+def CheckDrivers(bl_ids, known=()):
+    # Drivers which can not be evaluated, e.g. after a property or node was renamed,
+    # known holds (id, data_path) of drivers which are checked elsewhere
+    issues = []
+
+    for bl_id in bl_ids:
+        anim = getattr(bl_id, "animation_data", None)
+        if anim is None: continue
+
+        for fcurve in anim.drivers:
+            if (bl_id, fcurve.data_path) in known: continue
+
+            if not IsValidDriver(fcurve):
+                issues.append(Issue(ERROR, f"Driver '{fcurve.data_path}' of '{bl_id.name}' is invalid"))
+
+    return issues
+
+def CheckProjector(projector):
+    bl_obj = projector.bl_obj
+    node_tree = bl_obj.data.node_tree
+
+    if node_tree is None: return [Issue(ERROR, f"Projector '{bl_obj.name}' has no shader, recreate it")]
+
+    missing = [name for name in devices.BL_Projector.REQUIRED_NODES if name not in node_tree.nodes]
+    if missing: return [Issue(ERROR, f"Projector '{bl_obj.name}' shader is missing {', '.join(missing)}, recreate it")]
+
+    issues = []
+
+    # Menu switches can not be driven (see BL_Projector.create_bl_obj)
+    for node_name, value in [("Channels Switch", projector.settings.channels), ("Light Falloff Switch", projector.settings.light_falloff)]:
+        socket = node_tree.nodes[node_name].inputs[0]
+
+        if socket.default_value != value:
+            issues.append(Issue(ERROR, f"Projector '{bl_obj.name}' {node_name} does not match its settings", _setter(socket, "default_value", value)))
+
+    # Drivers from the projector settings to the shader
+    broken = [
+        to_drive.path_from_id(prop) for to_drive, prop, _, index in devices.BL_Projector.drivers(bl_obj)
+        if (fcurve := FindDriver(to_drive, prop, index)) is None or not IsValidDriver(fcurve)
+    ]
+
+    if broken:
+        issues.append(Issue(ERROR, f"Projector '{bl_obj.name}' drivers are missing or invalid: {', '.join(broken)}", lambda: devices.BL_Projector.set_drivers(bl_obj)))
+
+    if FindDriver(bl_obj.data, "spot_size") is None:
+        issues.append(Issue(WARNING, f"Projector '{bl_obj.name}' has no spot cone driver, light is sampled outside of the image", lambda: devices.BL_Projector.set_spot_driver(bl_obj)))
+
+    # Every other driver of the projector
+    known = {(to_drive.id_data, to_drive.path_from_id(prop)) for to_drive, prop, _, _ in devices.BL_Projector.drivers(bl_obj)}
+
+    return issues + CheckDrivers([bl_obj, bl_obj.data, node_tree], known)
+
+def CheckScene(scene):
+    settings = scene.fp_stereo
+
+    issues = CheckRender(scene) + CheckWorld(scene) + CheckCamera(scene)
+
+    if not devices.BL_Projector.is_projector(settings.projector): issues.append(Issue(ERROR, "No projector is set"))
+    else:
+        for projector in devices.BL_Projector.rig_projectors(scene):
+            issues += CheckProjector(projector)
+
+    bl_ids = [camera.bl_obj for camera in devices.BL_Camera.rig_cameras(settings)]
+    if devices.BL_CharBoard.is_char_board(settings.char_board): bl_ids.append(settings.char_board)
+
+    return issues + CheckDrivers(bl_ids)
+
+def Preflight(scene, mode="CHECK"):
+    # Returns the warnings, raises a ValueError listing every error
+    if mode == "OFF": return []
+
+    issues = CheckScene(scene)
+
+    if mode == "FIX" and any(issue.fix is not None for issue in issues):
+        for issue in issues:
+            if issue.fix is not None: issue.fix()
+
+        issues = CheckScene(scene)
+
+    errors = [issue for issue in issues if issue.severity == ERROR]
+    if errors: raise ValueError("Preflight failed:\n" + "\n".join(f"  {issue}" for issue in errors))
+
+    return [issue for issue in issues if issue.severity == WARNING]
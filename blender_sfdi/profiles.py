@@ -0,0 +1,92 @@
+# Render profiles
+# Named sets of Cycles settings applied by BL_Camera.set_scene. Every profile also applies the settings
+# the measurements rely on (no denoising, no dithering, raw colour). "CUSTOM" leaves the scene as it is.
+#
+#   DRAFT           few bounces and samples, for checking a rig
+#   CALIBRATION     direct light and one diffuse bounce, unbiased (no clamping), for board captures
+#   FINAL_DIRECT    direct light only, for datasets where interreflections are not wanted
+#   FINAL_GI        full global illumination with caustics and path guiding (CPU only)
+
+REQUIRED = {
+    "cycles" : {"use_denoising" : False},
+    "render" : {"dither_intensity" : 0.0},
+    "view_settings" : {"view_transform" : "Raw", "look" : "None"},
+}
+
+PROFILES = {
+    "DRAFT" : {
+        "cycles" : {
+            "max_bounces" : 2, "diffuse_bounces" : 1, "glossy_bounces" : 1, "transmission_bounces" : 2,
+            "volume_bounces" : 0, "transparent_max_bounces" : 4,
+            "caustics_reflective" : False, "caustics_refractive" : False, "sample_clamp_indirect" : 10.0,
+            "use_adaptive_sampling" : True, "adaptive_threshold" : 0.1, "adaptive_min_samples" : 0,
+            "use_guiding" : False, "use_light_tree" : True,
+            "debug_use_spatial_splits" : False, "use_auto_tile" : True, "tile_size" : 2048,
+        },
+        "render" : {"use_persistent_data" : False},
+        "max_samples" : 16,
+    },
+    "CALIBRATION" : {
+        "cycles" : {
+            "max_bounces" : 4, "diffuse_bounces" : 1, "glossy_bounces" : 2, "transmission_bounces" : 2,
+            "volume_bounces" : 0, "transparent_max_bounces" : 8,
+            "caustics_reflective" : False, "caustics_refractive" : False, "sample_clamp_indirect" : 0.0,
+            "use_adaptive_sampling" : True, "adaptive_threshold" : 0.01, "adaptive_min_samples" : 32,
+            "use_guiding" : False, "use_light_tree" : True,
+            "debug_use_spatial_splits" : True, "use_auto_tile" : True, "tile_size" : 2048,
+        },
+        "render" : {"use_persistent_data" : True},
+    },
+    "FINAL_DIRECT" : {
+        "cycles" : {
+            "max_bounces" : 0, "diffuse_bounces" : 0, "glossy_bounces" : 0, "transmission_bounces" : 0,
+            "volume_bounces" : 0, "transparent_max_bounces" : 8,
+            "caustics_reflective" : False, "caustics_refractive" : False, "sample_clamp_indirect" : 0.0,
+            "use_adaptive_sampling" : True, "adaptive_threshold" : 0.005, "adaptive_min_samples" : 64,
+            "use_guiding" : False, "use_light_tree" : True,
+            "debug_use_spatial_splits" : True, "use_auto_tile" : True, "tile_size" : 2048,
+        },
+        "render" : {"use_persistent_data" : True},
+    },
+    "FINAL_GI" : {
+        "cycles" : {
+            "max_bounces" : 12, "diffuse_bounces" : 4, "glossy_bounces" : 4, "transmission_bounces" : 12,
+            "volume_bounces" : 2, "transparent_max_bounces" : 16,
+            "caustics_reflective" : True, "caustics_refractive" : True, "sample_clamp_indirect" : 0.0,
+            "use_adaptive_sampling" : True, "adaptive_threshold" : 0.005, "adaptive_min_samples" : 64,
+            "use_guiding" : True, "use_light_tree" : True,
+            "debug_use_spatial_splits" : True, "use_auto_tile" : True, "tile_size" : 2048,
+        },
+        "render" : {"use_persistent_data" : True},
+    },
+}
+
+def ProfileSettings(name):
+    # Every value the profile sets, grouped by the scene data they are set on
+    if name not in PROFILES: return {}
+
+    profile = PROFILES[name]
+
+    settings = {
+        key : dict(REQUIRED.get(key, {}), **profile.get(key, {}))
+        for key in ("cycles", "render", "view_settings")
+    }
+
+    if "max_samples" in profile: settings["max_samples"] = profile["max_samples"]
+
+    return settings
+
+def ApplyProfile(scene, name, samples):
+    # Returns the number of samples to render with
+    if name == "CUSTOM": return samples
+
+    if name not in PROFILES:
+        raise ValueError(f"Unknown render profile '{name}', expected one of {', '.join(PROFILES)}")
+
+    for key in ("cycles", "render", "view_settings"):
+        data, values = getattr(scene, key), ProfileSettings(name)[key]
+
+        for prop, value in values.items():
+            setattr(data, prop, value)
+
+    return min(samples, PROFILES[name].get("max_samples", samples))
@@ -34,6 +34,12 @@ def update_falloff_switch(self, context):
         
         node_tree.nodes["Light Falloff Switch"].inputs[0].default_value = self.light_falloff
 
+def update_light_linking(self, context):
+    bl_obj = context.object
+
+    if devices.BL_Projector.is_projector(bl_obj):
+        devices.BL_Projector.set_light_linking(bl_obj)
+
 class PG_ProjectorChannel(bpy.types.PropertyGroup):
     intensity : bpy.props.FloatProperty(name="Intensity", default=1.0, min=0.0, max=1.0) # type: ignore
 
@@ -83,6 +89,11 @@ class PG_ProjectorSettings(bpy.types.PropertyGroup):
     
     resolution : bpy.props.IntVectorProperty(name="Resolution", size=2, default=(1920, 1080), min=100) # type: ignore
 
+    # Light linking, the projector only lights (and is only shadowed by) the measured objects
+    measured : bpy.props.PointerProperty(name="Measured", type=bpy.types.Collection, description="Only objects in this collection are lit by the projector, leave blank to light everything", update=update_light_linking) # type: ignore
+
+    shadow_linking : bpy.props.BoolProperty(name="Shadow Linking", description="Only objects in the measured collection cast projector shadows", default=True, update=update_light_linking) # type: ignore
+
 
 # Camera
 
@@ -109,6 +120,35 @@ class PG_CameraSettings(bpy.types.PropertyGroup):
 
     render_samples : bpy.props.IntProperty(name="Render Samples", default=64) # type: ignore
 
+    # Progressive rendering, render_samples is the most samples a frame may use
+    sample_mode : bpy.props.EnumProperty(
+        name="Sampling",
+        description="How many samples each frame is rendered with",
+        items=[
+            ("FIXED", "Fixed", "Render every frame with the render samples"),
+            ("NOISE", "Noise Target", "Render in rounds until the estimated noise is below the target"),
+            ("TIME", "Time Budget", "Render in rounds until the time budget of the frame is spent"),
+        ]
+    ) # type: ignore
+
+    noise_target : bpy.props.FloatProperty(name="Noise Target", description="RMS standard error of the linear pixel values", default=0.002, min=0.0, precision=4) # type: ignore
+
+    time_budget : bpy.props.FloatProperty(name="Time Budget", description="Render time per frame", default=30.0, min=0.0, unit='TIME_ABSOLUTE') # type: ignore
+
+    min_samples : bpy.props.IntProperty(name="First Round Samples", description="Samples of the first round, every later round doubles the total", default=16, min=1) # type: ignore
+
+    render_profile : bpy.props.EnumProperty(
+        name="Render Profile",
+        description="Cycles settings applied with the camera settings, see profiles.PROFILES",
+        items=[
+            ("CUSTOM", "Custom", "Leave the scene render settings as they are"),
+            ("DRAFT", "Draft", "Few bounces and samples, for checking a rig"),
+            ("CALIBRATION", "Calibration", "Direct light and one diffuse bounce without clamping, for board captures"),
+            ("FINAL_DIRECT", "Final (Direct)", "Direct light only"),
+            ("FINAL_GI", "Final (GI)", "Full global illumination with caustics and path guiding (CPU only)"),
+        ]
+    ) # type: ignore
+
     file_format : bpy.props.EnumProperty(
         name="File Format",
         description="What should the type of output files be?",
@@ -120,12 +160,10 @@ class PG_CameraSettings(bpy.types.PropertyGroup):
 # Fringes Manager
 
 def update_projector(self, context):
-    bl_obj = context.object
+    if devices.BL_Projector.is_projector(self.projector):
+        projector = devices.BL_Projector(self.projector)
 
-    if devices.BL_Projector.is_projector(bl_obj):
-        projector = devices.BL_Projector(bl_obj)
-
-        context.fp_stereo.fringes_manager.multiplexing = 1 < projector.channels
+        self.fringes_manager.multiplexing = 1 < projector.channels
 
 class PG_FringesStripeCount(bpy.types.PropertyGroup):
     value: bpy.props.FloatProperty(name="Fringes Stripe Count", default=32.0, min=0.0, max=10000.0) # type: ignore
@@ -137,7 +175,20 @@ class PG_FringesPhase(bpy.types.PropertyGroup):
     value: bpy.props.FloatProperty(name="Fringes Phase", default=0.0, unit='ROTATION') # type: ignore
 
 class PG_FringesManager(bpy.types.PropertyGroup):        
-    multiplexing : bpy.props.BoolProperty(name="Fringes Multiplexing", description="TODO", default=False) # type: ignore
+    multiplexing : bpy.props.BoolProperty(name="Fringes Multiplexing", description="Show three patterns at once in the R/G/B projector channels", default=False) # type: ignore
+
+    multiplex_mode : bpy.props.EnumProperty(
+        name="Multiplex",
+        description="Which patterns share a frame when multiplexing",
+        items=[
+            ("PHASES", "Phases", "Three phase shifts of the same stripe count"),
+            ("STRIPE_COUNTS", "Stripe Counts", "Three stripe counts with the same phase shift"),
+        ]
+    ) # type: ignore
+
+    # Camera channel response (rows) to each projector channel (columns), inverted to separate the channels
+    crosstalk : bpy.props.FloatVectorProperty(name="Crosstalk", size=(3, 3), subtype='MATRIX',
+        default=((1.0, 0.0, 0.0), (0.0, 1.0, 0.0), (0.0, 0.0, 1.0))) # type: ignore
 
     stripe_counts: bpy.props.CollectionProperty(type=PG_FringesStripeCount) # type: ignore
 
@@ -145,9 +196,57 @@ class PG_FringesManager(bpy.types.PropertyGroup):
 
     rotations : bpy.props.CollectionProperty(type=PG_FringesRotation) # type: ignore
 
+class PG_RigCamera(bpy.types.PropertyGroup):
+    camera : bpy.props.PointerProperty(name="Camera", type=bpy.types.Object, poll=lambda _, o: devices.BL_Camera.is_camera(o)) # type: ignore
+
+# Image sanity monitor, see monitor.py
+class PG_MonitorSettings(bpy.types.PropertyGroup):
+    enabled : bpy.props.BoolProperty(name="Monitor Images", description="Check the statistics of every frame as it is written", default=False) # type: ignore
+    action : bpy.props.EnumProperty(
+        name="Action",
+        description="What happens when a check fails on consecutive frames",
+        items=[
+            ("WARN", "Warn", "Report the problem and keep rendering"),
+            ("SKIP", "Skip Pose", "Report the problem and skip the rest of the board pose"),
+            ("ABORT", "Abort", "Stop the render"),
+        ]
+    ) # type: ignore
+    patience : bpy.props.IntProperty(name="Patience", description="Consecutive failed frames (or phase groups) before acting", default=5, min=1) # type: ignore
+    max_saturated : bpy.props.FloatProperty(name="Max Saturated", description="Largest fraction of saturated pixels", default=0.01, min=0.0, max=1.0, subtype='FACTOR') # type: ignore
+    min_mean : bpy.props.FloatProperty(name="Min Mean", description="Smallest mean intensity", default=0.01, min=0.0, max=1.0, subtype='FACTOR') # type: ignore
+    min_modulation : bpy.props.FloatProperty(name="Min Modulation", description="Smallest median fringe modulation (B / A) of the phase shifts", default=0.05, min=0.0, max=1.0, subtype='FACTOR') # type: ignore
+    min_board : bpy.props.FloatProperty(name="Min Board", description="Smallest fraction of the characterisation board inside the camera view", default=0.5, min=0.0, max=1.0, subtype='FACTOR') # type: ignore
+
+# Automatic exposure, see exposure.py
+def update_auto_exposure(self, context):
+    # The tuned value no longer matches the settings
+    self.tuned = False
+
+class PG_AutoExposureSettings(bpy.types.PropertyGroup):
+    mode : bpy.props.EnumProperty(
+        name="Auto Exposure",
+        description="What the probe renders tune",
+        items=[
+            ("OFF", "Off", "Keep the scene energy and exposure"),
+            ("ENERGY", "Projector Energy", "Tune the projector energy, the ambient light is unchanged"),
+            ("EXPOSURE", "Camera Exposure", "Tune the view exposure, which also scales the ambient light"),
+        ],
+        update=update_auto_exposure
+    ) # type: ignore
+    target : bpy.props.FloatProperty(name="Target Peak", description="Output intensity of the brightest pixels of the brightest pose", default=0.85, min=0.01, max=1.0, subtype='FACTOR', update=update_auto_exposure) # type: ignore
+    percentile : bpy.props.FloatProperty(name="Percentile", description="Percentile of the pixels taken as the peak, below 100 so fireflies are ignored", default=99.9, min=50.0, max=100.0, update=update_auto_exposure) # type: ignore
+    probe_scale : bpy.props.IntProperty(name="Probe Scale", description="Resolution of the probe renders", default=25, min=1, max=100, subtype='PERCENTAGE') # type: ignore
+    probe_samples : bpy.props.IntProperty(name="Probe Samples", description="Samples of the probe renders", default=16, min=1) # type: ignore
+
+    # Result of the last tuning
+    tuned : bpy.props.BoolProperty(name="Tuned", default=False) # type: ignore
+    value : bpy.props.FloatProperty(name="Value", description="Energy or exposure chosen by the last tuning", default=0.0) # type: ignore
+    limiting_pose : bpy.props.IntProperty(name="Limiting Pose", description="Board pose which limited the value, -1 without poses", default=-1) # type: ignore
+
 class PG_StereoFP(bpy.types.PropertyGroup):
     # Devices
     camera : bpy.props.PointerProperty(name="FPStereoCamera", type=bpy.types.Object, poll=lambda _, o: devices.BL_Camera.is_camera(o)) # type: ignore
+    cameras : bpy.props.CollectionProperty(name="FPStereoCameras", type=PG_RigCamera, description="Additional cameras, rendered as extra views of the same render") # type: ignore
     char_board : bpy.props.PointerProperty(name="FPStereoBoard", type=bpy.types.Object, poll=lambda _, o: devices.BL_CharBoard.is_char_board(o)) # type: ignore
     projector : bpy.props.PointerProperty(name="FPStereoProjector", type=bpy.types.Object, poll=lambda _, o: devices.BL_Projector.is_projector(o), update=update_projector) # type: ignore
 
@@ -159,6 +258,57 @@ class PG_StereoFP(bpy.types.PropertyGroup):
 
     metadata : bpy.props.BoolProperty(name="FPStereoMetadata", description="TODO", default=False) # type: ignore
 
+    # Render border around the target's footprint
+    crop : bpy.props.BoolProperty(name="Crop To Target", description="Only render the part of the image around the target (the characterisation board by default)", default=False) # type: ignore
+    crop_target : bpy.props.PointerProperty(name="Crop Target", type=bpy.types.Object, description="Leave blank to use the characterisation board") # type: ignore
+    crop_padding : bpy.props.FloatProperty(name="Crop Padding", description="Padding around the target as a fraction of the image", default=0.05, min=0.0, max=1.0, subtype='FACTOR') # type: ignore
+    crop_fill : bpy.props.EnumProperty(
+        name="Crop Fill",
+        description="What fills the image outside of the render border",
+        items=[
+            ("ZERO", "Zero", "Leave the rest of the image black"),
+            ("BACKGROUND", "Background", "Background rendered once per pattern without the target"),
+        ]
+    ) # type: ignore
+
+    # Checks before animating and rendering, see preflight.py
+    preflight : bpy.props.EnumProperty(
+        name="Preflight",
+        description="Check the scene for settings which ruin the data before animating or rendering",
+        items=[
+            ("CHECK", "Check", "Stop with a report of every problem"),
+            ("FIX", "Fix", "Fix what can be fixed, then stop if any problems are left"),
+            ("OFF", "Off", "Do not check the scene"),
+        ]
+    ) # type: ignore
+
+    monitor : bpy.props.PointerProperty(name="Monitor", type=PG_MonitorSettings) # type: ignore
+
+    auto_exposure : bpy.props.PointerProperty(name="Auto Exposure", type=PG_AutoExposureSettings) # type: ignore
+
+    # Visibility pre-pass
+    culling : bpy.props.EnumProperty(
+        name="Culling",
+        description="Hide objects from the render which are outside of every camera and projector frustum",
+        items=[
+            ("NONE", "None", "Render every object"),
+            ("POSE", "Per Pose", "Test visibility once per board pose"),
+            ("FRAME", "Per Frame", "Test visibility on every frame, for scenes animated between frames"),
+        ]
+    ) # type: ignore
+
+    render_mode : bpy.props.EnumProperty(
+        name="Render Mode",
+        description="How the frames of the sweep are produced",
+        items=[
+            ("FULL", "Full", "Render every frame with Cycles"),
+            ("BASIS", "Phase Basis", "Render DC, cos and sin bases per stripe count and rotation, and synthesise every phase from them (sinusoidal fringes only)"),
+            ("LINEAR", "Linear Light", "Render projector and ambient light passes once per frame, and compose every intensity, exposure and ambient level from them"),
+            ("GEOMETRY", "Geometry Synthesis", "Render one constant pattern and position pass per pose, and compose every fringe pattern from the projector coordinates (approximate, direct light)"),
+            ("PROJECTORS", "Projectors", "Render every projector in its own light group in a single pass, and write one output per projector"),
+        ]
+    ) # type: ignore
+
 
 # Characterisation Board
 
@@ -208,6 +358,9 @@ classes = [
     PG_FringesManager,
 
     # Stereo Fringe Projection
+    PG_RigCamera,
+    PG_MonitorSettings,
+    PG_AutoExposureSettings,
     PG_StereoFP,
 ]
 
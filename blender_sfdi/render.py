@@ -0,0 +1,715 @@
+import os
+import bpy
+import json
+import time
+import hashlib
+import contextlib
+
+from pathlib import Path
+from mathutils import Vector
+from bpy_extras.object_utils import world_to_camera_view
+
+import numpy as np
+
+from . import devices, images, preferences
+from .sweep import FrameName, RenderName, GroupBy, SweepKey
+from .metadata import GenerateMetadata, SplitViews
+from .manifest import Manifest
+from .monitor import ImageMonitor
+from .numeric import NoiseEstimate
+from .preflight import Preflight
+from .utils import HideFromRender
+
+# Render driver
+# Renders the frames of a fringe sweep (see sweep.SweepFrames) to disk without any UI
+
+def OutputDir(scene):
+    settings = scene.fp_stereo
+
+    if settings.output_dir: return Path(bpy.path.abspath(settings.output_dir))
+
+    return preferences.GetOutputPath()
+
+def SetThreads(scene, threads):
+    if threads is None or threads <= 0:
+        scene.render.threads_mode = 'AUTO'
+        return
+
+    scene.render.threads_mode = 'FIXED'
+    scene.render.threads = threads
+
+class ImageFormat:
+    # Temporarily render to another format, e.g. float EXR for images which are processed further
+    def __init__(self, scene, file_format='OPEN_EXR', color_depth='32', color_mode='RGB'):
+        self._settings = scene.render.image_settings
+        self._values = {"file_format" : file_format, "color_depth" : color_depth, "color_mode" : color_mode}
+        self._saved = {}
+
+    def __enter__(self):
+        for key, value in self._values.items():
+            self._saved[key] = getattr(self._settings, key)
+
+        # Format first, depth and mode options depend on it
+        for key, value in self._values.items():
+            setattr(self._settings, key, value)
+
+        return self
+
+    def __exit__(self, *args):
+        for key, value in self._saved.items():
+            setattr(self._settings, key, value)
+
+class LightGroups:
+    # Temporarily assigns objects (and optionally the world) to Cycles light groups,
+    # each group is rendered as its own "Combined_<name>" pass
+    def __init__(self, scene, groups, world=None):
+        self._scene = scene
+        self._groups = groups
+        self._world = world
+
+        self._objects = {}
+        self._added = []
+
+    def __enter__(self):
+        for view_layer in self._scene.view_layers:
+            for name in self._groups:
+                if name in view_layer.lightgroups: continue
+
+                self._added.append((view_layer, view_layer.lightgroups.add(name=name)))
+
+        for name, bl_objs in self._groups.items():
+            for bl_obj in bl_objs:
+                self._objects[bl_obj] = bl_obj.lightgroup
+                bl_obj.lightgroup = name
+
+        world = self._scene.world
+        if self._world is not None and world is not None:
+            self._objects[world] = world.lightgroup
+            world.lightgroup = self._world
+
+        return self
+
+    def __exit__(self, *args):
+        for bl_id, name in self._objects.items():
+            bl_id.lightgroup = name
+
+        for view_layer, lightgroup in self._added:
+            view_layer.lightgroups.remove(lightgroup)
+
+class ViewLayerPasses:
+    # Temporarily enables view layer passes, e.g. "position" for use_pass_position
+    def __init__(self, scene, passes):
+        self._scene = scene
+        self._passes = passes
+        self._saved = []
+
+    def __enter__(self):
+        for view_layer in self._scene.view_layers:
+            for name in self._passes:
+                key = f"use_pass_{name}"
+
+                self._saved.append((view_layer, key, getattr(view_layer, key)))
+                setattr(view_layer, key, True)
+
+        return self
+
+    def __exit__(self, *args):
+        for view_layer, key, value in self._saved:
+            setattr(view_layer, key, value)
+
+        self._saved.clear()
+
+def PassName(lightgroup):
+    return f"Combined_{lightgroup}"
+
+class PassOutputs:
+    # Writes render passes to float EXRs in directory through the compositor, independent of the
+    # scene output format. Files are named after the pass and the rendered frame.
+    def __init__(self, scene, passes, directory):
+        self._scene = scene
+        self._passes = passes
+
+        self.directory = Path(directory)
+
+    def __enter__(self):
+        scene = self._scene
+
+        self._saved = (scene.compositing_node_group, scene.render.use_compositing)
+
+        self._tree = bpy.data.node_groups.new("SFDI Pass Outputs", "CompositorNodeTree")
+
+        node_layers = self._tree.nodes.new("CompositorNodeRLayers")
+        node_layers.scene = scene
+
+        node_output = self._tree.nodes.new("CompositorNodeOutputFile")
+        node_output.directory = str(self.directory) + "/"
+        node_output.format.file_format = 'OPEN_EXR'
+        node_output.format.color_depth = '32'
+        node_output.format.color_mode = 'RGB'
+
+        node_output.file_output_items.clear()
+        for name in self._passes:
+            node_output.file_output_items.new('RGBA', name)
+            self._tree.links.new(node_layers.outputs[name], node_output.inputs[name])
+
+        scene.compositing_node_group = self._tree
+        scene.render.use_compositing = True
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        return self
+
+    def __exit__(self, *args):
+        scene = self._scene
+        scene.compositing_node_group, scene.render.use_compositing = self._saved
+
+        bpy.data.node_groups.remove(self._tree)
+
+    def path(self, name):
+        # The file output item name followed by the frame, a glob would also match passes
+        # whose names start with name (e.g. Combined_Projector and Combined_Projector_001)
+        path = self.directory / f"{name}{self._scene.frame_current:04d}.exr"
+        if not path.exists(): raise FileNotFoundError(f"Render pass '{name}' was not written to {path}")
+
+        return path
+
+def AmbientLights(scene, projector):
+    return [bl_obj for bl_obj in scene.objects if bl_obj.type == 'LIGHT' and bl_obj != projector.bl_obj]
+
+def WorldStrengths(scene):
+    if scene.world is None or scene.world.node_tree is None: return []
+
+    return [node.inputs["Strength"] for node in scene.world.node_tree.nodes if node.type == 'BACKGROUND']
+
+class Level:
+    # Applies the intensity, energy, exposure and ambient values of a level frame (see sweep.SweepLevels)
+    #   intensity : intensity of every projector channel
+    #   energy    : projector light energy
+    #   exposure  : view exposure in stops
+    #   ambient   : scale of every other light and the world background (emissive meshes are not scaled)
+    def __init__(self, scene, params):
+        self._scene = scene
+        self._params = params
+        self._saved = []
+
+    def _set(self, data, key, value):
+        self._saved.append((data, key, getattr(data, key)))
+        setattr(data, key, value)
+
+    def __enter__(self):
+        scene = self._scene
+        projector = devices.BL_Projector.from_bl_obj(scene.fp_stereo.projector)
+
+        if self._params.get("intensity") is not None:
+            for channel in projector.settings.channels_list:
+                self._set(channel, "intensity", self._params["intensity"])
+
+        if self._params.get("energy") is not None:
+            self._set(projector.bl_obj.data, "energy", self._params["energy"])
+
+        if self._params.get("exposure") is not None:
+            self._set(scene.view_settings, "exposure", self._params["exposure"])
+
+        ambient = self._params.get("ambient")
+        if ambient is not None:
+            for bl_obj in AmbientLights(scene, projector):
+                self._set(bl_obj.data, "energy", bl_obj.data.energy * ambient)
+
+            for socket in WorldStrengths(scene):
+                self._set(socket, "default_value", socket.default_value * ambient)
+
+        return self
+
+    def __exit__(self, *args):
+        for data, key, value in reversed(self._saved):
+            setattr(data, key, value)
+
+        self._saved.clear()
+
+class RenderSettings:
+    # Temporarily sets properties of scene data, e.g. RenderSettings(scene.cycles, samples=16)
+    def __init__(self, data, **values):
+        self._data = data
+        self._values = values
+        self._saved = {}
+
+    def __enter__(self):
+        for key, value in self._values.items():
+            self._saved[key] = getattr(self._data, key)
+            setattr(self._data, key, value)
+
+        return self
+
+    def __exit__(self, *args):
+        for key, value in self._saved.items():
+            setattr(self._data, key, value)
+
+# Sample budgets
+# With a noise target or time budget (PG_CameraSettings.sample_mode) a frame is rendered in rounds,
+# each an independent float render with its own seed. Rounds are split between two halves, and the
+# per pixel variance is estimated from the difference of their means. Each round doubles the samples
+# so far, until the target is met, the budget is spent or render_samples is reached. The halves do
+# not get the same samples (m, m, 2m, 4m... alternate between them), so the difference is weighted by
+# the samples of each half.
+
+SEED_STEP = 7919
+
+def CropTarget(scene):
+    settings = scene.fp_stereo
+
+    return settings.crop_target or settings.char_board
+
+def TargetBorder(scene, camera, target, padding=0.0):
+    # Normalised (min_x, max_x, min_y, max_y) border around the target's bounding box in the camera
+    # image, None when the whole image has to be rendered
+    corners = [world_to_camera_view(scene, camera, target.matrix_world @ Vector(corner)) for corner in target.bound_box]
+
+    # Partly behind the camera, the projection is not bounded
+    if any(corner.z <= 0.0 for corner in corners): return None
+
+    xs = [corner.x for corner in corners]
+    ys = [corner.y for corner in corners]
+
+    border = (
+        max(0.0, min(xs) - padding), min(1.0, max(xs) + padding),
+        max(0.0, min(ys) - padding), min(1.0, max(ys) + padding),
+    )
+
+    # Out of view
+    if border[1] <= border[0] or border[3] <= border[2]: return None
+
+    return border
+
+class RenderBorder:
+    # Temporarily renders only the border, the image keeps its full size with nothing outside of it
+    def __init__(self, scene, border):
+        self._render = scene.render
+        self._border = border
+
+    def __enter__(self):
+        render = self._render
+        self._saved = (render.use_border, render.use_crop_to_border, render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y)
+
+        if self._border is not None:
+            render.use_border = True
+            render.use_crop_to_border = False
+            render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y = self._border
+
+        return self
+
+    def __exit__(self, *args):
+        render = self._render
+        render.use_border, render.use_crop_to_border, render.border_min_x, render.border_max_x, render.border_min_y, render.border_max_y = self._saved
+
+def ViewSuffix(view):
+    return f"_v{view:02d}"
+
+class MultiView:
+    # Renders every camera of a multi-view rig as a view of one render, so they share scene sync,
+    # BVH build and shader compilation. Each view uses the camera named by its suffix: the main
+    # camera's name is the whole suffix of its own view, which leaves an empty base name.
+    # Views are written as individual files with ViewSuffix before the extension.
+    def __init__(self, scene, cameras):
+        self._scene = scene
+        self._cameras = cameras
+
+        self.enabled = 1 < len(cameras)
+
+        self._saved = []
+        self._views = []
+
+    def _set(self, data, key, value):
+        self._saved.append((data, key, getattr(data, key)))
+        setattr(data, key, value)
+
+    def __enter__(self):
+        if not self.enabled: return self
+
+        scene = self._scene
+        resolution = tuple(self._cameras[0].resolution)
+
+        for camera in self._cameras[1:]:
+            if tuple(camera.resolution) != resolution:
+                raise ValueError(f"Camera '{camera.bl_obj.name}' has a different resolution, every view of a multi-view render shares one")
+
+        self._set(scene, "camera", self._cameras[0].bl_obj)
+        self._set(scene.render, "use_multiview", True)
+        self._set(scene.render, "views_format", 'MULTIVIEW')
+        self._set(scene.render.image_settings, "views_format", 'INDIVIDUAL')
+
+        for view in scene.render.views:
+            self._set(view, "use", False)
+
+        for i, camera in enumerate(self._cameras):
+            view = scene.render.views.new(f"SFDI View {i}")
+            view.camera_suffix = camera.bl_obj.name
+            view.file_suffix = ViewSuffix(i)
+            view.use = True
+
+            self._views.append(view)
+
+        return self
+
+    def __exit__(self, *args):
+        for view in self._views:
+            self._scene.render.views.remove(view)
+
+        for data, key, value in reversed(self._saved):
+            setattr(data, key, value)
+
+        self._views.clear()
+        self._saved.clear()
+
+    def path(self, path, view=None):
+        # File a view of the render at path is written to
+        if not self.enabled or view is None: return path
+
+        return path.with_name(f"{path.stem}{ViewSuffix(view)}{path.suffix}")
+
+    def clean(self, path):
+        for i in range(len(self._cameras)):
+            self.path(path, i).unlink(missing_ok=True)
+
+class RenderDriver:
+    MODE = "FULL"
+
+    def __init__(self, scene, output_dir=None, output_name=None, resume=True, verify="full", cache=None):
+        self._scene = scene
+
+        settings = scene.fp_stereo
+
+        self.output_dir = Path(output_dir) if output_dir else OutputDir(scene)
+        self.output_name = output_name or settings.output_name or "frame"
+        self.extension = scene.render.file_extension
+
+        # Skip frames already in the manifest, "full" verification also checks the checksum
+        self.manifest = Manifest(self.output_dir)
+        self.resume = resume
+        self.verify = verify
+
+        # Optional cache.RenderCache shared between datasets
+        self.cache = cache
+
+        # Every camera of a multi-view rig is written from the same render
+        self.cameras = devices.BL_Camera.rig_cameras(settings)
+
+        # Samples of the last render_frame, None when it came from the cache
+        self.samples = None
+
+        # Preflight warnings of the last render
+        self.warnings = []
+
+        # Image sanity monitor of the last render, see monitor.py
+        self.monitor = None
+
+        # Names of the output frames of the last render which were complete in the manifest
+        self.resumed = set()
+
+    @property
+    def scene(self):
+        return self._scene
+
+    def frame_path(self, params):
+        return self.output_dir / f"{self.output_name}{FrameName(params)}{self.extension}"
+
+    def render_still(self, path):
+        # Never write through a hard link into the render cache
+        Path(path).unlink(missing_ok=True)
+
+        self.scene.render.filepath = str(path)
+
+        bpy.ops.render.render(write_still=True, scene=self.scene.name)
+
+    @property
+    def crosstalk(self):
+        return np.array(self.scene.fp_stereo.fringes_manager.crosstalk)
+
+    def crop_border(self):
+        # Border of the current frame, only for single camera renders
+        settings = self.scene.fp_stereo
+        target = CropTarget(self.scene)
+
+        if not settings.crop or target is None or len(self.cameras) != 1: return None
+
+        return TargetBorder(self.scene, self.cameras[0].bl_obj, target, padding=settings.crop_padding)
+
+    def background_path(self, params):
+        # Backgrounds only depend on the projected pattern, so they are shared by every board pose
+        values = {key : value for key, value in params.items() if key not in ("frame", "pose")}
+        digest = hashlib.sha1(json.dumps(values, sort_keys=True).encode()).hexdigest()[:16]
+
+        return self.output_dir / ".background" / f"{digest}{self.extension}"
+
+    def render_background(self, params):
+        path = self.background_path(params)
+        if path.exists(): return path
+
+        path.parent.mkdir(exist_ok=True)
+
+        # Same frame and level, without the target
+        with HideFromRender(CropTarget(self.scene)):
+            self.render_still(path)
+
+        return path
+
+    def render_backgrounds(self, frames):
+        # Every missing background in one pass before the sweep, so the target is hidden (a BVH
+        # rebuild with persistent data) once rather than twice per background. Only for single camera
+        # renders without multiplexing, and without a cache, which may already hold the frames
+        settings = self.scene.fp_stereo
+        target = CropTarget(self.scene)
+
+        if not settings.crop or settings.crop_fill != "BACKGROUND" or target is None or len(self.cameras) != 1: return
+        if self.cache is not None: return
+
+        todo = {}
+        for params in frames:
+            path = self.background_path(params)
+            if params.get("channel") is None and not path.exists(): todo.setdefault(path, params)
+
+        if not todo: return
+
+        next(iter(todo)).parent.mkdir(exist_ok=True)
+
+        with HideFromRender(target):
+            for path, params in todo.items():
+                self.scene.frame_set(params["frame"])
+
+                with Level(self.scene, params):
+                    self.render_still(path)
+
+    def preflight(self):
+        self.warnings = Preflight(self.scene, self.scene.fp_stereo.preflight)
+
+    def start_monitor(self):
+        self.monitor = ImageMonitor(self.scene, self.output_dir) if self.scene.fp_stereo.monitor.enabled else None
+
+    def is_skipped(self, params):
+        return self.monitor is not None and self.monitor.is_skipped(params)
+
+    def observe(self, entry):
+        # Statistics of a newly written frame
+        return self.monitor.observe(entry) if self.monitor is not None else entry
+
+    def finish_monitor(self):
+        if self.monitor is not None: self.monitor.finish()
+
+    @property
+    def sample_mode(self):
+        return self.cameras[0].settings.sample_mode if self.cameras else "FIXED"
+
+    def check_sampling(self):
+        if self.sample_mode == "FIXED": return
+
+        if 1 < len(self.cameras) or self.scene.fp_stereo.fringes_manager.multiplexing:
+            raise ValueError("Noise targets and time budgets only support single camera renders without multiplexing")
+
+    def render_progressive(self, path):
+        # Renders path in rounds (see NoiseEstimate), returns the samples used
+        scene = self.scene
+        settings = self.cameras[0].settings
+
+        max_samples = scene.cycles.samples
+        round_samples = min(settings.min_samples, max_samples)
+
+        halves = [[0.0, 0], [0.0, 0]]
+        used = 0
+        start = time.monotonic()
+
+        tmp = path.with_name(f".{path.stem}.exr")
+
+        with ImageFormat(scene):
+            for i in range(max_samples):
+                with RenderSettings(scene.cycles, samples=round_samples, seed=scene.cycles.seed + SEED_STEP * i):
+                    self.render_still(tmp)
+
+                # Each round goes to the half with fewer samples
+                half = min(halves, key=lambda h: h[1])
+                half[0] = half[0] + round_samples * images.LoadImage(tmp)
+                half[1] += round_samples
+
+                used += round_samples
+                if max_samples <= used: break
+
+                if settings.sample_mode == "NOISE" and halves[1][1] and NoiseEstimate(halves) <= settings.noise_target: break
+
+                round_samples = min(used, max_samples - used)
+
+                if settings.sample_mode == "TIME":
+                    elapsed = time.monotonic() - start
+                    round_samples = min(round_samples, int((settings.time_budget - elapsed) * used / elapsed))
+
+                    if round_samples < 1: break
+
+        tmp.unlink(missing_ok=True)
+
+        # Float renders skip the view transform, the profiles use Raw
+        image = (halves[0][0] + halves[1][0]) / used * 2.0 ** scene.view_settings.exposure
+
+        image_settings = scene.render.image_settings
+        images.SaveImage(path, image, bit_depth=image_settings.color_depth, channels=1 if image_settings.color_mode == 'BW' else 3)
+
+        return used
+
+    def render_frame(self, params, path=None, use_cache=True):
+        if path is None: path = self.frame_path(params)
+
+        self.scene.frame_set(params["frame"])
+
+        border = self.crop_border()
+
+        # Backgrounds are written with the output format
+        fill = border is not None and self.scene.fp_stereo.crop_fill == "BACKGROUND" and path.suffix == self.extension
+
+        # Sample budgets are only used for files in the output format
+        progressive = self.sample_mode != "FIXED" and path.suffix == self.extension
+
+        with Level(self.scene, params):
+            self.samples = None
+
+            key = self.cache.key(self.scene) if self.cache is not None and use_cache else None
+            if key is not None and self.cache.fetch(key, path): return path
+
+            background = self.render_background(params) if fill else None
+
+            with RenderBorder(self.scene, border):
+                if progressive: self.samples = self.render_progressive(path)
+                else:
+                    self.render_still(path)
+                    self.samples = self.scene.cycles.samples
+
+        if background is not None: images.CompositeBorder(path, background, border)
+
+        if key is not None: self.cache.store(key, path)
+
+        return path
+
+    def is_complete(self, params, completed):
+        entry = completed.get(FrameName(params))
+        if entry is None: return False
+
+        return self.manifest.verify(entry, params, full=self.verify == "full")
+
+    def save_channels(self, group, image):
+        # Multiplexed frames are written as one single channel image per projector channel
+        image = images.Demultiplex(image, self.crosstalk)
+        bit_depth = self.scene.render.image_settings.color_depth
+
+        for params in group:
+            params = dict(params, samples=self.samples)
+
+            path = self.frame_path(params)
+            images.SaveImage(path, image[..., params["channel"]], bit_depth=bit_depth, channels=1)
+
+            self.manifest.record(params, path)
+
+            yield dict(params, file=path.name)
+
+    def render_views(self, group):
+        # Renders every view (camera) and projector channel of a frame at once, then splits them
+        multiplexed = group[0].get("channel") is not None
+
+        if multiplexed and self.scene.render.image_settings.color_mode != 'RGB':
+            raise ValueError("Multiplexed frames need a colour camera")
+
+        # Float render so the channels can be separated before quantising
+        extension = ".exr" if multiplexed else self.extension
+        path = self.output_dir / f".{self.output_name}{RenderName(group[0])}{extension}"
+
+        image_format = ImageFormat(self.scene) if multiplexed else contextlib.nullcontext()
+
+        with image_format, MultiView(self.scene, self.cameras) as views:
+            # The cache only knows single files
+            self.render_frame(group[0], path, use_cache=not views.enabled)
+
+        for view, view_group in GroupBy(group, lambda f: f.get("camera")):
+            view_path = views.path(path, view)
+
+            if multiplexed:
+                # Float renders skip the view transform
+                image = images.LoadImage(view_path) * 2.0 ** self.scene.view_settings.exposure
+                yield from self.save_channels(view_group, image)
+                continue
+
+            params = dict(view_group[0], samples=self.samples)
+            filepath = self.frame_path(params)
+
+            os.replace(view_path, filepath)
+            self.manifest.record(params, filepath)
+
+            yield dict(params, file=filepath.name)
+
+        # Views of outputs which were already complete, and float renders
+        views.clean(path)
+        path.unlink(missing_ok=True)
+
+    def output_frames(self, frames):
+        # Output frames written for the sweep frames, a mode may write several per frame
+        if len(self.cameras) < 2: return frames
+
+        return [
+            dict(params, camera=i, camera_name=camera.bl_obj.name)
+            for params in frames for i, camera in enumerate(self.cameras)
+        ]
+
+    def render(self, frames, callback=None):
+        self.preflight()
+        self.check_sampling()
+
+        frames = self.output_frames(frames)
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        completed = self.manifest.load() if self.resume else {}
+        self.resumed = set()
+
+        self.start_monitor()
+
+        self.render_backgrounds([params for params in frames if FrameName(params) not in completed])
+
+        rendered = {}
+        def finish(entry):
+            rendered[FrameName(entry)] = entry
+            if callback is not None: callback(entry)
+
+        for _, group in GroupBy(frames, RenderName):
+            todo = []
+            for params in group:
+                if self.is_complete(params, completed):
+                    entry = completed[FrameName(params)]
+                    self.resumed.add(FrameName(params))
+                    finish(dict(params, file=entry["file"], samples=entry.get("samples")))
+                else: todo.append(params)
+
+            if not todo or self.is_skipped(todo[0]): continue
+
+            if todo[0].get("channel") is not None or todo[0].get("camera") is not None:
+                for entry in self.render_views(todo): finish(self.observe(entry))
+                continue
+
+            for params in todo:
+                path = self.render_frame(params)
+
+                params = dict(params, samples=self.samples)
+                self.manifest.record(params, path)
+
+                finish(self.observe(dict(params, file=path.name)))
+
+        self.finish_monitor()
+
+        # Frames of skipped poses are left out
+        return [rendered[FrameName(params)] for params in frames if FrameName(params) in rendered]
+
+    def write_metadata(self, frames, filename="metadata.json"):
+        metadata = GenerateMetadata(self.scene)
+        metadata["render_mode"] = self.MODE
+        # Outputs in sweep order, whatever order they were rendered in
+        metadata["frames"] = sorted(frames, key=SweepKey)
+        if self.monitor is not None: metadata["monitor"] = self.monitor.summary()
+        SplitViews(metadata)
+
+        filepath = self.output_dir / filename
+        with open(filepath, 'w') as json_file:
+            json.dump(metadata, json_file, indent=2)
+
+        return filepath
@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import signal
+import threading
+import subprocess
+import collections
+
+from pathlib import Path
+
+import bpy
+
+from . import batch, pool, render, sweep
+
+# Render queue
+# Sweeps queued from the SFDI panel are rendered one after another by a background Blender running
+# batch.py, so the UI stays responsive and other scenes can be edited meanwhile. Queuing saves a
+# snapshot of the .blend, so later edits do not change a queued sweep. OP_RenderQueue polls the
+# running render from a modal timer and counts the "Rendered frame" lines batch.py prints. Frames
+# resumed from the manifest count as done but not towards the throughput.
+#
+# Pausing stops the render process (SIGSTOP, or psutil on Windows) and cancelling terminates it.
+# Frames already written are in the manifest, so a cancelled sweep resumes when it is queued again.
+
+PENDING = "PENDING"
+RUNNING = "RUNNING"
+PAUSED = "PAUSED"
+DONE = "DONE"
+FAILED = "FAILED"
+CANCELLED = "CANCELLED"
+
+# Lines batch.py prints for every output frame, rendered or resumed from the manifest
+PROGRESS_PREFIX = "Rendered frame"
+RESUMED_PREFIX = "Resumed frame"
+
+def SignalProcess(proc, pause):
+    if hasattr(signal, "SIGSTOP"):
+        os.kill(proc.pid, signal.SIGSTOP if pause else signal.SIGCONT)
+        return
+
+    # Windows
+    try:
+        import psutil
+    except ImportError:
+        raise ValueError("Pausing a render needs psutil on Windows")
+
+    process = psutil.Process(proc.pid)
+    if pause: process.suspend()
+    else: process.resume()
+
+class QueuedRender:
+    def __init__(self, job_id, name, blend, job_path, output_dir, total):
+        self.job_id = job_id
+        self.name = name
+        self.blend = Path(blend)
+        self.job_path = Path(job_path)
+        self.output_dir = Path(output_dir)
+        self.total = total
+
+        self.status = PENDING
+        self.done = 0
+        self.resumed = 0
+        self.message = ""
+
+        self.proc = None
+        self._reader = None
+        self._lines = collections.deque()
+
+        # Seconds spent rendering, without pauses
+        self._started = None
+        self._paused_at = None
+        self._paused = 0.0
+
+    @property
+    def is_active(self):
+        return self.status in (RUNNING, PAUSED)
+
+    @property
+    def elapsed(self):
+        if self._started is None: return 0.0
+
+        now = self._paused_at if self._paused_at is not None else time.monotonic()
+
+        return now - self._started - self._paused
+
+    @property
+    def progress(self):
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+    @property
+    def rendered(self):
+        return self.done - self.resumed
+
+    @property
+    def throughput(self):
+        # Rendered output frames per minute
+        return 60.0 * self.rendered / self.elapsed if 0.0 < self.elapsed else 0.0
+
+    @property
+    def eta(self):
+        # Seconds left at the current throughput, None before the first rendered frame
+        if not self.rendered: return None
+
+        return max(0, self.total - self.done) * self.elapsed / self.rendered
+
+    def start(self, blender=None):
+        command = [
+            blender or bpy.app.binary_path, "-b", "-P", str(pool.PACKAGE_DIR / "batch.py"), "--",
+            str(self.job_path), "--output", str(self.output_dir),
+        ]
+
+        self.proc = subprocess.Popen(command, env=pool.WorkerEnv(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
+
+        # Pipes are read on a thread so polling never blocks the UI
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+        self._started = time.monotonic()
+        self.status = RUNNING
+
+    def _read(self):
+        for line in self.proc.stdout:
+            self._lines.append(line.rstrip())
+
+    def _drain(self):
+        while self._lines:
+            line = self._lines.popleft()
+
+            if line.startswith(PROGRESS_PREFIX): self.done += 1
+            elif line.startswith(RESUMED_PREFIX):
+                self.done += 1
+                self.resumed += 1
+            elif line: self.message = line
+
+    def pause(self, pause=True):
+        if self.status != (RUNNING if pause else PAUSED): return
+
+        SignalProcess(self.proc, pause)
+
+        if pause:
+            self._paused_at = time.monotonic()
+            self.status = PAUSED
+        else:
+            self._paused += time.monotonic() - self._paused_at
+            self._paused_at = None
+            self.status = RUNNING
+
+    def cancel(self):
+        if self.status == PAUSED: self.pause(False)
+
+        if self.status == RUNNING:
+            self.proc.terminate()
+
+            try:
+                self.proc.wait(timeout=10.0)
+            except subprocess.TimeoutExpired:
+                # Blender did not stop, e.g. busy in a render
+                self.proc.kill()
+                self.proc.wait()
+
+        if self.status in (PENDING, RUNNING):
+            self.status = CANCELLED
+            self.finish()
+
+    def update(self):
+        # Returns True when the render has just ended
+        if self.proc is None: return False
+
+        self._drain()
+        if not self.is_active or self.proc.poll() is None: return False
+
+        # Last lines written before the process exited
+        self._reader.join(timeout=1.0)
+        self._drain()
+
+        self.status = DONE if self.proc.returncode == 0 else FAILED
+        self.finish()
+
+        return True
+
+    def finish(self):
+        if self._paused_at is not None: self._paused += time.monotonic() - self._paused_at
+        self._paused_at = None
+
+        # Snapshot and job spec
+        self.blend.unlink(missing_ok=True)
+        self.job_path.unlink(missing_ok=True)
+
+class RenderQueue:
+    def __init__(self):
+        self.jobs = []
+        self.polling = False
+        self._next_id = 0
+
+    def add(self, scene):
+        # Snapshot of the current file, rendered with the scene settings
+        settings = scene.fp_stereo
+        output_dir = render.OutputDir(scene)
+
+        queue_dir = output_dir / ".queue"
+        queue_dir.mkdir(parents=True, exist_ok=True)
+
+        job_id = self._next_id
+        self._next_id += 1
+
+        stem = f"{bpy.path.clean_name(scene.name)}_{os.getpid()}_{job_id:03d}"
+        blend = queue_dir / f"{stem}.blend"
+        bpy.ops.wm.save_as_mainfile(filepath=str(blend), copy=True, check_existing=False)
+
+        job_path = queue_dir / f"{stem}.json"
+        with open(job_path, "w") as json_file:
+            json.dump({"blend" : str(blend), "render" : {"mode" : settings.render_mode}}, json_file, indent=2)
+
+        driver = batch.DRIVERS[settings.render_mode](scene, output_dir=output_dir)
+        total = len(driver.output_frames(sweep.SceneSweep(scene)))
+
+        job = QueuedRender(job_id, f"{scene.name} ({settings.render_mode.lower()})", blend, job_path, output_dir, total)
+        self.jobs.append(job)
+
+        return job
+
+    def find(self, job_id):
+        return next((job for job in self.jobs if job.job_id == job_id), None)
+
+    @property
+    def active(self):
+        return next((job for job in self.jobs if job.is_active), None)
+
+    @property
+    def is_idle(self):
+        return all(job.status not in (PENDING, RUNNING, PAUSED) for job in self.jobs)
+
+    def update(self):
+        # Returns the renders which ended, and starts the next one
+        ended = [job for job in self.jobs if job.update()]
+
+        if self.active is None:
+            pending = next((job for job in self.jobs if job.status == PENDING), None)
+            if pending is not None: pending.start()
+
+        return ended
+
+    def clear(self):
+        # Forgets renders which have ended
+        self.jobs = [job for job in self.jobs if job.status in (PENDING, RUNNING, PAUSED)]
+
+    def cancel_all(self):
+        for job in self.jobs: job.cancel()
+
+# Renders queued in this Blender session
+QUEUE = RenderQueue()
@@ -0,0 +1,178 @@
+import itertools
+
+# Fringe sweeps
+# Each frame of a sweep is a dict of the values keyframed for it, nested as
+# poses -> rotations -> stripe counts -> phases
+#
+# Multiplexed sweeps show three phases (or stripe counts) at once in the R/G/B projector channels,
+# each output frame then has the channel it is shown in.
+#
+# A timeline frame can produce several output frames (e.g. one per level of a level sweep), these
+# are told apart by tags and named by FrameName.
+
+FRAME_TAGS = [("level", "l"), ("projector", "p"), ("channel", "c"), ("camera", "v")]
+
+MULTIPLEX_CHANNELS = 3
+
+LEVEL_KEYS = {
+    "intensities" : "intensity",
+    "energies" : "energy",
+    "exposures" : "exposure",
+    "ambients" : "ambient",
+}
+
+def _chunks(values, size):
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+def _packs(stripe_counts, phases, multiplex=None):
+    # Patterns of one rotation grouped by the frame which shows them, multiplexed frames show
+    # up to MULTIPLEX_CHANNELS patterns at once, one per projector channel
+    if multiplex is None:
+        return [[(stripe_count, phase)] for stripe_count in stripe_counts for phase in phases]
+
+    if multiplex == "PHASES":
+        return [[(stripe_count, phase) for phase in chunk] for stripe_count in stripe_counts for chunk in _chunks(phases, MULTIPLEX_CHANNELS)]
+
+    if multiplex == "STRIPE_COUNTS":
+        return [[(stripe_count, phase) for stripe_count in chunk] for phase in phases for chunk in _chunks(stripe_counts, MULTIPLEX_CHANNELS)]
+
+    raise ValueError(f"Unknown multiplexing '{multiplex}', expected PHASES or STRIPE_COUNTS")
+
+def SweepFrames(stripe_counts, phases, rotations, pose_count=None, frame_start=0, multiplex=None):
+    poses = [None] if pose_count is None else range(pose_count)
+
+    frames = []
+    frame_id = frame_start
+
+    for pose in poses:
+        for rotation in rotations:
+            for pack in _packs(list(stripe_counts), list(phases), multiplex):
+                for channel, (stripe_count, phase) in enumerate(pack):
+                    params = {
+                        "frame" : frame_id,
+                        "pose" : pose,
+                        "rotation" : rotation,
+                        "stripe_count" : stripe_count,
+                        "phase" : phase,
+                    }
+
+                    if multiplex is not None: params["channel"] = channel
+
+                    frames.append(params)
+
+                frame_id += 1
+
+    return frames
+
+def SceneSweep(scene, frame_start=0):
+    # The other helpers do not need bpy, so they can be used outside of Blender
+    from . import devices
+
+    settings = scene.fp_stereo
+    fringes_manager = settings.fringes_manager
+
+    pose_count = None
+    if devices.BL_CharBoard.is_char_board(settings.char_board):
+        pose_count = len(settings.char_board.sfdi.poses)
+
+    return SweepFrames(
+        [prop.value for prop in fringes_manager.stripe_counts],
+        [prop.value for prop in fringes_manager.phases],
+        [prop.value for prop in fringes_manager.rotations],
+        pose_count=pose_count, frame_start=frame_start,
+        multiplex=fringes_manager.multiplex_mode if fringes_manager.multiplexing else None
+    )
+
+def SelectFrames(frames, frame_range):
+    # frame_range is an inclusive "start:end" string, either end may be left blank
+    if not frame_range: return frames
+
+    start, _, end = frame_range.partition(":")
+    start = int(start) if start else None
+    end = int(end) if end else None
+
+    return [f for f in frames if (start is None or start <= f["frame"]) and (end is None or f["frame"] <= end)]
+
+def FrameName(params):
+    # Unique name of an output frame, also used to key the manifest
+    name = f"{params['frame']:05d}"
+
+    for key, prefix in FRAME_TAGS:
+        if params.get(key) is not None: name += f"_{prefix}{params[key]:02d}"
+
+    return name
+
+def SweepKey(params):
+    # Sort key of the sweep (output) order, frames may be rendered in another order (see planner.py)
+    return (params["frame"],) + tuple(-1 if params.get(key) is None else params[key] for key, _ in FRAME_TAGS)
+
+def RenderName(params):
+    # Name of the render which produces an output frame, multiplexed channels and the views of
+    # a multi-view rig share a render
+    return FrameName(dict(params, channel=None, camera=None))
+
+def GroupBy(frames, key):
+    # Order preserving grouping of sweep frames
+    groups = {}
+    for params in frames:
+        groups.setdefault(key(params), []).append(params)
+
+    return groups.items()
+
+def SweepLevels(levels):
+    # levels maps "intensities", "energies", "exposures" and "ambients" to lists of values,
+    # every combination becomes one level. Missing lists keep the value set in the scene.
+    if not levels: return []
+
+    unknown = set(levels) - set(LEVEL_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown level sweep values {sorted(unknown)}, expected {list(LEVEL_KEYS)}")
+
+    keys = [LEVEL_KEYS[key] for key in levels]
+
+    return [dict(zip(keys, values)) for values in itertools.product(*levels.values())]
+
+def ExpandLevels(frames, levels):
+    # Every timeline frame is written once per level
+    if not levels: return frames
+
+    return [dict(params, level=i, **level) for params in frames for i, level in enumerate(levels)]
+
+def ChunkFrames(frames, size):
+    # Chunks of at most size timeline frames, the outputs of a timeline frame are never split
+    chunks = []
+    timeline = []
+
+    for params in frames:
+        if not chunks or (params["frame"] != timeline[-1] and len(timeline) == size):
+            chunks.append([])
+            timeline = []
+
+        if not timeline or params["frame"] != timeline[-1]: timeline.append(params["frame"])
+        chunks[-1].append(params)
+
+    return chunks
+
+def SplitFrames(frames, workers):
+    # Contiguous chunks of timeline frames so each worker keeps board poses together
+    timeline = [group for _, group in GroupBy(frames, lambda f: f["frame"])]
+
+    workers = max(1, min(workers, len(timeline)))
+    size, remainder = divmod(len(timeline), workers)
+
+    chunks = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < remainder else 0)
+        chunks.append([params for group in timeline[start:end] for params in group])
+        start = end
+
+    return chunks
+
+def StratifiedUnits(units, count):
+    # The middle unit of count equally sized strata of the sweep, which is nested as
+    # poses -> rotations -> stripe counts -> phases so every level is covered
+    units = list(units)
+    count = max(1, min(count, len(units)))
+
+    return [units[int((i + 0.5) * len(units) / count)] for i in range(count)]
@@ -0,0 +1,380 @@
+import bpy
+import mathutils
+import numpy as np
+
+from . import devices, images
+from .numeric import ComposeLevel, FringePattern, SynthesisePhase
+from .render import RenderDriver, ImageFormat, LightGroups, PassOutputs, PassName, ViewLayerPasses
+from .sweep import FrameName, GroupBy
+from .utils import MuteAnimation
+
+# Synthesised render modes
+# Light transport in Cycles is linear in the projector emission, so frames which only differ by a
+# linear change in the pattern can be composed in NumPy from a few float renders.
+
+# Phase basis
+# The projected pattern is (1 + cos(kx + phase)) / 2 and cos(kx + phase) = cos(kx)cos(phase) - sin(kx)sin(phase),
+# so every phase shift is a combination of three renders:
+#   DC  : stripe count 0 and phase pi/2, a constant 0.5 pattern (shared by every stripe count and rotation of a pose)
+#   COS : phase 0,    (1 + cos(kx)) / 2
+#   SIN : phase pi/2, (1 - sin(kx)) / 2
+
+class SynthesisRenderDriver(RenderDriver):
+    # Renders float intermediates to basis_dir and writes frames composed from them in NumPy.
+    # Modes provide group_key(params), the frames rendered together, and render_groups(groups, finish)
+    # which renders the (key, frames) groups still to be rendered and passes each entry to finish
+
+    def __init__(self, scene, keep_basis=False, **kwargs):
+        super().__init__(scene, **kwargs)
+
+        self.keep_basis = keep_basis
+
+        settings = scene.fp_stereo
+        self.camera = devices.BL_Camera.from_bl_obj(settings.camera)
+        self.projector = devices.BL_Projector.from_bl_obj(settings.projector)
+
+    # Whether multiplexed frames can be composed, they are separated with the crosstalk matrix
+    MULTIPLEXING = False
+
+    @property
+    def basis_dir(self):
+        return self.output_dir / ".basis"
+
+    def check(self):
+        if not self.MULTIPLEXING and self.scene.fp_stereo.fringes_manager.multiplexing:
+            raise ValueError(f"{self.MODE} rendering does not support multiplexed fringes")
+
+        if 1 < len(self.cameras):
+            raise ValueError(f"{self.MODE} rendering does not support multi-view rigs, use FULL")
+
+        if self.sample_mode != "FIXED":
+            raise ValueError(f"{self.MODE} rendering does not support noise targets or time budgets, use FULL")
+
+    def load_basis(self, path):
+        image = images.LoadImage(path)
+        if not self.keep_basis: path.unlink()
+
+        return image
+
+    def level_values(self, params):
+        # Level of a frame (see sweep.SweepLevels), missing values are taken from the scene. A multiplexed
+        # output is a single projector channel, demultiplexing is linear so it is composed with the
+        # intensity of its own channel
+        channel = self.projector.settings.channels_list[params.get("channel") or 0]
+        energy = self.projector.bl_obj.data.energy
+
+        def value(key, default):
+            return default if params.get(key) is None else params[key]
+
+        return {
+            "intensity" : value("intensity", channel.intensity),
+            "energy_scale" : value("energy", energy) / energy if energy else 1.0,
+            "exposure" : value("exposure", self.scene.view_settings.exposure),
+            "ambient_scale" : value("ambient", 1.0),
+        }
+
+    def save_frame(self, params, image):
+        path = self.frame_path(params)
+        images.SaveImage(path, image, bit_depth=self.camera.settings.bit_depth, channels=self.camera.channels)
+
+        self.manifest.record(params, path)
+
+        return dict(params, file=path.name)
+
+    def render(self, frames, callback=None):
+        self.preflight()
+        self.check()
+
+        frames = self.output_frames(frames)
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.basis_dir.mkdir(exist_ok=True)
+
+        completed = self.manifest.load() if self.resume else {}
+        self.resumed = set()
+
+        entries = {}
+        def finish(entry):
+            entries[FrameName(entry)] = entry
+            if callback is not None: callback(entry)
+
+        todo = []
+        for params in frames:
+            if self.is_complete(params, completed):
+                self.resumed.add(FrameName(params))
+                finish(dict(params, file=completed[FrameName(params)]["file"]))
+            else: todo.append(params)
+
+        self.start_monitor()
+
+        # Lazily, so poses skipped by the monitor are not rendered
+        groups = ((key, group) for key, group in GroupBy(todo, self.group_key) if not self.is_skipped(group[0]))
+        self.render_groups(groups, lambda entry: finish(self.observe(entry)))
+
+        self.finish_monitor()
+
+        if not self.keep_basis and not any(self.basis_dir.iterdir()): self.basis_dir.rmdir()
+
+        # Frames of skipped poses are left out
+        return [entries[FrameName(params)] for params in frames if FrameName(params) in entries]
+
+class BasisRenderDriver(SynthesisRenderDriver):
+    MODE = "BASIS"
+
+    def check(self):
+        super().check()
+
+        channel = self.projector.settings.channels_list[0]
+
+        if channel.fringes_type != "Sinusoidal":
+            raise ValueError("Phase basis rendering only supports sinusoidal fringes")
+
+        if any(0.0 < channel.noise for channel in self.projector.settings.channels_list):
+            raise ValueError("Phase basis rendering needs projector noise to be 0")
+
+    def group_key(self, params):
+        return params["pose"]
+
+    def render(self, frames, callback=None):
+        # The basis renders mix the projector and ambient light at the scene values
+        if any(params.get("level") is not None for params in frames):
+            raise ValueError("Phase basis rendering does not support level sweeps, use LINEAR")
+
+        return super().render(frames, callback)
+
+    def render_pattern(self, params, name, stripe_count, phase, rotation):
+        # Board pose comes from the animation, projector values are set directly
+        with MuteAnimation(self.projector.bl_obj.data):
+            self.scene.frame_set(params["frame"])
+
+            channel = self.projector.settings.channels_list[0]
+            channel.stripe_count = stripe_count
+            channel.phase = phase
+            channel.rotation = rotation
+
+            path = self.basis_dir / f"{name}.exr"
+            with ImageFormat(self.scene):
+                self.render_still(path)
+
+        # Float renders skip the view transform
+        return self.load_basis(path) * 2.0 ** self.scene.view_settings.exposure
+
+    def render_groups(self, groups, finish):
+        for pose, todo in groups:
+            dc = self.render_pattern(todo[0], f"pose{pose}_dc", 0.0, np.pi / 2.0, 0.0)
+
+            for (rotation, stripe_count), group in GroupBy(todo, lambda f: (f["rotation"], f["stripe_count"])):
+                name = f"pose{pose}_r{rotation:.4f}_s{stripe_count:.4f}"
+
+                cos = self.render_pattern(group[0], f"{name}_cos", stripe_count, 0.0, rotation)
+                sin = self.render_pattern(group[0], f"{name}_sin", stripe_count, np.pi / 2.0, rotation)
+
+                for params in group:
+                    finish(self.save_frame(params, SynthesisePhase(dc, cos, sin, params["phase"])))
+
+# Linear light transport
+# The image is the sum of the projector and the ambient (every other light and the world) contributions,
+# each linear in its emission. Both are rendered once per timeline frame as Cycles light group passes,
+# with the projector channels at unit intensity, then every level of the frame is composed as
+#   2^exposure * (intensity * energy / energy_0 * P + ambient * A)
+# and clipped / quantised when saved. Projector noise is added before the intensity clamp in the
+# shader so it has to be 0.
+
+PROJECTOR_GROUP = "Projector"
+AMBIENT_GROUP = "Ambient"
+
+class LinearRenderDriver(SynthesisRenderDriver):
+    MODE = "LINEAR"
+    MULTIPLEXING = True
+
+    def check(self):
+        super().check()
+
+        if any(0.0 < channel.noise for channel in self.projector.settings.channels_list):
+            raise ValueError("Linear light transport rendering needs projector noise to be 0")
+
+    def group_key(self, params):
+        return params["frame"]
+
+    def light_groups(self):
+        return {PROJECTOR_GROUP : [self.projector.bl_obj]}
+
+    def projector_image(self, params, components):
+        return components[PROJECTOR_GROUP]
+
+    def render_components(self, frame):
+        scene = self.scene
+        scene.frame_set(frame)
+
+        groups = self.light_groups()
+
+        lights = {bl_obj for bl_objs in groups.values() for bl_obj in bl_objs}
+        groups[AMBIENT_GROUP] = [bl_obj for bl_obj in scene.objects if bl_obj not in lights]
+
+        passes = {name : PassName(name) for name in groups}
+
+        # Every projector is rendered at unit intensity
+        channels = [channel for bl_obj in lights if devices.BL_Projector.is_projector(bl_obj) for channel in bl_obj.data.sfdi.channels_list]
+        intensities = [channel.intensity for channel in channels]
+
+        try:
+            for channel in channels: channel.intensity = 1.0
+
+            with LightGroups(scene, groups, world=AMBIENT_GROUP):
+                with PassOutputs(scene, list(passes.values()), self.basis_dir / f"frame{frame:05d}") as outputs:
+                    bpy.ops.render.render(scene=scene.name)
+
+            components = {name : self.load_basis(outputs.path(pass_name)) for name, pass_name in passes.items()}
+        finally:
+            for channel, intensity in zip(channels, intensities): channel.intensity = intensity
+
+        if not self.keep_basis: outputs.directory.rmdir()
+
+        return components
+
+    def render_groups(self, groups, finish):
+        for frame, todo in groups:
+            components = self.render_components(frame)
+
+            for params in todo:
+                image = ComposeLevel(self.projector_image(params, components), components[AMBIENT_GROUP], **self.level_values(params))
+
+                if params.get("channel") is not None:
+                    image = images.Demultiplex(image, self.crosstalk)[..., params["channel"]]
+
+                finish(self.save_frame(params, image))
+
+# Multiple projectors
+# Every projector has its own light group (see BL_Projector.set_lightgroup), so a single render gives
+# the contribution of each of them. One output is written per projector, lit by that projector and
+# the ambient light only. Levels scale every projector the same way as the sweep projector.
+
+class ProjectorsRenderDriver(LinearRenderDriver):
+    MODE = "PROJECTORS"
+
+    def __init__(self, scene, **kwargs):
+        super().__init__(scene, **kwargs)
+
+        self.projectors = devices.BL_Projector.rig_projectors(scene)
+
+    def check(self):
+        super().check()
+
+        for projector in self.projectors:
+            if any(0.0 < channel.noise for channel in projector.settings.channels_list):
+                raise ValueError(f"Projector '{projector.bl_obj.name}' needs a noise of 0 for linear light transport rendering")
+
+    def output_frames(self, frames):
+        return [
+            dict(params, projector=i, projector_name=projector.bl_obj.name)
+            for params in frames for i, projector in enumerate(self.projectors)
+        ]
+
+    def light_groups(self):
+        return {projector.lightgroup : [projector.bl_obj] for projector in self.projectors}
+
+    def projector_image(self, params, components):
+        return components[self.projectors[params["projector"]].lightgroup]
+
+# Geometry synthesis
+# With direct illumination the camera sees albedo x shading x visibility x pattern(projector coordinate).
+# One render per pose with a constant pattern of ones gives everything but the pattern in the projector
+# light group pass, and the Position pass gives the projector coordinate of every pixel through the same
+# x/z, y/z mapping as the projector shader. Every fringe frame, binary included, is then composed in NumPy.
+# Indirect light, anti-aliased edges and the projector noise (a different white noise) are approximated,
+# so use one of the other modes for final datasets.
+
+def ProjectorCoords(positions, projector):
+    # Mirrors BL_Projector.__generate_shader: light space direction -> (x/z, y/z) -> Mapping node
+    matrix = np.array(projector.bl_obj.matrix_world)
+
+    # The texture coordinate normal is taken to light space with the transposed object matrix
+    directions = (positions - matrix[:3, 3]) @ matrix[:3, :3]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        coords = np.stack([
+            directions[..., 0] / directions[..., 2],
+            directions[..., 1] / directions[..., 2],
+            np.zeros(directions.shape[:-1], dtype=directions.dtype),
+        ], axis=-1)
+
+    mapping = projector.bl_obj.data.node_tree.nodes["Mapping"]
+    location, rotation, scale = (np.array(mapping.inputs[i].default_value) for i in (1, 2, 3))
+
+    coords = (coords * scale) @ np.array(mathutils.Euler(rotation).to_matrix()).T + location
+
+    return coords[..., 0], coords[..., 1]
+
+class GeometryRenderDriver(SynthesisRenderDriver):
+    MODE = "GEOMETRY"
+
+    CHANNEL_VALUES = {"intensity" : 1.0, "stripe_count" : 0.0, "phase" : 0.0, "noise" : 0.0}
+
+    def group_key(self, params):
+        return params["pose"]
+
+    @property
+    def channel_count(self):
+        switch = self.projector.bl_obj.data.node_tree.nodes["Channels Switch"]
+
+        return 3 if switch.inputs[0].default_value == "RGB" else 1
+
+    def render_components(self, frame):
+        scene = self.scene
+        channels = self.projector.settings.channels_list
+
+        bl_objs = [bl_obj for bl_obj in scene.objects if bl_obj != self.projector.bl_obj]
+        groups = {PROJECTOR_GROUP : [self.projector.bl_obj], AMBIENT_GROUP : bl_objs}
+        passes = [PassName(PROJECTOR_GROUP), PassName(AMBIENT_GROUP), "Position"]
+
+        saved = [{key : getattr(channel, key) for key in self.CHANNEL_VALUES} for channel in channels]
+
+        try:
+            with MuteAnimation(self.projector.bl_obj.data):
+                scene.frame_set(frame)
+
+                # Constant pattern of ones, cos(0) with no stripes
+                for channel in channels:
+                    for key, value in self.CHANNEL_VALUES.items(): setattr(channel, key, value)
+
+                with LightGroups(scene, groups, world=AMBIENT_GROUP), ViewLayerPasses(scene, ["position"]):
+                    with PassOutputs(scene, passes, self.basis_dir / f"frame{frame:05d}") as outputs:
+                        bpy.ops.render.render(scene=scene.name)
+
+                # Projector pose of the rendered frame
+                projector, ambient, positions = (self.load_basis(outputs.path(name)) for name in passes)
+                coords = ProjectorCoords(positions, self.projector)
+        finally:
+            for channel, values in zip(channels, saved):
+                for key, value in values.items(): setattr(channel, key, value)
+
+        if not self.keep_basis: outputs.directory.rmdir()
+
+        return projector, ambient, coords
+
+    def pattern(self, params, coords, intensity):
+        x, y = coords
+        channels = self.projector.settings.channels_list
+        rng = np.random.default_rng(params["frame"])
+
+        patterns = []
+        for i in range(self.channel_count):
+            channel = channels[i]
+
+            # The first channel is keyframed by the sweep
+            values = {"stripe_count" : channel.stripe_count, "phase" : channel.phase, "rotation" : channel.rotation, "intensity" : channel.intensity}
+            if i == 0: values.update(stripe_count=params["stripe_count"], phase=params["phase"], rotation=params["rotation"], intensity=intensity)
+
+            patterns.append(FringePattern(x, y, fringes_type=channel.fringes_type, noise=channel.noise, rng=rng, **values))
+
+        return np.stack(patterns * (3 // len(patterns)), axis=-1)
+
+    def render_groups(self, groups, finish):
+        for pose, todo in groups:
+            projector, ambient, coords = self.render_components(todo[0]["frame"])
+
+            for params in todo:
+                levels = self.level_values(params)
+                pattern = self.pattern(params, coords, levels.pop("intensity"))
+
+                finish(self.save_frame(params, ComposeLevel(projector * pattern, ambient, **levels)))
@@ -1,7 +1,8 @@
 import bpy
 from bpy.types import Panel, Menu
 
-from . import operators, devices
+from . import operators, devices, renderqueue
+from .estimate import FormatDuration
 
 # Stereo Fringe Projection
 
@@ -16,6 +17,38 @@ class UI_FPStereo(Panel):
 
     bl_options = {'DEFAULT_CLOSED'}
 
+    def _draw_render_queue(self, layout):
+        queue = renderqueue.QUEUE
+
+        header, panel = layout.panel("FPStereoRenderQueue", default_closed=False)
+        header.label(text=f"Render Queue ({len(queue.jobs)})")
+        header.operator(operators.fringe_projection.OP_EnqueueRender.bl_idname, text="Queue Render")
+        if not panel: return
+
+        for job in queue.jobs:
+            box = panel.box()
+
+            row = box.row()
+            row.label(text=job.name)
+
+            if job.is_active:
+                icon = 'PLAY' if job.status == renderqueue.PAUSED else 'PAUSE'
+                row.operator(operators.fringe_projection.OP_PauseRender.bl_idname, text="", icon=icon).job_id = job.job_id
+
+            if job.status in (renderqueue.PENDING, renderqueue.RUNNING, renderqueue.PAUSED):
+                row.operator(operators.fringe_projection.OP_CancelRender.bl_idname, text="", icon='X').job_id = job.job_id
+
+            box.progress(factor=job.progress, type='BAR', text=f"{job.status.capitalize()}: {job.done} / {job.total}")
+
+            if job.is_active:
+                eta = FormatDuration(job.eta) if job.eta is not None else "--"
+                box.label(text=f"{job.throughput:.1f} frames/min, {eta} left")
+            elif job.status == renderqueue.FAILED:
+                box.label(text=job.message, icon='ERROR')
+
+        if any(not job.is_active and job.status != renderqueue.PENDING for job in queue.jobs):
+            panel.operator(operators.fringe_projection.OP_ClearRenderQueue.bl_idname)
+
     def _draw_fringes_manager(self, settings, layout):
         fringes_manager = settings.fringes_manager
 
@@ -28,6 +61,10 @@ class UI_FPStereo(Panel):
                 row.enabled = 1 < projector.channels
                 row.prop(fringes_manager, "multiplexing")
 
+                if row.enabled and fringes_manager.multiplexing:
+                    row.prop(fringes_manager, "multiplex_mode", text="")
+                    panel.prop(fringes_manager, "crosstalk")
+
             # Stripe Counts
             box = panel.box()
             row = box.row()
@@ -88,6 +125,18 @@ class UI_FPStereo(Panel):
 
         # Camera & characterisation board
         layout.prop(settings, "camera", text="Camera")
+
+        # Additional views of a multi-view rig
+        box = layout.box()
+        row = box.row()
+        row.label(text="Additional Cameras")
+        row.operator(operators.fringe_projection.OP_AddRigCamera.bl_idname, text="+")
+
+        for i, item in enumerate(settings.cameras):
+            row = box.row()
+            row.prop(item, "camera", text="")
+            row.operator(operators.fringe_projection.OP_RemoveRigCamera.bl_idname, text="-").camera_id = i
+
         layout.prop(settings, "char_board", text="Characterisation Board")
         layout.prop(settings, "projector", text="Projector")
 
@@ -95,10 +144,52 @@ class UI_FPStereo(Panel):
         row = layout.row()
         row.operator(operators.fringe_projection.OP_CreateAnimation.bl_idname, text="Animate")
         row.operator(operators.fringe_projection.OP_SaveMetadata.bl_idname, text="Save Metadata")
+        row.operator(operators.fringe_projection.OP_EstimateRender.bl_idname, text="Estimate")
+
+        layout.prop(settings, "render_mode")
+        layout.prop(settings, "culling")
+        layout.prop(settings, "preflight")
+
+        # Probe renders which tune the energy or exposure
+        box = layout.box()
+        row = box.row()
+        row.prop(settings.auto_exposure, "mode")
+        row.operator(operators.fringe_projection.OP_AutoExposure.bl_idname, text="Tune")
+        if settings.auto_exposure.mode != "OFF":
+            row = box.row()
+            row.prop(settings.auto_exposure, "target")
+            row.prop(settings.auto_exposure, "percentile")
+            row = box.row()
+            row.prop(settings.auto_exposure, "probe_scale")
+            row.prop(settings.auto_exposure, "probe_samples")
+            if settings.auto_exposure.tuned: box.label(text=f"Tuned value: {settings.auto_exposure.value:.4g}")
+
+        # Image sanity monitor
+        box = layout.box()
+        box.prop(settings.monitor, "enabled")
+        if settings.monitor.enabled:
+            box.prop(settings.monitor, "action")
+            box.prop(settings.monitor, "patience")
+            row = box.row()
+            row.prop(settings.monitor, "max_saturated")
+            row.prop(settings.monitor, "min_mean")
+            row = box.row()
+            row.prop(settings.monitor, "min_modulation")
+            row.prop(settings.monitor, "min_board")
+
+        layout.prop(settings, "crop")
+        if settings.crop:
+            layout.prop(settings, "crop_target")
+            row = layout.row()
+            row.prop(settings, "crop_padding")
+            row.prop(settings, "crop_fill", text="")
 
         # Fringe manager
         self._draw_fringes_manager(settings, layout)
 
+        # Background renders
+        self._draw_render_queue(layout)
+
 
 # Add SFDI Objects Menu
 
@@ -180,6 +271,11 @@ class PROJECTOR_PT_Settings(Panel):
             panel.prop(projector.settings, 'throw_ratio')
             panel.prop(projector.settings, 'light_falloff')
 
+            panel.prop(projector.settings, 'measured')
+            row = panel.row()
+            row.enabled = projector.settings.measured is not None
+            row.prop(projector.settings, 'shadow_linking')
+
         # Channel-specific settings
         header, panel = layout.panel("Channels", default_closed=True)
         header.label(text=f"Channel Properties")
@@ -256,6 +352,11 @@ class CAMERA_PT_Settings(Panel):
         if panel:
             box = layout.box()
             box.prop(camera.settings, 'render_samples')
+            box.prop(camera.settings, 'sample_mode')
+            if camera.settings.sample_mode == "NOISE": box.prop(camera.settings, 'noise_target')
+            if camera.settings.sample_mode == "TIME": box.prop(camera.settings, 'time_budget')
+            if camera.settings.sample_mode != "FIXED": box.prop(camera.settings, 'min_samples')
+            box.prop(camera.settings, 'render_profile')
             box.prop(camera.settings, 'bit_depth')
             box.prop(camera.settings, 'file_format')
 
@@ -11,7 +11,52 @@ def DeleteAllKeyframes(scene):
                 
     scene.animation_data_clear()
 
+class MuteAnimation:
+    # Temporarily unassign the actions of the given IDs so their properties can be set directly
+    def __init__(self, *bl_ids):
+        self._bl_ids = bl_ids
+        self._saved = []
+
+    def __enter__(self):
+        for bl_id in self._bl_ids:
+            anim = bl_id.animation_data
+            if anim is None or anim.action is None: continue
+
+            self._saved.append((anim, anim.action, anim.action_slot))
+            anim.action = None
+
+        return self
+
+    def __exit__(self, *args):
+        for anim, action, slot in self._saved:
+            anim.action = action
+            anim.action_slot = slot
+
+        self._saved.clear()
+
+class HideFromRender:
+    # Temporarily hide objects from the render
+    def __init__(self, *bl_objs):
+        self._bl_objs = bl_objs
+        self._saved = []
+
+    def __enter__(self):
+        for bl_obj in self._bl_objs:
+            self._saved.append((bl_obj, bl_obj.hide_render))
+            bl_obj.hide_render = True
+
+        return self
+
+    def __exit__(self, *args):
+        for bl_obj, hide_render in self._saved:
+            bl_obj.hide_render = hide_render
+
+        self._saved.clear()
+
 def AddDriver(to_drive, using, prop, data_path, index=-1, func=''):
+    # Replaces any existing driver
+    to_drive.driver_remove(prop, index)
+
     if index != -1: d = to_drive.driver_add(prop, index).driver
     else: d = to_drive.driver_add(prop).driver
 
@@ -22,6 +67,21 @@ def AddDriver(to_drive, using, prop, data_path, index=-1, func=''):
 
     d.expression = f"{func}({v.name})" if func else v.name
 
+def AddExpressionDriver(to_drive, using, prop, variables, expression, index=-1):
+    # Driver over several properties of the same ID, variables maps names to data paths
+    to_drive.driver_remove(prop, index)
+
+    if index != -1: d = to_drive.driver_add(prop, index).driver
+    else: d = to_drive.driver_add(prop).driver
+
+    for name, data_path in variables.items():
+        v = d.variables.new()
+        v.name = name
+        v.targets[0].id = using
+        v.targets[0].data_path = data_path
+
+    d.expression = expression
+
 def ResetDeltaTransform(bl_obj):
     bl_obj.delta_location = (0.0, 0.0, 0.0)
     bl_obj.delta_rotation_euler = (0.0, 0.0, 0.0)
@@ -64,4 +124,4 @@ def HeightmapToMesh(heightmap, name="Heightmap"):
 
 def HideObjects(bl_obj_ptrs, value):
     for bl_obj in bl_obj_ptrs:
-        bl_obj.obj.hide_render = value
\ No newline at end of file
+        bl_obj.hide_render = value
@@ -0,0 +1,203 @@
+import sys
+import json
+import socket
+import argparse
+
+from pathlib import Path
+
+import bpy
+
+if __name__ == "__main__" and not __package__:
+    # Run as a script through "blender -b -P blender_sfdi/worker.py", so make the package importable
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    import blender_sfdi
+    __package__ = "blender_sfdi"
+
+from . import batch, sweep
+
+# Warm render worker
+# Loads the rig once and keeps Blender (and Cycles persistent data) alive between jobs.
+# Jobs are newline delimited JSON over a Unix socket ("unix:/tmp/sfdi.sock") or localhost TCP ("127.0.0.1:5555").
+#
+#   python -m blender_sfdi.worker serve job.json --listen 127.0.0.1:5555
+#   python -m blender_sfdi.worker submit --address 127.0.0.1:5555 --frames 0:99
+#
+# Requests:
+#   {"frames": "0:99"} or {"frames": [0, 5, 9]}     render frames of the current sweep
+#   {"job": {...}}                                  apply a (partial) job spec, rebuild the sweep, then render it
+#   {"cmd": "ping"} / {"cmd": "shutdown"}
+#
+# Every request is answered with a stream of events, ending with "done" or "error":
+#   {"event": "frame", "frame": 3, "path": "..."}
+#   {"event": "done", "count": 100}
+
+def ParseAddress(address):
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[len("unix:"):]
+
+    host, _, port = address.rpartition(":")
+
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+def Connect(address):
+    family, addr = ParseAddress(address)
+
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.connect(addr)
+
+    return sock
+
+def SubmitJob(address, request):
+    # Yields the events streamed back by the worker
+    with Connect(address) as sock:
+        sock.sendall((json.dumps(request) + "\n").encode())
+
+        with sock.makefile("r") as stream:
+            for line in stream:
+                event = json.loads(line)
+                yield event
+
+                if event["event"] in ("done", "error"): return
+
+class ClientDisconnected(Exception):
+    # Raised by send when the client has gone away
+    pass
+
+class RenderWorker:
+    def __init__(self, job, blend=None):
+        self.job = job
+
+        self.scene = batch.PrepareScene(job, blend=blend)
+        self.scene.render.use_persistent_data = True
+
+        self.frames = batch.JobFrames(self.scene, job)
+
+    def _apply(self, job):
+        # Relative paths are resolved against the job the worker was started with
+        job.setdefault("_root", self.job.get("_root", "."))
+
+        batch.ApplyJob(self.scene, job)
+        bpy.ops.op.fp_createanimation()
+
+        self.frames = batch.JobFrames(self.scene, dict(self.job, **job))
+
+    def _select(self, frames):
+        if frames is None: return self.frames
+
+        if isinstance(frames, str): return sweep.SelectFrames(self.frames, frames)
+
+        frames = set(frames)
+        return [f for f in self.frames if f["frame"] in frames]
+
+    def handle(self, request, send):
+        cmd = request.get("cmd", "render")
+
+        if cmd == "ping":
+            send({"event": "done", "count": 0})
+            return True
+
+        if cmd == "shutdown":
+            send({"event": "done", "count": 0})
+            return False
+
+        if "job" in request: self._apply(request["job"])
+
+        driver = batch.CreateDriver(self.scene, dict(self.job, **request.get("job", {})), output_dir=request.get("output"))
+        frames = self._select(request.get("frames"))
+
+        def progress(entry):
+            send({"event": "frame", "frame": entry["frame"], "name": sweep.FrameName(entry), "path": str(driver.output_dir / entry["file"])})
+
+        rendered = driver.render(frames, callback=progress)
+
+        if request.get("metadata", self.scene.fp_stereo.metadata):
+            driver.write_metadata(rendered)
+
+        send({"event": "done", "count": len(rendered)})
+
+        return True
+
+    def serve(self, address):
+        family, addr = ParseAddress(address)
+
+        if family == socket.AF_UNIX: Path(addr).unlink(missing_ok=True)
+
+        with socket.socket(family, socket.SOCK_STREAM) as server:
+            server.bind(addr)
+            server.listen()
+
+            print(f"Worker listening on {address}", flush=True)
+
+            running = True
+            while running:
+                conn, _ = server.accept()
+
+                with conn, conn.makefile("r") as stream:
+                    def send(event):
+                        try:
+                            conn.sendall((json.dumps(event) + "\n").encode())
+                        except OSError as e:
+                            raise ClientDisconnected(str(e)) from e
+
+                    try:
+                        for line in stream:
+                            if not line.strip(): continue
+
+                            try:
+                                running = self.handle(json.loads(line), send)
+                            except ClientDisconnected:
+                                raise
+                            except Exception as e:
+                                # Only reported while the client is still there
+                                send({"event": "error", "message": str(e)})
+
+                            if not running: break
+                    except (ClientDisconnected, ConnectionError) as e:
+                        # The client went away (e.g. mid-render), the rig stays loaded for the next one
+                        print(f"Client disconnected: {e}", flush=True)
+
+        if family == socket.AF_UNIX: Path(addr).unlink(missing_ok=True)
+
+def ParseArgs(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(prog="blender_sfdi.worker", description="Warm render worker")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    serve = subparsers.add_parser("serve", help="Load a rig and wait for render jobs")
+    serve.add_argument("job", help="Job spec (.json or .toml) describing the rig")
+    serve.add_argument("--blend", default=None, help="Rig .blend file, overrides the job spec")
+    serve.add_argument("--listen", default="127.0.0.1:5555", help="host:port or unix:/path/to/socket")
+
+    submit = subparsers.add_parser("submit", help="Send a render job to a running worker")
+    submit.add_argument("--address", default="127.0.0.1:5555", help="host:port or unix:/path/to/socket")
+    submit.add_argument("--frames", default=None, help="Inclusive frame range to render, e.g. 0:99")
+    submit.add_argument("--job", default=None, help="Job spec (.json or .toml) to apply before rendering")
+    submit.add_argument("--output", default=None, help="Output directory")
+    submit.add_argument("--shutdown", action="store_true", help="Stop the worker")
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = ParseArgs(argv)
+
+    if args.command == "serve":
+        worker = RenderWorker(batch.LoadJob(args.job), blend=args.blend)
+        worker.serve(args.listen)
+        return 0
+
+    if args.shutdown: request = {"cmd": "shutdown"}
+    else:
+        request = {"frames": args.frames, "output": args.output}
+        if args.job: request["job"] = batch.LoadJob(args.job)
+
+    for event in SubmitJob(args.address, request):
+        print(json.dumps(event), flush=True)
+
+        if event["event"] == "error": return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import argparse
+import threading
+
+from pathlib import Path
+
+import bpy
+
+if __name__ == "__main__" and not __package__:
+    # Run as a script through "blender -b -P blender_sfdi/workqueue.py", so make the package importable
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    import blender_sfdi
+    __package__ = "blender_sfdi"
+
+from . import batch, render, sweep
+from .metadata import GenerateMetadata, SplitViews
+from .monitor import MonitorAbort
+
+# File-lease work queue
+# Spreads a sweep across render nodes sharing a filesystem (e.g. NFS) without a scheduler.
+#
+#   python -m blender_sfdi.workqueue create job.json /shared/queue --unit-size 50
+#   python -m blender_sfdi.workqueue work /shared/queue          (on every node, as many as wanted)
+#   python -m blender_sfdi.workqueue status /shared/queue
+#
+# Layout of the queue directory:
+#   queue.json              job spec path, .blend, output directory and the tuned auto exposure
+#   units/<unit>.json       frames of each work unit
+#   leases/<unit>.lease     held by the worker rendering the unit, kept fresh by touching it
+#   done/<unit>.json        rendered frames of a completed unit
+#
+# Leases are taken with link(), which is atomic on NFS, and times are compared against the
+# file server clock so nodes with skewed clocks agree on when a lease has expired.
+
+DEFAULT_LEASE = 300.0
+
+def _write_json(filepath, data):
+    # Write then rename so readers never see partial files
+    tmp = filepath.with_name(f".{filepath.name}.{uuid.uuid4().hex}")
+
+    with open(tmp, 'w') as json_file:
+        json.dump(data, json_file, indent=2)
+
+    os.replace(tmp, filepath)
+
+def _read_json(filepath):
+    with open(filepath, "r") as json_file:
+        return json.load(json_file)
+
+class WorkQueue:
+    def __init__(self, queue_dir):
+        self.queue_dir = Path(queue_dir)
+
+    @property
+    def units_dir(self):
+        return self.queue_dir / "units"
+
+    @property
+    def leases_dir(self):
+        return self.queue_dir / "leases"
+
+    @property
+    def done_dir(self):
+        return self.queue_dir / "done"
+
+    @property
+    def info(self):
+        return _read_json(self.queue_dir / "queue.json")
+
+    @staticmethod
+    def create(queue_dir, job_path, frames, output_dir, unit_size=50, blend=None, tuned_exposure=None):
+        queue = WorkQueue(queue_dir)
+
+        for d in (queue.units_dir, queue.leases_dir, queue.done_dir):
+            d.mkdir(parents=True, exist_ok=True)
+
+        _write_json(queue.queue_dir / "queue.json", {
+            "job" : str(Path(job_path).resolve()),
+            "blend" : str(Path(blend).resolve()) if blend else None,
+            "output" : str(output_dir),
+            # Tuned once here, so every node renders with the same value
+            "exposure" : list(tuned_exposure) if tuned_exposure is not None else None,
+        })
+
+        for i, unit in enumerate(sweep.ChunkFrames(frames, unit_size)):
+            _write_json(queue.units_dir / f"unit_{i:05d}.json", unit)
+
+        return queue
+
+    def units(self):
+        return sorted(p.stem for p in self.units_dir.glob("unit_*.json"))
+
+    def is_done(self, unit):
+        return (self.done_dir / f"{unit}.json").exists()
+
+    def lease_path(self, unit):
+        return self.leases_dir / f"{unit}.lease"
+
+    def now(self):
+        # Current time on the file server
+        clock = self.queue_dir / ".clock"
+        clock.touch()
+        os.utime(clock)
+
+        return clock.stat().st_mtime
+
+    def steal(self, unit, lease_time):
+        # Removes an expired lease by renaming it away, only one worker can win the rename. Another
+        # worker may have stolen it and linked a fresh lease, or the owner renewed it, since it was
+        # found expired, so the renamed lease is checked and put back when it is not the one seen
+        lease = self.lease_path(unit)
+
+        try:
+            seen = (lease.read_text(), lease.stat().st_mtime)
+        except FileNotFoundError:
+            return
+
+        if self.now() - seen[1] <= lease_time: return
+
+        stale = lease.with_name(f"{lease.name}.expired.{uuid.uuid4().hex}")
+
+        try:
+            os.rename(lease, stale)
+        except FileNotFoundError:
+            return
+
+        if (stale.read_text(), stale.stat().st_mtime) != seen:
+            try:
+                os.link(stale, lease)
+            except FileExistsError:
+                pass
+
+        stale.unlink()
+
+    def claim(self, unit, lease_time):
+        lease = self.lease_path(unit)
+        self.steal(unit, lease_time)
+
+        token = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+
+        tmp = lease.with_name(f".{lease.name}.{uuid.uuid4().hex}")
+        tmp.write_text(token)
+
+        try:
+            os.link(tmp, lease)
+        except FileExistsError:
+            pass
+
+        # NFS may report a failed link which actually succeeded, so check the link count
+        claimed = tmp.stat().st_nlink == 2
+        tmp.unlink()
+
+        if not claimed: return None
+
+        # The unit could have completed since we last looked
+        if self.is_done(unit):
+            self.release(unit, token)
+            return None
+
+        return Lease(self, unit, token, lease_time)
+
+    def owns(self, unit, token):
+        try:
+            return self.lease_path(unit).read_text() == token
+        except FileNotFoundError:
+            return False
+
+    def release(self, unit, token):
+        if self.owns(unit, token): self.lease_path(unit).unlink(missing_ok=True)
+
+    def complete(self, unit, rendered):
+        _write_json(self.done_dir / f"{unit}.json", rendered)
+
+    def next_unit(self, lease_time):
+        for unit in self.units():
+            if self.is_done(unit): continue
+
+            lease = self.claim(unit, lease_time)
+            if lease is not None: return lease
+
+        return None
+
+    def status(self):
+        units = self.units()
+        done = [u for u in units if self.is_done(u)]
+        leased = [u for u in units if u not in done and self.lease_path(u).exists()]
+
+        return {"units" : len(units), "done" : len(done), "leased" : len(leased), "pending" : len(units) - len(done) - len(leased)}
+
+    def merge(self, metadata, filename="metadata.json"):
+        frames = []
+        for unit in self.units():
+            if self.is_done(unit): frames += _read_json(self.done_dir / f"{unit}.json")
+
+        metadata = SplitViews(dict(metadata, frames=sorted(frames, key=sweep.FrameName)))
+
+        filepath = Path(self.info["output"]) / filename
+        _write_json(filepath, metadata)
+
+        return filepath
+
+class Lease:
+    def __init__(self, queue, unit, token, lease_time):
+        self.queue = queue
+        self.unit = unit
+        self.token = token
+        self.lease_time = lease_time
+
+        self.lost = False
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._renew, daemon=True)
+
+    def _renew(self):
+        while not self._stop.wait(self.lease_time / 3.0):
+            if not self.queue.owns(self.unit, self.token):
+                self.lost = True
+                return
+
+            os.utime(self.queue.lease_path(self.unit))
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+
+        self.queue.release(self.unit, self.token)
+
+def Work(queue, lease_time=DEFAULT_LEASE, threads=None, poll=10.0):
+    info = queue.info
+
+    job = batch.LoadJob(info["job"])
+    scene = batch.PrepareScene(job, blend=info["blend"], tuned_exposure=info.get("exposure"))
+
+    render.SetThreads(scene, threads if threads is not None else job.get("render", {}).get("threads"))
+
+    driver = batch.CreateDriver(scene, job, output_dir=info["output"])
+
+    while True:
+        lease = queue.next_unit(lease_time)
+
+        if lease is None:
+            status = queue.status()
+            if status["done"] == status["units"]: break
+
+            # Other workers hold the remaining units, wait in case their leases expire
+            time.sleep(poll)
+            continue
+
+        with lease:
+            frames = _read_json(queue.units_dir / f"{lease.unit}.json")
+            print(f"Rendering {lease.unit} ({len(frames)} frames)", flush=True)
+
+            rendered = driver.render(frames)
+
+            if lease.lost: print(f"Lost lease on {lease.unit}, another worker has taken it over", flush=True)
+            else: queue.complete(lease.unit, rendered)
+
+    if scene.fp_stereo.metadata:
+        queue.merge(GenerateMetadata(scene))
+
+def ParseArgs(argv=None):
+    if argv is None:
+        argv = sys.argv[sys.argv.index("--") + 1:] if "--" in sys.argv else sys.argv[1:]
+
+    parser = argparse.ArgumentParser(prog="blender_sfdi.workqueue", description="Shared filesystem render queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    create = subparsers.add_parser("create", help="Split a job into work units")
+    create.add_argument("job", help="Job spec (.json or .toml)")
+    create.add_argument("queue", help="Queue directory on the shared filesystem")
+    create.add_argument("--blend", default=None, help="Rig .blend file, overrides the job spec")
+    create.add_argument("--unit-size", type=int, default=50, help="Timeline frames per work unit")
+    create.add_argument("--frames", default=None, help="Inclusive frame range to render, e.g. 0:99")
+
+    work = subparsers.add_parser("work", help="Render work units until the queue is empty")
+    work.add_argument("queue", help="Queue directory on the shared filesystem")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE, help="Seconds before an unrenewed lease can be reclaimed")
+    work.add_argument("--threads", type=int, default=None, help="Render threads, 0 for automatic")
+
+    status = subparsers.add_parser("status", help="Show queue progress")
+    status.add_argument("queue", help="Queue directory on the shared filesystem")
+
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = ParseArgs(argv)
+
+    if args.command == "create":
+        job = batch.LoadJob(args.job)
+        scene = batch.PrepareScene(job, blend=args.blend)
+
+        frames = batch.JobFrames(scene, job, args.frames)
+        blend = args.blend or (bpy.data.filepath or None)
+
+        output_dir = render.RenderDriver(scene).output_dir
+        batch.WritePlan(scene, frames, output_dir)
+
+        queue = WorkQueue.create(args.queue, args.job, frames, output_dir, unit_size=args.unit_size, blend=blend, tuned_exposure=batch.TunedExposure(scene))
+        print(json.dumps(queue.status()))
+
+    elif args.command == "work":
+        try:
+            Work(WorkQueue(args.queue), lease_time=args.lease, threads=args.threads)
+        except MonitorAbort as e:
+            print(e, flush=True)
+            return 1
+
+    elif args.command == "status":
+        print(json.dumps(WorkQueue(args.queue).status()))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+pytest.importorskip("bpy")
+pytest.importorskip("numpy")
+
+from blender_sfdi.cache import RenderCache
+
+KEYS = ["aa01", "bb02", "cc03"]
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = RenderCache(tmp_path / "cache")
+
+    for i, key in enumerate(KEYS):
+        filepath = tmp_path / f"{key}.tiff"
+        filepath.write_bytes(bytes(10))
+        cache.store(key, filepath)
+
+        # Stored one after another
+        os.utime(cache._path(key, ".tiff"), (i + 1, i + 1))
+
+    return cache
+
+def Cached(cache):
+    return sorted(key for key in KEYS if cache._path(key, ".tiff").exists())
+
+def test_evict_within_budget(cache):
+    cache.max_bytes = 30
+    cache.evict()
+
+    assert Cached(cache) == KEYS
+
+def test_evict_least_recently_stored(cache):
+    cache.max_bytes = 20
+    cache.evict()
+
+    assert Cached(cache) == ["bb02", "cc03"]
+    assert cache._size == 20
+
+def test_evict_keeps_fetched(cache, tmp_path):
+    # A fetch makes the oldest file the most recently used
+    assert cache.fetch("aa01", tmp_path / "out.tiff")
+
+    cache.max_bytes = 15
+    cache.evict()
+
+    assert Cached(cache) == ["aa01"]
+
+def test_store_evicts(tmp_path):
+    cache = RenderCache(tmp_path / "cache", max_bytes=25)
+
+    for i, key in enumerate(KEYS):
+        filepath = tmp_path / f"{key}.tiff"
+        filepath.write_bytes(bytes(10))
+        cache.store(key, filepath)
+
+        os.utime(cache._path(key, ".tiff"), (i + 1, i + 1))
+
+    assert Cached(cache) == ["bb02", "cc03"]
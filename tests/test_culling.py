@@ -0,0 +1,81 @@
+import itertools
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("bpy")
+np = pytest.importorskip("numpy")
+
+from mathutils import Vector
+
+from blender_sfdi import sweep
+from blender_sfdi.culling import CullingFrames, FrustumPlanes, OutsideFrustum, ProjectorAffects
+
+# Frame of a 90 degree perspective view at unit distance
+CORNERS = [Vector((-1.0, -1.0, -1.0)), Vector((1.0, -1.0, -1.0)), Vector((1.0, 1.0, -1.0)), Vector((-1.0, 1.0, -1.0))]
+
+def Box(low, high):
+    # (1, 8, 3) corners of an axis aligned box
+    return np.array([list(itertools.product(*zip(low, high)))], dtype=np.float64)
+
+def Outside(box, planes, to_local=None):
+    return bool(OutsideFrustum(box, (np.identity(4) if to_local is None else to_local, planes))[0])
+
+def test_frustum_inside():
+    planes = FrustumPlanes(CORNERS)
+
+    assert not Outside(Box((-0.5, -0.5, -6.0), (0.5, 0.5, -4.0)), planes)
+
+def test_frustum_outside():
+    planes = FrustumPlanes(CORNERS)
+
+    # Beside and behind the view
+    assert Outside(Box((9.0, -0.5, -6.0), (11.0, 0.5, -4.0)), planes)
+    assert Outside(Box((-0.5, -0.5, 4.0), (0.5, 0.5, 6.0)), planes)
+
+def test_frustum_partly_inside():
+    # Boxes crossing a side plane are kept
+    assert not Outside(Box((4.0, -0.5, -6.0), (6.0, 0.5, -4.0)), FrustumPlanes(CORNERS))
+
+def test_frustum_clip_distances():
+    planes = FrustumPlanes(CORNERS, near=1.0, far=10.0)
+
+    assert Outside(Box((-0.1, -0.1, -0.5), (0.1, 0.1, -0.2)), planes)
+    assert Outside(Box((-0.5, -0.5, -20.0), (0.5, 0.5, -15.0)), planes)
+    assert not Outside(Box((-0.5, -0.5, -20.0), (0.5, 0.5, -5.0)), planes)
+
+def test_frustum_orthographic():
+    planes = FrustumPlanes(CORNERS, perspective=False)
+
+    # The view does not widen with distance
+    assert not Outside(Box((0.5, -0.5, -51.0), (0.8, 0.5, -50.0)), planes)
+    assert Outside(Box((2.0, -0.5, -51.0), (3.0, 0.5, -50.0)), planes)
+
+def test_frustum_world_to_local():
+    # Device 10 units up the z axis
+    to_local = np.identity(4)
+    to_local[2, 3] = -10.0
+
+    box = Box((-0.5, -0.5, 4.0), (0.5, 0.5, 6.0))
+
+    assert not Outside(box, FrustumPlanes(CORNERS), to_local)
+    assert Outside(box, FrustumPlanes(CORNERS))
+
+def test_culling_frames():
+    frames = sweep.SweepFrames([1.0], [0.0, 1.0], [0.0], pose_count=3)
+
+    # The first frame of every pose, or every timeline frame
+    assert CullingFrames(frames, "POSE") == [0, 2, 4]
+    assert CullingFrames(frames, "FRAME") == [0, 1, 2, 3, 4, 5]
+
+def Projector(blockers):
+    return SimpleNamespace(bl_obj=SimpleNamespace(light_linking=SimpleNamespace(blocker_collection=blockers)))
+
+def test_projector_affects():
+    board, wall = object(), object()
+    measured = SimpleNamespace(all_objects=[board])
+
+    # A shadow linked projector only lights and is shadowed by the measured objects
+    assert ProjectorAffects(Projector(measured), [board, wall]).tolist() == [True, False]
+    assert ProjectorAffects(Projector(None), [board, wall]).tolist() == [True, True]
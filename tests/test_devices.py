@@ -0,0 +1,77 @@
+import math
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("bpy")
+pytest.importorskip("opensfdi")
+
+from blender_sfdi.devices import BL_Projector
+
+class Variables(list):
+    def new(self):
+        self.append(SimpleNamespace(name="", targets=[SimpleNamespace(id=None, data_path="")]))
+
+        return self[-1]
+
+class Driven:
+    # Light data with the driver calls of bpy_struct
+    def __init__(self):
+        self.spot_blend = 1.0
+        self.drivers = {}
+
+    def driver_remove(self, prop, index=-1):
+        self.drivers.pop(prop, None)
+
+    def driver_add(self, prop):
+        self.drivers[prop] = SimpleNamespace(driver=SimpleNamespace(variables=Variables(), expression=""))
+
+        return self.drivers[prop]
+
+def SpotSize(bl_obj, throw_ratio, aspect_ratio):
+    # Evaluates the spot_size driver like Blender's simple expressions
+    driver = bl_obj.data.drivers["spot_size"].driver
+    values = {"data.sfdi.throw_ratio" : throw_ratio, "data.sfdi.aspect_ratio" : aspect_ratio}
+
+    names = {v.name : values[v.targets[0].data_path] for v in driver.variables}
+    assert all(v.targets[0].id is bl_obj for v in driver.variables)
+
+    return eval(driver.expression, {"atan" : math.atan, "sqrt" : math.sqrt}, names)
+
+@pytest.mark.parametrize("throw_ratio, aspect_ratio", [(1.0, 16.0 / 9.0), (0.5, 4.0 / 3.0), (2.0, 1.0)])
+def test_spot_driver(throw_ratio, aspect_ratio):
+    bl_obj = SimpleNamespace(data=Driven())
+    BL_Projector.set_spot_driver(bl_obj)
+
+    spot_size = SpotSize(bl_obj, throw_ratio, aspect_ratio)
+
+    # The cone just encloses the image corners, (t/2, t/(2a)) in light space stretched by the throw ratio scale
+    corner = throw_ratio * math.hypot(throw_ratio / 2.0, throw_ratio / (2.0 * aspect_ratio))
+
+    assert corner < math.tan(spot_size / 2.0) <= BL_Projector.CONE_MARGIN * corner + 1e-9
+    assert bl_obj.data.spot_blend == 0.0
+
+def LinkedProjector(shadow_linking):
+    measured = SimpleNamespace(name="Measured")
+    bl_obj = SimpleNamespace(
+        data=SimpleNamespace(sfdi=SimpleNamespace(measured=measured, shadow_linking=shadow_linking)),
+        light_linking=SimpleNamespace(receiver_collection=None, blocker_collection=None),
+    )
+
+    BL_Projector.set_light_linking(bl_obj)
+
+    return bl_obj, measured
+
+def test_light_linking():
+    bl_obj, measured = LinkedProjector(True)
+
+    assert bl_obj.light_linking.receiver_collection is measured
+    assert bl_obj.light_linking.blocker_collection is measured
+
+def test_light_linking_without_shadows():
+    # Everything still casts shadows of the projector
+    bl_obj, measured = LinkedProjector(False)
+
+    assert bl_obj.light_linking.receiver_collection is measured
+    assert bl_obj.light_linking.blocker_collection is None
@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("bpy")
+
+from blender_sfdi import estimate, sweep
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+class FakeDriver:
+    # The first unit pays for the setup, later ones only for rendering
+    clock = None
+
+    def __init__(self, scene, output_dir=None, resume=True):
+        self.output_dir = Path(output_dir)
+        self.rendered = 0
+
+    def render(self, frames):
+        self.clock.now += 5.0 if self.rendered == 0 else 2.0
+        self.rendered += 1
+
+        for params in frames: (self.output_dir / sweep.FrameName(params)).write_bytes(bytes(10))
+
+        return [{"file" : sweep.FrameName(params)} for params in frames]
+
+    def output_frames(self, frames):
+        return frames
+
+@pytest.fixture
+def estimated(monkeypatch):
+    FakeDriver.clock = Clock()
+
+    monkeypatch.setattr(estimate.batch, "DRIVERS", {"FULL" : FakeDriver})
+    monkeypatch.setattr(estimate, "time", FakeDriver.clock)
+    monkeypatch.setattr(estimate, "PeakMemory", lambda: 100)
+    monkeypatch.setattr(estimate.planner, "CountRebuilds", lambda scene, frames: 4)
+
+    scene = SimpleNamespace(fp_stereo=SimpleNamespace(render_mode="full"), frame_set=lambda frame: None)
+    frames = sweep.SweepFrames([1.0], [0.0, 1.0], [0.0], pose_count=4)
+
+    return estimate.EstimateRender(scene, frames, samples=4, workers=[1, 2, 3])
+
+def test_estimate_render(estimated):
+    assert (estimated["units"], estimated["sampled_units"], estimated["outputs"]) == (8, 4, 8)
+    assert estimated["setup_seconds"] == 3.0
+    assert estimated["seconds_per_output"] == 2.0
+    assert estimated["total_seconds"] == 3.0 + 8 * 2.0
+    assert estimated["total_bytes"] == 80
+
+def test_estimate_render_workers(estimated):
+    # The setup is paid by every worker, units are split between them
+    assert [entry["seconds"] for entry in estimated["workers"]] == [19.0, 11.0, 9.0]
+    assert [entry["peak_ram_bytes"] for entry in estimated["workers"]] == [100, 200, 300]
+
+def test_estimate_render_unknown_mode():
+    scene = SimpleNamespace(fp_stereo=SimpleNamespace(render_mode="FULL"))
+
+    with pytest.raises(ValueError):
+        estimate.EstimateRender(scene, [{"frame" : 0}], mode="FAST")
+
+def test_format_duration():
+    assert estimate.FormatDuration(3725.4) == "1h 02m 05s"
+    assert estimate.FormatDuration(59.6) == "0h 01m 00s"
+
+def test_format_bytes():
+    assert estimate.FormatBytes(512) == "512.0 B"
+    assert estimate.FormatBytes(3 * 1024 ** 3) == "3.0 GB"
+    assert estimate.FormatBytes(None) == "unknown"
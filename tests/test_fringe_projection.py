@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("bpy")
+np = pytest.importorskip("numpy")
+
+from blender_sfdi import sweep
+from blender_sfdi.operators.fringe_projection import OP_CreateAnimation
+
+class KeyframePoints:
+    def __init__(self):
+        self.count = 0
+        self.values = {}
+
+    def clear(self):
+        self.count = 0
+        self.values = {}
+
+    def add(self, count):
+        self.count += count
+
+    def foreach_set(self, attr, seq):
+        self.values[attr] = list(seq)
+
+class FCurve:
+    def __init__(self):
+        self.keyframe_points = KeyframePoints()
+        self.updated = False
+
+    def update(self):
+        self.updated = True
+
+    def keys(self):
+        # (frame, value) of every keyframe point
+        co = self.keyframe_points.values["co"]
+
+        return list(zip(co[0::2], co[1::2]))
+
+def Operator():
+    # Operator with the F-curves it keys collected by data path, operators can not be created outside of a Blender call
+    fcurves = {}
+    op = SimpleNamespace(CONSTANT=OP_CreateAnimation.CONSTANT, fcurves=fcurves)
+
+    op._fcurve = lambda bl_id, data_path, index=0, group_name="": fcurves.setdefault((data_path, index), FCurve())
+    op._set_keys = lambda *args: OP_CreateAnimation._set_keys(op, *args)
+    op._clear_channels = lambda projector: None
+
+    return op
+
+def test_set_keys():
+    fcurve = FCurve()
+    fcurve.keyframe_points.add(5)
+
+    OP_CreateAnimation._set_keys(Operator(), fcurve, np.array([0.0, 2.0, 3.0]), np.array([1.5, -1.0, 4.0]))
+
+    # Interleaved (frame, value) pairs replace the previous keys
+    points = fcurve.keyframe_points
+    assert points.count == 3
+    assert fcurve.keys() == [(0.0, 1.5), (2.0, -1.0), (3.0, 4.0)]
+    assert points.values["interpolation"] == [OP_CreateAnimation.CONSTANT] * 3
+    assert fcurve.updated
+
+def test_generate_animation():
+    op = Operator()
+    frames = sweep.SweepFrames([1.0], [0.0, 1.0], [0.0], pose_count=2)
+
+    OP_CreateAnimation._generate_animation(op, SimpleNamespace(bl_obj=SimpleNamespace(data=None)), None, frames)
+
+    # Unchanged values are only keyed on a new pose
+    assert op.fcurves["sfdi.channels_list[0].phase", 0].keys() == [(0.0, 0.0), (1.0, 1.0), (2.0, 0.0), (3.0, 1.0)]
+    assert op.fcurves["sfdi.channels_list[0].stripe_count", 0].keys() == [(0.0, 1.0), (2.0, 1.0)]
+
+def test_generate_animation_multiplexed():
+    op = Operator()
+    frames = sweep.SweepFrames([1.0], [0.0, 1.0, 2.0, 3.0], [0.0], pose_count=2, multiplex="PHASES")
+
+    OP_CreateAnimation._generate_animation(op, SimpleNamespace(bl_obj=SimpleNamespace(data=None)), None, frames)
+
+    assert sorted(path for path, _ in op.fcurves if path.endswith(".phase")) == [f"sfdi.channels_list[{i}].phase" for i in range(3)]
+    assert op.fcurves["sfdi.channels_list[0].phase", 0].keys() == [(0.0, 0.0), (1.0, 3.0), (2.0, 0.0), (3.0, 3.0)]
+    assert op.fcurves["sfdi.channels_list[2].phase", 0].keys() == [(0.0, 2.0), (2.0, 2.0)]
@@ -0,0 +1,24 @@
+import pytest
+
+pytest.importorskip("bpy")
+np = pytest.importorskip("numpy")
+tifffile = pytest.importorskip("tifffile")
+
+from blender_sfdi import images
+
+def test_composite_border(tmp_path):
+    border = (0.5, 1.0, 0.5, 1.0)
+    path, background_path, linked = tmp_path / "border.tiff", tmp_path / "background.tiff", tmp_path / "linked.tiff"
+
+    tifffile.imwrite(str(path), np.full((4, 4), 200, dtype=np.uint8))
+    tifffile.imwrite(str(background_path), np.zeros((4, 4), dtype=np.uint8))
+    linked.hardlink_to(path)
+
+    images.CompositeBorder(path, background_path, border)
+
+    composite = tifffile.imread(str(path))
+    assert composite[:2, 2:].tolist() == [[200, 200], [200, 200]]
+    assert composite.sum() == 4 * 200
+
+    # Files hard linked to the border render (e.g. the render cache) are left alone
+    assert tifffile.imread(str(linked)).sum() == 16 * 200
@@ -0,0 +1,58 @@
+import pytest
+
+from blender_sfdi.manifest import Manifest
+
+PARAMS = {"frame" : 3, "pose" : 0, "phase" : 1.5}
+
+@pytest.fixture
+def recorded(tmp_path):
+    filepath = tmp_path / "00003.tiff"
+    filepath.write_bytes(b"frame data")
+
+    manifest = Manifest(tmp_path, name="manifest.test")
+    entry = manifest.record(PARAMS, filepath)
+
+    return manifest, entry, filepath
+
+def test_verify_complete(recorded):
+    manifest, entry, _ = recorded
+
+    assert manifest.verify(entry, PARAMS)
+    assert manifest.verify(entry, PARAMS, full=False)
+
+def test_verify_changed_params(recorded):
+    manifest, entry, _ = recorded
+
+    assert not manifest.verify(entry, dict(PARAMS, phase=0.0))
+
+def test_verify_missing_file(recorded):
+    manifest, entry, filepath = recorded
+    filepath.unlink()
+
+    assert not manifest.verify(entry, PARAMS)
+
+def test_verify_truncated_file(recorded):
+    manifest, entry, filepath = recorded
+    filepath.write_bytes(b"frame")
+
+    assert not manifest.verify(entry, PARAMS, full=False)
+
+def test_verify_corrupted_file(recorded):
+    manifest, entry, filepath = recorded
+    filepath.write_bytes(b"frame DATA")
+
+    # Same size, only the checksum tells them apart
+    assert manifest.verify(entry, PARAMS, full=False)
+    assert not manifest.verify(entry, PARAMS)
+
+def test_load_merges_writers(recorded, tmp_path):
+    manifest, entry, _ = recorded
+
+    other = tmp_path / "00004.tiff"
+    other.write_bytes(b"other")
+    Manifest(tmp_path, name="manifest.other").record(dict(PARAMS, frame=4), other)
+
+    # Partially written line from a crash
+    with open(manifest.filepath, "a") as manifest_file: manifest_file.write('{"frame" : 5')
+
+    assert sorted(manifest.load()) == ["00003", "00004"]
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("bpy")
+
+from blender_sfdi.monitor import ImageMonitor, MonitorAbort
+
+def Monitor(action, patience=2):
+    # Monitor with only the settings the checks read
+    monitor = ImageMonitor.__new__(ImageMonitor)
+    monitor.settings = SimpleNamespace(action=action, patience=patience)
+    monitor.skipped = {}
+    monitor.reports = []
+    monitor._failures = {}
+
+    return monitor
+
+def Check(monitor, failed, frame, pose=0):
+    monitor.check("mean", failed, "mean intensity is too low", {"frame" : frame, "pose" : pose})
+
+def test_check_patience():
+    monitor = Monitor("WARN", patience=3)
+
+    # A passing frame resets the count
+    for frame, failed in enumerate([True, True, False, True, True]): Check(monitor, failed, frame)
+    assert monitor.reports == []
+
+    Check(monitor, True, 5)
+    assert monitor.reports == ["3 frames in a row up to frame 5 (pose 0): mean intensity is too low"]
+
+def test_check_skip():
+    monitor = Monitor("SKIP")
+
+    Check(monitor, True, 0, pose=4)
+    Check(monitor, True, 1, pose=4)
+
+    assert monitor.is_skipped({"pose" : 4})
+    assert not monitor.is_skipped({"pose" : 5})
+    assert monitor.reports[0].startswith("Skipped pose 4")
+
+def test_check_abort():
+    monitor = Monitor("ABORT")
+    Check(monitor, True, 0)
+
+    with pytest.raises(MonitorAbort) as abort:
+        Check(monitor, True, 1)
+
+    assert abort.value.check == "mean"
+    assert "mean check failed" in str(abort.value)
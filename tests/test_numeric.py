@@ -0,0 +1,223 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from blender_sfdi.numeric import (MAX_ENERGY_SCALE, BorderPixels, ComposeLevel, Demultiplex, EnergyScale, FringePattern,
+    Modulation, NoiseEstimate, Peak, ProbeComponents, Quantise, SaturatedFraction, SynthesisePhase)
+
+def test_quantise_8bit():
+    image = np.array([-0.5, 0.0, 0.5, 1.0, 2.0], dtype=np.float32)
+
+    quantised = Quantise(image, 8)
+
+    assert quantised.dtype == np.uint8
+    assert quantised.tolist() == [0, 0, 128, 255, 255]
+
+def test_quantise_16bit():
+    quantised = Quantise(np.array([0.0, 0.25, 1.0], dtype=np.float32), 16)
+
+    assert quantised.dtype == np.uint16
+    assert quantised.tolist() == [0, 16384, 65535]
+
+def test_quantise_string_bit_depth():
+    # Blender stores the colour depth as a string
+    assert Quantise(np.array([1.0]), "12").tolist() == [4095]
+
+def test_demultiplex():
+    rng = np.random.default_rng(0)
+    channels = rng.random((4, 5, 3), dtype=np.float32)
+    crosstalk = [[0.9, 0.1, 0.0], [0.05, 0.8, 0.15], [0.0, 0.2, 0.7]]
+
+    # Camera channel i sees every projector channel j scaled by crosstalk[i][j]
+    image = channels @ np.array(crosstalk, dtype=np.float32).T
+
+    assert np.allclose(Demultiplex(image, crosstalk), channels, atol=1e-5)
+
+def test_demultiplex_without_crosstalk():
+    image = np.ones((2, 2, 3), dtype=np.float32)
+
+    assert Demultiplex(image) is image
+
+def test_border_pixels():
+    # Rows start at the top, the border at the bottom
+    rows, cols = BorderPixels((10, 20, 3), (0.25, 0.75, 0.0, 0.5))
+
+    assert (rows, cols) == (slice(5, 10), slice(5, 15))
+
+def test_border_pixels_full():
+    assert BorderPixels((8, 8), (0.0, 1.0, 0.0, 1.0)) == (slice(0, 8), slice(0, 8))
+
+def test_border_pixels_inside():
+    # Partly covered pixels are left out
+    rows, cols = BorderPixels((10, 10), (0.15, 0.85, 0.15, 0.85))
+
+    assert (rows, cols) == (slice(2, 8), slice(2, 8))
+
+def Pattern(x, phase, ambient=0.1, albedo=0.8):
+    # Camera image of the (1 + cos(kx + phase)) / 2 pattern
+    return ambient + albedo * (1.0 + np.cos(x + phase)) / 2.0
+
+@pytest.mark.parametrize("phase", [0.0, np.pi / 3.0, np.pi, 4.0])
+def test_synthesise_phase(phase):
+    x = np.linspace(0.0, 4.0 * np.pi, 64)
+
+    dc = Pattern(x, 0.0, albedo=0.0) + 0.8 * 0.5
+    cos = Pattern(x, 0.0)
+    sin = Pattern(x, np.pi / 2.0)
+
+    assert np.allclose(SynthesisePhase(dc, cos, sin, phase), Pattern(x, phase))
+
+def test_synthesise_phase_basis():
+    x = np.linspace(0.0, 2.0 * np.pi, 16)
+    dc, cos, sin = np.full_like(x, 0.5), Pattern(x, 0.0, ambient=0.0, albedo=1.0), Pattern(x, np.pi / 2.0, ambient=0.0, albedo=1.0)
+
+    assert np.allclose(SynthesisePhase(dc, cos, sin, 0.0), cos)
+    assert np.allclose(SynthesisePhase(dc, cos, sin, np.pi / 2.0), sin)
+
+def test_compose_level():
+    projector = np.array([0.2, 0.4])
+    ambient = np.array([0.1, 0.0])
+
+    assert np.allclose(ComposeLevel(projector, ambient), projector + ambient)
+    assert np.allclose(ComposeLevel(projector, ambient, intensity=0.5, energy_scale=2.0), projector + ambient)
+    assert np.allclose(ComposeLevel(projector, ambient, exposure=1.0, ambient_scale=0.0), 2.0 * projector)
+
+def test_fringe_pattern_sinusoidal():
+    x = np.linspace(0.0, 1.0, 9)
+    y = np.zeros_like(x)
+
+    pattern = FringePattern(x, y, stripe_count=2.0, phase=0.0, rotation=0.0)
+
+    assert np.allclose(pattern, (1.0 + np.cos(4.0 * np.pi * x)) / 2.0)
+
+def test_fringe_pattern_rotation():
+    y = np.linspace(0.0, 1.0, 9)
+    x = np.zeros_like(y)
+
+    # A quarter turn puts the stripes along y
+    rotated = FringePattern(x, y, stripe_count=1.0, phase=0.5, rotation=-np.pi / 2.0)
+    expected = FringePattern(y, x, stripe_count=1.0, phase=0.5, rotation=0.0)
+
+    assert np.allclose(rotated, expected)
+
+def test_fringe_pattern_binary():
+    x = np.array([0.0, 0.2, 0.5, 0.8])
+
+    pattern = FringePattern(x, np.zeros_like(x), stripe_count=1.0, phase=0.0, rotation=0.0, fringes_type="Binary", intensity=0.5)
+
+    assert pattern.tolist() == [0.5, 0.5, 0.0, 0.5]
+
+def test_fringe_pattern_background():
+    x = np.array([np.nan, 0.0])
+
+    assert FringePattern(x, np.zeros_like(x), stripe_count=1.0, phase=0.0, rotation=0.0).tolist() == [0.0, 1.0]
+
+def test_fringe_pattern_noise():
+    x = np.zeros(1000, dtype=np.float32)
+
+    pattern = FringePattern(x, x, stripe_count=0.0, phase=np.pi / 2.0, rotation=0.0, noise=0.4, rng=np.random.default_rng(0))
+
+    # Uniform noise of +-noise / 4 around the constant 0.5 pattern
+    assert np.all(np.abs(pattern - 0.5) <= 0.1 + 1e-6)
+    assert 0.0 < pattern.std()
+
+def test_noise_estimate_identical_halves():
+    image = np.full((4, 4, 3), 0.5)
+
+    assert NoiseEstimate([[image * 8, 8], [image * 8, 8]]) == 0.0
+
+def test_noise_estimate_equal_halves():
+    # With n samples per half and means d apart the error of the mean is d / 2
+    a = np.full((4, 4, 3), 0.6)
+    b = np.full((4, 4, 3), 0.4)
+
+    assert NoiseEstimate([[a * 16, 16], [b * 16, 16]]) == pytest.approx(0.1)
+
+def test_noise_estimate_gaussian():
+    rng = np.random.default_rng(0)
+    sigma, n = 0.2, 64
+
+    # Sums of n samples of unit mean per pixel
+    halves = [[rng.normal(1.0, sigma, (n, 64, 64)).sum(axis=0), n] for _ in range(2)]
+
+    assert NoiseEstimate(halves) == pytest.approx(sigma / np.sqrt(2 * n), rel=0.1)
+
+def test_noise_estimate_unbalanced_halves():
+    rng = np.random.default_rng(1)
+    sigma = 0.2
+
+    # Samples of the progressive rounds, m, m, 2m, 4m, 8m alternating between the halves
+    counts = [8 + 16 + 64, 8 + 32]
+    halves = [[rng.normal(1.0, sigma, (n, 64, 64)).sum(axis=0), n] for n in counts]
+
+    assert NoiseEstimate(halves) == pytest.approx(sigma / np.sqrt(sum(counts)), rel=0.1)
+
+def test_peak_luminance():
+    image = np.zeros((10, 10, 3), dtype=np.float32)
+    image[..., 1] = 1.0
+
+    # BW cameras see the luminance of the colour render
+    assert Peak(image, 1, 100.0) == pytest.approx(0.7152, rel=1e-4)
+    assert Peak(image, 3, 100.0) == 1.0
+
+def test_probe_components():
+    # DC probe at half the projector intensity, white probe at full intensity
+    projector, ambient = np.array([0.4, 0.0, 1.0]), np.array([0.1, 0.2, 0.0])
+
+    components = ProbeComponents(ambient + projector / 2.0, ambient + projector)
+
+    assert np.allclose(components, (projector, ambient))
+
+def test_energy_scale():
+    projector = np.linspace(0.0, 0.5, 101)
+    ambient = np.full_like(projector, 0.1)
+
+    scale = EnergyScale(projector, ambient, 0.8, 1, 100.0)
+
+    assert scale == pytest.approx(1.4, rel=1e-6)
+    assert Peak(ambient + scale * projector, 1, 100.0) == pytest.approx(0.8)
+
+def test_energy_scale_percentile():
+    projector = np.linspace(0.0, 1.0, 101)
+
+    # Half of the pixels end up below the target
+    assert EnergyScale(projector, np.zeros_like(projector), 0.8, 1, 50.0) == pytest.approx(1.6, rel=1e-6)
+
+def test_energy_scale_dark_projector():
+    assert EnergyScale(np.zeros(4), np.full(4, 0.1), 0.8, 1, 99.0) is None
+
+def test_energy_scale_bright_ambient():
+    with pytest.raises(ValueError):
+        EnergyScale(np.full(4, 0.1), np.full(4, 0.9), 0.8, 1, 99.0)
+
+def test_energy_scale_limit():
+    assert EnergyScale(np.full(4, 1e-9), np.zeros(4), 0.8, 1, 99.0) == MAX_ENERGY_SCALE
+
+def test_saturated_fraction():
+    image = np.array([[0, 255], [254, 255]], dtype=np.uint8)
+
+    assert SaturatedFraction(image, 255) == 0.5
+
+def test_saturated_fraction_colour():
+    # A pixel is saturated when any of its channels is
+    image = np.zeros((2, 2, 3), dtype=np.float32)
+    image[0, 0, 2] = 1.0
+
+    assert SaturatedFraction(image, 1.0) == 0.25
+
+@pytest.mark.parametrize("count", [3, 4])
+def test_modulation(count):
+    x = np.linspace(0.0, 4.0 * np.pi, 64).reshape(8, 8)
+    phases = 2.0 * np.pi * np.arange(count) / count
+
+    images = [0.5 + 0.2 * np.cos(x + phase) for phase in phases]
+
+    assert Modulation(images, phases) == pytest.approx(0.4, rel=1e-4)
+
+def test_modulation_dark():
+    phases = [0.0, 2.0 * np.pi / 3.0, 4.0 * np.pi / 3.0]
+    images = [np.full((4, 4), 0.01) for _ in phases]
+
+    # Pixels darker than min_mean are left out
+    assert Modulation(images, phases, min_mean=0.05) == 0.0
+    assert Modulation(images, phases) == pytest.approx(0.0, abs=1e-6)
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("bpy")
+
+from blender_sfdi import planner, sweep
+
+class Curve:
+    # hide_render F-curve keyed on for some frames
+    def __init__(self, hidden):
+        self.hidden = hidden
+
+    def evaluate(self, frame):
+        return 1.0 if frame in self.hidden else 0.0
+
+def Scene(persistent_data=True):
+    return SimpleNamespace(
+        fp_stereo=SimpleNamespace(char_board=None),
+        render=SimpleNamespace(use_persistent_data=persistent_data),
+        objects=[],
+    )
+
+@pytest.fixture
+def repeated_poses(monkeypatch):
+    # The third pose repeats the first one
+    monkeypatch.setattr(planner, "PoseKeys", lambda scene: {0 : 0, 1 : 1, 2 : 0})
+
+    return sweep.SweepFrames([1.0], [0.0, 1.0], [0.0], pose_count=3)
+
+def Frames(frames):
+    return [params["frame"] for params in frames]
+
+def test_plan_frames_repeated_poses(repeated_poses):
+    planned = planner.PlanFrames(Scene(), repeated_poses)
+
+    assert Frames(planned) == [0, 1, 4, 5, 2, 3]
+    assert sorted(Frames(planned)) == Frames(repeated_poses)
+
+def test_plan_frames_culling(monkeypatch):
+    monkeypatch.setattr(planner, "CulledCurves", lambda scene: [Curve({1, 3})])
+    frames = sweep.SweepFrames([1.0], [0.0, 1.0, 2.0, 3.0], [0.0])
+
+    planned = planner.PlanFrames(Scene(), frames)
+
+    assert Frames(planned) == [0, 2, 1, 3]
+    assert planner.CountRebuilds(Scene(), frames) == 4
+    assert planner.CountRebuilds(Scene(), planned) == 2
+
+def test_plan_frames_keeps_outputs_together():
+    frames = sweep.ExpandLevels(sweep.SweepFrames([1.0], [0.0, 1.0], [0.0], pose_count=2), [{}, {}])
+
+    # A single geometry state per pose, nothing to reorder
+    assert planner.PlanFrames(Scene(), frames) == frames
+
+def test_count_rebuilds(repeated_poses):
+    scene = Scene()
+
+    assert planner.CountRebuilds(scene, repeated_poses) == 3
+    assert planner.CountRebuilds(scene, planner.PlanFrames(scene, repeated_poses)) == 2
+
+def test_count_rebuilds_without_persistent_data(repeated_poses):
+    # Every render builds the BVH
+    assert planner.CountRebuilds(Scene(persistent_data=False), repeated_poses) == 6
+
+def test_count_rebuilds_shared_renders():
+    scene = Scene(persistent_data=False)
+
+    # Multiplexed channels share a render, levels do not
+    multiplexed = sweep.SweepFrames([1.0], [0.0, 1.0, 2.0], [0.0], multiplex="PHASES")
+    levels = sweep.ExpandLevels(sweep.SweepFrames([1.0], [0.0], [0.0]), [{}, {}, {}])
+
+    assert planner.CountRebuilds(scene, multiplexed) == 1
+    assert planner.CountRebuilds(scene, levels) == 3
+
+def test_count_rebuilds_empty():
+    assert planner.CountRebuilds(Scene(), []) == 0
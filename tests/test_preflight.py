@@ -0,0 +1,95 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("bpy")
+
+from blender_sfdi import preflight
+from blender_sfdi.preflight import ERROR, WARNING, CheckDrivers, CheckRender, CheckWorld, Issue, Preflight
+
+def Scene(**render):
+    # Scene with the render settings a dataset needs
+    return SimpleNamespace(
+        render=SimpleNamespace(**dict({"engine" : 'CYCLES', "dither_intensity" : 0.0, "resolution_percentage" : 100}, **render)),
+        view_settings=SimpleNamespace(view_transform='Raw', look='None'),
+        cycles=SimpleNamespace(use_denoising=False),
+        world=None,
+    )
+
+def Socket(value, linked=False):
+    return SimpleNamespace(default_value=value, is_linked=linked)
+
+def World(strength, color=(1.0, 1.0, 1.0, 1.0), linked=False):
+    background = SimpleNamespace(type='BACKGROUND', name="Background", inputs={"Strength" : Socket(strength), "Color" : Socket(color, linked)})
+    output = SimpleNamespace(type='OUTPUT_WORLD', name="World Output", inputs={})
+
+    return SimpleNamespace(node_tree=SimpleNamespace(nodes=[background, output]))
+
+def test_check_render():
+    assert CheckRender(Scene()) == []
+
+def test_check_render_fix():
+    scene = Scene(engine='BLENDER_EEVEE', dither_intensity=1.0)
+    scene.cycles.use_denoising = True
+
+    issues = CheckRender(scene)
+    assert [issue.severity for issue in issues] == [ERROR] * 3
+
+    for issue in issues: issue.fix()
+
+    assert CheckRender(scene) == []
+
+def test_check_world():
+    scene = Scene()
+    assert CheckWorld(scene) == []
+
+    scene.world = World(0.0)
+    assert CheckWorld(scene) == []
+
+    scene.world = World(1.0, color=(0.0, 0.0, 0.0, 1.0))
+    assert CheckWorld(scene) == []
+
+    # The world may be the ambient light on purpose, so it is not fixed
+    for world in (World(1.0), World(0.0, linked=True)):
+        scene.world = world
+        issues = CheckWorld(scene)
+
+        assert [(issue.severity, issue.fix) for issue in issues] == [(WARNING, None)]
+
+class ID:
+    # Hashable like Blender ID blocks
+    def __init__(self, name, drivers=None):
+        self.name = name
+        self.animation_data = None if drivers is None else SimpleNamespace(drivers=drivers)
+
+def Driver(data_path, valid=True, target=True):
+    variable = SimpleNamespace(is_valid=True, targets=[SimpleNamespace(id=object() if target else None)])
+
+    return SimpleNamespace(data_path=data_path, is_valid=True, driver=SimpleNamespace(is_valid=valid, variables=[variable]))
+
+def test_check_drivers():
+    bl_id = ID("Camera", [Driver("lens"), Driver("sensor_width", valid=False), Driver("shift_x", target=False), Driver("clip_end", valid=False)])
+
+    issues = CheckDrivers([bl_id, ID("Board")], known={(bl_id, "clip_end")})
+
+    assert [issue.message for issue in issues] == ["Driver 'sensor_width' of 'Camera' is invalid", "Driver 'shift_x' of 'Camera' is invalid"]
+
+def test_issue_str():
+    assert str(Issue(ERROR, "Dithering adds noise")) == "ERROR: Dithering adds noise"
+    assert str(Issue(WARNING, "No spot cone driver", lambda: None)) == "WARNING: No spot cone driver (fixable)"
+
+def test_preflight(monkeypatch):
+    monkeypatch.setattr(preflight, "CheckScene", lambda scene: CheckRender(scene) + [Issue(WARNING, "World lights the scene")])
+
+    assert Preflight(Scene(), "OFF") == []
+    assert [issue.message for issue in Preflight(Scene())] == ["World lights the scene"]
+
+    with pytest.raises(ValueError, match="Dithering"):
+        Preflight(Scene(dither_intensity=1.0))
+
+def test_preflight_fix(monkeypatch):
+    monkeypatch.setattr(preflight, "CheckScene", CheckRender)
+    scene = Scene(resolution_percentage=50)
+
+    assert Preflight(scene, "FIX") == []
+    assert scene.render.resolution_percentage == 100
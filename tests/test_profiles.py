@@ -0,0 +1,45 @@
+from types import SimpleNamespace
+
+import pytest
+
+from blender_sfdi.profiles import PROFILES, REQUIRED, ApplyProfile, ProfileSettings
+
+def Scene():
+    return SimpleNamespace(cycles=SimpleNamespace(), render=SimpleNamespace(), view_settings=SimpleNamespace())
+
+@pytest.mark.parametrize("name", list(PROFILES))
+def test_profile_settings_required(name):
+    # Every profile keeps the settings the measurements rely on
+    settings = ProfileSettings(name)
+
+    for key, values in REQUIRED.items():
+        assert values.items() <= settings[key].items()
+
+def test_profile_settings():
+    settings = ProfileSettings("DRAFT")
+
+    assert settings["cycles"]["max_bounces"] == 2
+    assert settings["render"] == {"dither_intensity" : 0.0, "use_persistent_data" : False}
+    assert settings["max_samples"] == 16
+    assert "max_samples" not in ProfileSettings("FINAL_GI")
+
+def test_profile_settings_custom():
+    assert ProfileSettings("CUSTOM") == {}
+
+def test_apply_profile():
+    scene = Scene()
+
+    assert ApplyProfile(scene, "DRAFT", 128) == 16
+    assert ApplyProfile(scene, "DRAFT", 8) == 8
+    assert scene.cycles.use_denoising is False
+    assert scene.view_settings.view_transform == "Raw"
+
+def test_apply_profile_custom():
+    scene = Scene()
+
+    assert ApplyProfile(scene, "CUSTOM", 128) == 128
+    assert vars(scene.cycles) == {}
+
+def test_apply_profile_unknown():
+    with pytest.raises(ValueError):
+        ApplyProfile(Scene(), "FAST", 128)
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("bpy")
+
+from blender_sfdi.metadata import SplitViews
+from blender_sfdi.render import MultiView, PassName, PassOutputs
+
+def test_pass_outputs_path(tmp_path):
+    outputs = PassOutputs(SimpleNamespace(frame_current=7), [], tmp_path)
+
+    for name in ("Combined_Projector", "Combined_Projector_001"):
+        (tmp_path / f"{name}0007.exr").write_bytes(b"exr")
+
+    # Passes whose names start with the same light group are not mixed up
+    assert outputs.path(PassName("Projector")) == tmp_path / "Combined_Projector0007.exr"
+    assert outputs.path(PassName("Projector_001")) == tmp_path / "Combined_Projector_0010007.exr"
+
+def test_pass_outputs_missing(tmp_path):
+    (tmp_path / "Combined_Projector0006.exr").write_bytes(b"exr")
+
+    with pytest.raises(FileNotFoundError):
+        PassOutputs(SimpleNamespace(frame_current=7), [], tmp_path).path("Combined_Projector")
+
+class Views(list):
+    # scene.render.views
+    def new(self, name):
+        view = SimpleNamespace(name=name, use=False, camera_suffix="", file_suffix="")
+        self.append(view)
+
+        return view
+
+def Camera(name, resolution=(640, 480)):
+    return SimpleNamespace(bl_obj=SimpleNamespace(name=name), resolution=resolution)
+
+def MultiViewScene():
+    return SimpleNamespace(camera=None, render=SimpleNamespace(
+        use_multiview=False, views_format='STEREO_3D', image_settings=SimpleNamespace(views_format='STEREO_3D'),
+        views=Views([SimpleNamespace(name="left", use=True), SimpleNamespace(name="right", use=True)]),
+    ))
+
+def test_multi_view():
+    scene = MultiViewScene()
+    cameras = [Camera("Camera"), Camera("Camera.001")]
+
+    with MultiView(scene, cameras) as views:
+        used = [view for view in scene.render.views if view.use]
+
+        assert scene.camera is cameras[0].bl_obj
+        assert [(view.camera_suffix, view.file_suffix) for view in used] == [("Camera", "_v00"), ("Camera.001", "_v01")]
+        assert views.path(Path("out/00003.tiff"), 1) == Path("out/00003_v01.tiff")
+
+    # The scene views are restored
+    assert scene.camera is None and not scene.render.use_multiview
+    assert [(view.name, view.use) for view in scene.render.views] == [("left", True), ("right", True)]
+
+def test_multi_view_single_camera():
+    scene = MultiViewScene()
+
+    with MultiView(scene, [Camera("Camera")]) as views:
+        assert not scene.render.use_multiview
+        assert views.path(Path("out/00003.tiff"), 0) == Path("out/00003.tiff")
+
+def test_multi_view_resolution():
+    with pytest.raises(ValueError):
+        with MultiView(MultiViewScene(), [Camera("Camera"), Camera("Camera.001", (800, 600))]): pass
+
+def test_split_views():
+    metadata = {"cameras" : [{"name" : "Camera"}, {"name" : "Camera.001"}], "frames" : [
+        {"file" : "00000_v00.tiff", "camera" : 0}, {"file" : "00000_v01.tiff", "camera" : 1}, {"file" : "00001_v00.tiff", "camera" : 0},
+    ]}
+
+    views = SplitViews(metadata)["views"]
+
+    assert [view["files"] for view in views] == [["00000_v00.tiff", "00001_v00.tiff"], ["00000_v01.tiff"]]
+    assert views[1]["name"] == "Camera.001"
+    assert "views" not in SplitViews({"frames" : []})
@@ -0,0 +1,69 @@
+import subprocess
+
+import pytest
+
+pytest.importorskip("bpy")
+
+from blender_sfdi import renderqueue
+from blender_sfdi.renderqueue import QueuedRender
+
+class StubbornProcess:
+    # Ignores terminate, like Blender busy in a render
+    def __init__(self):
+        self.killed = False
+
+    def terminate(self):
+        pass
+
+    def kill(self):
+        self.killed = True
+
+    def wait(self, timeout=None):
+        if not self.killed: raise subprocess.TimeoutExpired("blender", timeout)
+        return -9
+
+@pytest.fixture
+def job(tmp_path):
+    blend, job_path = tmp_path / "snapshot.blend", tmp_path / "snapshot.json"
+    blend.touch()
+    job_path.touch()
+
+    return QueuedRender(0, "Scene (full)", blend, job_path, tmp_path / "output", total=10)
+
+def test_progress_resumed(job, monkeypatch):
+    job._lines.extend([f"Resumed frame {i:05d} -> {i:05d}.tiff" for i in range(6)])
+    job._lines.extend(["Rendered frame 00006 -> 00006.tiff", "Rendered frame 00007 -> 00007.tiff", "Saved metadata"])
+    job._drain()
+
+    assert (job.done, job.resumed, job.rendered) == (8, 6, 2)
+    assert job.progress == 0.8
+    assert job.message == "Saved metadata"
+
+    # Two frames rendered in a minute, two left
+    monkeypatch.setattr(QueuedRender, "elapsed", property(lambda self: 60.0))
+
+    assert job.throughput == 2.0
+    assert job.eta == 60.0
+
+def test_eta_only_resumed(job):
+    job._lines.append("Resumed frame 00000 -> 00000.tiff")
+    job._drain()
+
+    assert job.eta is None
+
+def test_cancel_stubborn_process(job):
+    job.proc = StubbornProcess()
+    job.status = renderqueue.RUNNING
+    job._started = 0.0
+
+    job.cancel()
+
+    assert job.proc.killed
+    assert job.status == renderqueue.CANCELLED
+    assert not job.blend.exists() and not job.job_path.exists()
+
+def test_cancel_pending(job):
+    job.cancel()
+
+    assert job.status == renderqueue.CANCELLED
+    assert not job.blend.exists()
@@ -0,0 +1,138 @@
+import pytest
+
+from blender_sfdi import sweep
+
+def test_sweep_frames_nesting():
+    frames = sweep.SweepFrames([1.0, 2.0], [0.0, 3.14], [0.0], pose_count=2, frame_start=10)
+
+    assert len(frames) == 8
+    assert [f["frame"] for f in frames] == list(range(10, 18))
+
+    # poses -> rotations -> stripe counts -> phases
+    assert [(f["pose"], f["stripe_count"], f["phase"]) for f in frames[:4]] == [(0, 1.0, 0.0), (0, 1.0, 3.14), (0, 2.0, 0.0), (0, 2.0, 3.14)]
+    assert [f["pose"] for f in frames[4:]] == [1, 1, 1, 1]
+
+def test_sweep_frames_without_poses():
+    frames = sweep.SweepFrames([1.0], [0.0, 1.0], [0.0, 0.5])
+
+    assert [f["pose"] for f in frames] == [None] * 4
+    assert [(f["rotation"], f["phase"]) for f in frames] == [(0.0, 0.0), (0.0, 1.0), (0.5, 0.0), (0.5, 1.0)]
+    assert all("channel" not in f for f in frames)
+
+def test_sweep_frames_multiplexed():
+    frames = sweep.SweepFrames([1.0], [0.0, 1.0, 2.0, 3.0], [0.0], multiplex="PHASES")
+
+    # Three phases on the first frame, the last one alone on the second
+    assert [(f["frame"], f["channel"], f["phase"]) for f in frames] == [(0, 0, 0.0), (0, 1, 1.0), (0, 2, 2.0), (1, 0, 3.0)]
+
+def test_sweep_frames_empty():
+    assert sweep.SweepFrames([], [0.0], [0.0]) == []
+
+def test_frame_name():
+    assert sweep.FrameName({"frame" : 7}) == "00007"
+    assert sweep.FrameName({"frame" : 7, "level" : 2, "channel" : None, "camera" : 1}) == "00007_l02_v01"
+    assert sweep.FrameName({"frame" : 12, "projector" : 0, "channel" : 2}) == "00012_p00_c02"
+
+def test_sweep_levels():
+    levels = sweep.SweepLevels({"intensities" : [0.5, 1.0], "exposures" : [0.0, 1.0, 2.0]})
+
+    assert len(levels) == 6
+    assert levels[0] == {"intensity" : 0.5, "exposure" : 0.0}
+    assert levels[-1] == {"intensity" : 1.0, "exposure" : 2.0}
+
+def test_sweep_levels_empty():
+    assert sweep.SweepLevels(None) == []
+    assert sweep.SweepLevels({}) == []
+
+def test_sweep_levels_unknown():
+    with pytest.raises(ValueError):
+        sweep.SweepLevels({"gains" : [1.0]})
+
+def test_expand_levels():
+    frames = [{"frame" : 0}, {"frame" : 1}]
+    levels = sweep.SweepLevels({"ambients" : [0.0, 1.0]})
+
+    expanded = sweep.ExpandLevels(frames, levels)
+
+    assert [(f["frame"], f["level"], f["ambient"]) for f in expanded] == [(0, 0, 0.0), (0, 1, 1.0), (1, 0, 0.0), (1, 1, 1.0)]
+    assert sweep.ExpandLevels(frames, []) is frames
+
+def test_chunk_frames():
+    frames = sweep.ExpandLevels([{"frame" : i} for i in range(5)], [{}, {}])
+
+    chunks = sweep.ChunkFrames(frames, 2)
+
+    # Levels of a timeline frame stay in one chunk
+    assert [[f["frame"] for f in chunk] for chunk in chunks] == [[0, 0, 1, 1], [2, 2, 3, 3], [4, 4]]
+    assert sweep.ChunkFrames([], 2) == []
+
+def test_packs():
+    assert sweep._packs([1.0, 2.0], [0.0, 1.0]) == [[(1.0, 0.0)], [(1.0, 1.0)], [(2.0, 0.0)], [(2.0, 1.0)]]
+
+def test_packs_phases():
+    packs = sweep._packs([1.0, 2.0], [0.0, 1.0, 2.0, 3.0], "PHASES")
+
+    assert packs == [[(1.0, 0.0), (1.0, 1.0), (1.0, 2.0)], [(1.0, 3.0)], [(2.0, 0.0), (2.0, 1.0), (2.0, 2.0)], [(2.0, 3.0)]]
+
+def test_packs_stripe_counts():
+    packs = sweep._packs([1.0, 2.0, 4.0, 8.0], [0.0, 1.0], "STRIPE_COUNTS")
+
+    assert packs == [[(1.0, 0.0), (2.0, 0.0), (4.0, 0.0)], [(8.0, 0.0)], [(1.0, 1.0), (2.0, 1.0), (4.0, 1.0)], [(8.0, 1.0)]]
+
+def test_packs_unknown():
+    with pytest.raises(ValueError):
+        sweep._packs([1.0], [0.0], "ROTATIONS")
+
+def ChannelFrames(count, channels=1):
+    return [{"frame" : i, "channel" : c} for i in range(count) for c in range(channels)]
+
+def test_split_frames_even():
+    chunks = sweep.SplitFrames(ChannelFrames(6), 3)
+
+    assert [[f["frame"] for f in chunk] for chunk in chunks] == [[0, 1], [2, 3], [4, 5]]
+
+def test_split_frames_remainder():
+    chunks = sweep.SplitFrames(ChannelFrames(7), 3)
+
+    # The first chunks take the extra frames
+    assert [len(chunk) for chunk in chunks] == [3, 2, 2]
+    assert [f for chunk in chunks for f in chunk] == ChannelFrames(7)
+
+def test_split_frames_keeps_timeline_frames():
+    chunks = sweep.SplitFrames(ChannelFrames(3, channels=3), 2)
+
+    assert [sorted({f["frame"] for f in chunk}) for chunk in chunks] == [[0, 1], [2]]
+    assert [len(chunk) for chunk in chunks] == [6, 3]
+
+def test_split_frames_more_workers_than_frames():
+    chunks = sweep.SplitFrames(ChannelFrames(2), 8)
+
+    assert len(chunks) == 2
+    assert sweep.SplitFrames(ChannelFrames(2), 0) == [ChannelFrames(2)]
+
+def test_split_frames_sweep():
+    frames = sweep.SweepFrames([1.0, 2.0], [0.0, 1.0], [0.0], pose_count=3)
+
+    assert [f for chunk in sweep.SplitFrames(frames, 4) for f in chunk] == frames
+
+def TimelineFrames(count):
+    return [{"frame" : i, "phase" : 0} for i in range(count)]
+
+def test_stratified_units_grouped():
+    # GroupBy returns a view, not a list
+    units = sweep.GroupBy(TimelineFrames(8), lambda params: params["frame"])
+
+    picked = sweep.StratifiedUnits(units, 4)
+
+    assert [key for key, _ in picked] == [1, 3, 5, 7]
+
+def test_stratified_units_more_samples_than_units():
+    units = sweep.GroupBy(TimelineFrames(3), lambda params: params["frame"])
+
+    assert [key for key, _ in sweep.StratifiedUnits(units, 10)] == [0, 1, 2]
+
+def test_stratified_units_single():
+    units = sweep.GroupBy(TimelineFrames(5), lambda params: params["frame"])
+
+    assert [key for key, _ in sweep.StratifiedUnits(units, 1)] == [2]
+    assert [key for key, _ in sweep.StratifiedUnits(units, 0)] == [2]
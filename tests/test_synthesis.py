@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("bpy")
+np = pytest.importorskip("numpy")
+pytest.importorskip("tifffile")
+
+from blender_sfdi.synthesis import SynthesisRenderDriver
+
+def Driver(intensities, energy=5.0, exposure=0.0):
+    # Synthesis driver with only the projector and scene values level_values reads
+    driver = SynthesisRenderDriver.__new__(SynthesisRenderDriver)
+    driver.projector = SimpleNamespace(
+        settings=SimpleNamespace(channels_list=[SimpleNamespace(intensity=intensity) for intensity in intensities]),
+        bl_obj=SimpleNamespace(data=SimpleNamespace(energy=energy)),
+    )
+    driver.scene = SimpleNamespace(view_settings=SimpleNamespace(exposure=exposure))
+
+    return driver
+
+def test_level_values_scene():
+    levels = Driver([0.8, 0.5, 0.3], exposure=1.0).level_values({"frame" : 0})
+
+    assert levels == {"intensity" : 0.8, "energy_scale" : 1.0, "exposure" : 1.0, "ambient_scale" : 1.0}
+
+def test_level_values_level():
+    levels = Driver([0.8]).level_values({"frame" : 0, "intensity" : 0.4, "energy" : 10.0, "ambient" : 0.0})
+
+    assert levels == {"intensity" : 0.4, "energy_scale" : 2.0, "exposure" : 0.0, "ambient_scale" : 0.0}
+
+def test_level_values_multiplexed():
+    driver = Driver([0.8, 0.5, 0.3])
+
+    # Each channel keeps its own intensity, a level intensity applies to every channel
+    assert [driver.level_values({"frame" : 0, "channel" : i})["intensity"] for i in range(3)] == [0.8, 0.5, 0.3]
+    assert driver.level_values({"frame" : 0, "channel" : 2, "intensity" : 1.0})["intensity"] == 1.0
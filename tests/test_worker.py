@@ -0,0 +1,80 @@
+import json
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip("bpy")
+
+from blender_sfdi.worker import ParseAddress, RenderWorker, SubmitJob
+
+class EchoWorker(RenderWorker):
+    # Serves requests without a rig, frames are streamed after the client is allowed to leave
+    def __init__(self):
+        self.left = threading.Event()
+        self.sent = 0
+
+    def handle(self, request, send):
+        cmd = request.get("cmd", "render")
+
+        if cmd == "shutdown":
+            send({"event": "done", "count": 0})
+            return False
+
+        if cmd == "fail": raise ValueError("bad request")
+
+        self.left.wait(5.0)
+        for i in range(1000):
+            send({"event": "frame", "frame": i})
+            self.sent += 1
+
+        send({"event": "done", "count": 1000})
+        return True
+
+@pytest.fixture
+def served(tmp_path):
+    address = f"unix:{tmp_path / 'worker.sock'}"
+    worker = EchoWorker()
+
+    thread = threading.Thread(target=worker.serve, args=(address,), daemon=True)
+    thread.start()
+
+    # Wait for the socket
+    for _ in range(100):
+        if (tmp_path / "worker.sock").exists(): break
+        thread.join(0.05)
+
+    yield worker, address, thread
+
+    thread.join(5.0)
+
+def test_parse_address():
+    assert ParseAddress("unix:/tmp/sfdi.sock") == (socket.AF_UNIX, "/tmp/sfdi.sock")
+    assert ParseAddress("127.0.0.1:5555") == (socket.AF_INET, ("127.0.0.1", 5555))
+    assert ParseAddress(":5555") == (socket.AF_INET, ("127.0.0.1", 5555))
+
+def test_error_event(served):
+    _, address, _ = served
+
+    assert list(SubmitJob(address, {"cmd": "fail"})) == [{"event": "error", "message": "bad request"}]
+    assert list(SubmitJob(address, {"cmd": "shutdown"}))[-1]["event"] == "done"
+
+def test_client_disconnects_mid_render(served):
+    worker, address, thread = served
+
+    # The client leaves before the frames are streamed back
+    family, addr = ParseAddress(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(addr)
+        sock.sendall((json.dumps({"frames": "0:9"}) + "\n").encode())
+
+    worker.left.set()
+
+    # The worker drops the connection and serves the next client
+    events = list(SubmitJob(address, {"cmd": "shutdown"}))
+
+    assert events == [{"event": "done", "count": 0}]
+    assert worker.sent < 1000
+
+    thread.join(5.0)
+    assert not thread.is_alive()
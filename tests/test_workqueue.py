@@ -0,0 +1,107 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("bpy")
+
+from blender_sfdi.workqueue import Lease, WorkQueue
+
+UNIT = "unit_00000"
+
+@pytest.fixture
+def queue(tmp_path):
+    frames = [{"frame" : i} for i in range(4)]
+
+    return WorkQueue.create(tmp_path / "queue", tmp_path / "job.json", frames, tmp_path / "output", unit_size=2)
+
+def Expire(queue, unit=UNIT):
+    os.utime(queue.lease_path(unit), (1.0, 1.0))
+
+def test_create(queue):
+    assert queue.units() == ["unit_00000", "unit_00001"]
+    assert queue.status() == {"units" : 2, "done" : 0, "leased" : 0, "pending" : 2}
+    assert queue.info["exposure"] is None
+
+def test_claim_held(queue):
+    lease = queue.claim(UNIT, 60.0)
+
+    assert lease is not None and queue.owns(UNIT, lease.token)
+    assert queue.claim(UNIT, 60.0) is None
+
+def test_claim_done(queue):
+    queue.complete(UNIT, [])
+
+    assert queue.claim(UNIT, 60.0) is None
+    assert not queue.lease_path(UNIT).exists()
+
+def test_steal_expired(queue):
+    first = queue.claim(UNIT, 60.0)
+    Expire(queue)
+
+    second = queue.claim(UNIT, 60.0)
+
+    assert second is not None and queue.owns(UNIT, second.token)
+    assert not queue.owns(UNIT, first.token)
+    assert list(queue.leases_dir.iterdir()) == [queue.lease_path(UNIT)]
+
+class RacingQueue(WorkQueue):
+    # Another worker steals the expired lease between our expiry check and rename
+    def __init__(self, queue_dir, other):
+        super().__init__(queue_dir)
+        self.other = other
+        self.stolen = None
+
+    def now(self):
+        now = super().now()
+        if self.stolen is None: self.stolen = self.other.claim(UNIT, 60.0)
+
+        return now
+
+def test_steal_race(queue):
+    queue.claim(UNIT, 60.0)
+    Expire(queue)
+
+    racing = RacingQueue(queue.queue_dir, WorkQueue(queue.queue_dir))
+    lease = racing.claim(UNIT, 60.0)
+
+    # The fresh lease of the other worker is put back, and ours fails
+    assert lease is None
+    assert racing.stolen is not None and queue.owns(UNIT, racing.stolen.token)
+    assert list(queue.leases_dir.iterdir()) == [queue.lease_path(UNIT)]
+
+def test_steal_renewed(queue):
+    lease = queue.claim(UNIT, 60.0)
+    Expire(queue)
+
+    class RenewingQueue(WorkQueue):
+        # The owner renews the lease between our expiry check and rename
+        def now(self):
+            now = super().now()
+            os.utime(queue.lease_path(UNIT))
+            return now
+
+    assert RenewingQueue(queue.queue_dir).claim(UNIT, 60.0) is None
+    assert queue.owns(UNIT, lease.token)
+
+def test_lease_renewal(queue):
+    lease = queue.claim(UNIT, 0.3)
+    Expire(queue)
+
+    with lease:
+        time.sleep(0.25)
+        assert 1.0 < queue.lease_path(UNIT).stat().st_mtime
+        assert not lease.lost
+
+    # Released on exit
+    assert not queue.lease_path(UNIT).exists()
+
+def test_lease_lost(queue):
+    lease = queue.claim(UNIT, 0.3)
+
+    with lease:
+        queue.lease_path(UNIT).write_text("another worker")
+        time.sleep(0.25)
+
+    assert lease.lost
+    assert queue.lease_path(UNIT).read_text() == "another worker"